@@ -1,20 +1,24 @@
 import os
 import sys
 
-# Check if the chinook.db exists
-if not os.path.exists('chinook.db'):
-    print("Sample database not found. Would you like to download it? (y/n)")
-    response = input().strip().lower()
-    if response == 'y':
-        # Import and run the download script
-        sys.path.append('scripts')
-        from scripts.download_sample_db import download_chinook_db
-        download_chinook_db()
-    else:
-        print("Note: SQL operations will fail without a database.")
-
-# Run the main application
-from src.main import main
+def check_sample_db():
+    """Offer to download the sample database if it is missing"""
+    # Check if the chinook.db exists
+    if not os.path.exists('chinook.db'):
+        print("Sample database not found. Would you like to download it? (y/n)")
+        response = input().strip().lower()
+        if response == 'y':
+            # Import and run the download script
+            sys.path.append('scripts')
+            from scripts.download_sample_db import download_chinook_db
+            download_chinook_db()
+        else:
+            print("Note: SQL operations will fail without a database.")
 
 if __name__ == "__main__":
+    # Guarded so sandbox worker processes, which re-import this module, don't prompt
+    check_sample_db()
+    
+    # Run the main application
+    from src.main import main
     main()
@@ -0,0 +1,492 @@
+"""
+Offline benchmark of the question-answering pipeline.
+
+Every LLM call goes to a scripted fake chat model with configurable latency
+and token counts, so the benchmark needs no OpenAI key and its results only
+change when the code does. Questions run over the CSV files in data/ and a
+generated SQLite database. Results are written as sorted, indented JSON that
+can be diffed between versions or compared with --compare.
+
+    python scripts/benchmark.py --output benchmark.json --compare baseline.json
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+SQL_ACTION = "Execute SQL queries on a database"
+CSV_ACTION = "Read a CSV file and extract data"
+
+# Each entry scripts the fake model's answers for one question
+DEFAULT_CORPUS = [
+    {
+        "question": "Which countries have the most customers?",
+        "actions": [SQL_ACTION],
+        "sql": "SELECT country, COUNT(*) AS customers FROM customers GROUP BY country ORDER BY customers DESC LIMIT 5"
+    },
+    {
+        "question": "What was the total order quantity per product category last year?",
+        "actions": [SQL_ACTION],
+        "sql": ("SELECT p.category, SUM(o.quantity) FROM orders o JOIN products p ON p.id = o.product_id "
+                "WHERE o.order_date >= '2023-01-01' GROUP BY p.category")
+    },
+    {
+        "question": "Who are the top 10 customers by number of orders?",
+        "actions": [SQL_ACTION],
+        "sql": ("SELECT c.name, COUNT(*) AS orders FROM orders o JOIN customers c ON c.id = o.customer_id "
+                "GROUP BY c.name ORDER BY orders DESC LIMIT 10")
+    },
+    {
+        "question": "What are the total sales amounts by region?",
+        "actions": [CSV_ACTION],
+        "file": "data/sales.csv",
+        "plan": {"group_by": ["Region"], "aggregations": [{"column": "SalesAmount", "func": "sum", "alias": "total_sales"}],
+                 "sort": [{"column": "total_sales", "descending": True}]}
+    },
+    {
+        "question": "What is the average product rating in the customer reviews?",
+        "actions": [CSV_ACTION],
+        "file": "data/customer_reviews.csv",
+        "plan": {"aggregations": [{"column": "Rating", "func": "mean", "alias": "average_rating"}]}
+    },
+    {
+        "question": "How many employees earn more than 90000?",
+        "actions": [CSV_ACTION],
+        "file": "data/employees.csv",
+        "plan": {"filters": [{"column": "Salary", "op": ">", "value": 90000}],
+                 "aggregations": [{"column": "*", "func": "count", "alias": "employees"}]}
+    },
+    {
+        "question": "Summarize the tone of the review texts for headphones",
+        "actions": [CSV_ACTION],
+        "file": "data/customer_reviews.csv",
+        "plan": None,
+        "code": "df[df['ProductName'].str.contains('Headphones')][['Rating', 'Sentiment']].to_string()"
+    },
+    {
+        "question": "Compare order volume in the database with the sales figures in the spreadsheet",
+        "actions": [SQL_ACTION, CSV_ACTION],
+        "file": "data/sales.csv",
+        "sql": "SELECT COUNT(*), SUM(quantity) FROM orders",
+        "plan": {"aggregations": [{"column": "Quantity", "func": "sum", "alias": "units"}]}
+    }
+]
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def summarize(durations):
+    """Latency summary in milliseconds"""
+    return {
+        "count": len(durations),
+        "mean_ms": round(sum(durations) / len(durations) * 1000, 2) if durations else None,
+        "p50_ms": round(percentile(durations, 50) * 1000, 2) if durations else None,
+        "p95_ms": round(percentile(durations, 95) * 1000, 2) if durations else None,
+        "p99_ms": round(percentile(durations, 99) * 1000, 2) if durations else None,
+        "max_ms": round(max(durations) * 1000, 2) if durations else None
+    }
+
+def generate_database(path, rows, seed):
+    """Create a SQLite database with customers, products and orders"""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    countries = ["USA", "Canada", "Germany", "France", "Brazil", "India", "Japan", "Australia"]
+    categories = ["Electronics", "Furniture", "Clothing", "Books", "Toys"]
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT, country TEXT, signup_date TEXT);
+        CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, category TEXT, price REAL);
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, customer_id INTEGER REFERENCES customers(id),
+                             product_id INTEGER REFERENCES products(id), quantity INTEGER, order_date TEXT);
+    """)
+    customers = max(1, rows // 10)
+    products = max(1, rows // 100)
+    conn.executemany("INSERT INTO customers VALUES (?, ?, ?, ?)", (
+        (i, f"Customer {i}", rng.choice(countries), f"202{rng.randint(0, 3)}-{rng.randint(1, 12):02d}-01")
+        for i in range(1, customers + 1)
+    ))
+    conn.executemany("INSERT INTO products VALUES (?, ?, ?, ?)", (
+        (i, f"Product {i}", rng.choice(categories), round(rng.uniform(5, 500), 2))
+        for i in range(1, products + 1)
+    ))
+    conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?)", (
+        (i, rng.randint(1, customers), rng.randint(1, products), rng.randint(1, 5),
+         f"202{rng.randint(2, 3)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+        for i in range(1, rows + 1)
+    ))
+    conn.commit()
+    conn.close()
+
+def configure_environment(workdir):
+    """Point every cache and the database at the benchmark's work directory
+
+    Configuration is read when `src` is imported, so this runs first.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ["DB_CONNECTION_STRING"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["CSV_DATA_DIR"] = os.path.join(ROOT, "data")
+    os.environ["CSV_CATALOG_PATH"] = os.path.join(workdir, "csv_catalog.json")
+    os.environ["DATAFRAME_SPILL_DIR"] = os.path.join(workdir, "frames")
+    os.environ["SQL_SCHEMA_CACHE_PATH"] = os.path.join(workdir, "sql_schema.json")
+    os.environ["WEB_CACHE_DIR"] = os.path.join(workdir, "http")
+    os.environ["ROUTING_CACHE_PATH"] = ""
+    os.environ["ROUTING_LOG_PATH"] = ""
+    os.environ["TELEMETRY_ENABLED"] = "True"
+
+def create_scripted_model_class():
+    """Define the fake chat model; imported lazily so configuration comes first"""
+    from typing import Any, Dict, List
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+    from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
+    class RateLimitError(Exception):
+        """Stands in for the provider's 429 response"""
+        status_code = 429
+
+    failures = random.Random(0)
+
+    class ScriptedChatModel(BaseChatModel):
+        """Chat model that answers from a question script after a fixed delay
+
+        It recognizes the prompts used by the pipeline (routing, CSV file
+        selection, query plans, SQL generation, the SQL ReAct agent and the
+        pandas tools agent) and replies with the scripted answer for the
+        question it finds in the prompt. Latency has a deterministic jitter
+        derived from the prompt, and token usage is reported from the prompt
+        and reply lengths unless fixed counts are given. A share of calls,
+        `error_rate`, fails with a 429 error to exercise the retry path. When
+        streamed, the reply arrives word by word over the same delay.
+        """
+        script: List[Dict[str, Any]]
+        latency: float = 0.0
+        jitter: float = 0.0
+        prompt_tokens: int = 0
+        completion_tokens: int = 0
+        error_rate: float = 0.0
+
+        @property
+        def _llm_type(self) -> str:
+            return "scripted"
+
+        def bind_tools(self, tools, **kwargs):
+            return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+        def _entry(self, text):
+            matches = [entry for entry in self.script if entry["question"] in text]
+            return max(matches, key=lambda entry: len(entry["question"])) if matches else {}
+
+        def _reply(self, messages):
+            text = "\n".join(str(message.content) for message in messages)
+            entry = self._entry(text)
+            if "Plan how to answer" in text:
+                return json.dumps({
+                    "actions": entry.get("actions", [SQL_ACTION]),
+                    "csv_files": [entry["file"]] if "file" in entry else [],
+                    "tables": [],
+                    "sql_mode": "generated" if "sql" in entry else None
+                }), []
+            if "Return a list of actions" in text:
+                return json.dumps(entry.get("actions", [SQL_ACTION])), []
+            if "which CSV file is most relevant" in text:
+                return entry.get("file", ""), []
+            if "JSON query plan" in text:
+                plan = entry.get("plan")
+                return json.dumps(plan) if plan is not None else "null", []
+            if "SQLQuery" in text:
+                return entry.get("sql", "SELECT 1"), []
+            if "Final Answer" in text:
+                # ReAct SQL agent: query once, then answer
+                scratchpad = text.rsplit(entry.get("question", "Question:"), 1)[-1]
+                if "Observation:" in scratchpad or "sql" not in entry:
+                    return "Thought: I now know the final answer\nFinal Answer: scripted answer", []
+                return f"Thought: I should query the database.\nAction: sql_db_query\nAction Input: {entry['sql']}", []
+            if any(isinstance(message, ToolMessage) for message in messages) or "code" not in entry:
+                return "scripted answer", []
+            tool_call = {"name": "python_repl_ast", "args": {"query": entry["code"]}, "id": "call_0"}
+            return "", [tool_call]
+
+        def _delay(self, messages):
+            digest = hashlib.sha256(str(messages).encode("utf-8")).digest()
+            return self.latency + self.jitter * (digest[0] / 255)
+
+        def _result(self, messages):
+            content, tool_calls = self._reply(messages)
+            prompt_tokens = self.prompt_tokens or sum(len(str(m.content)) for m in messages) // 4
+            completion_tokens = self.completion_tokens or max(1, len(content) // 4)
+            usage = {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                     "total_tokens": prompt_tokens + completion_tokens}
+            message = AIMessage(content=content, tool_calls=tool_calls, usage_metadata=usage)
+            return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"token_usage": {
+                "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens
+            }})
+
+        def _check_rate_limit(self):
+            if self.error_rate and failures.random() < self.error_rate:
+                raise RateLimitError("Rate limit reached for requests (scripted)")
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            self._check_rate_limit()
+            time.sleep(self._delay(messages))
+            return self._result(messages)
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            self._check_rate_limit()
+            await asyncio.sleep(self._delay(messages))
+            return self._result(messages)
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+            self._check_rate_limit()
+            message = self._result(messages).generations[0].message
+            delay = self._delay(messages)
+            if message.tool_calls:
+                await asyncio.sleep(delay)
+                chunks = [{"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}
+                          for call in message.tool_calls]
+                yield ChatGenerationChunk(message=AIMessageChunk(
+                    content="", tool_call_chunks=chunks, usage_metadata=message.usage_metadata
+                ))
+                return
+            # The first word comes after a fifth of the delay, the rest spread over the remainder
+            words = re.findall(r"\S+\s*", message.content) or [""]
+            await asyncio.sleep(delay / 5)
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(delay * 4 / 5 / len(words))
+                last = i == len(words) - 1
+                yield ChatGenerationChunk(message=AIMessageChunk(
+                    content=word, usage_metadata=message.usage_metadata if last else None
+                ))
+
+    return ScriptedChatModel
+
+class SpanCollector:
+    """Telemetry exporter that keeps finished spans for the report"""
+
+    def __init__(self):
+        self.spans = {}
+
+    def export(self, span):
+        self.spans[span.span_id] = (span.name, span.parent_id, span.duration)
+
+    def close(self):
+        pass
+
+    def stage_durations(self):
+        durations = {}
+        for name, _, duration in self.spans.values():
+            durations.setdefault(name, []).append(duration)
+        return durations
+
+    def llm_calls_by_stage(self):
+        """Count LLM calls by the name of the span they were made in"""
+        calls = {}
+        for name, parent_id, _ in self.spans.values():
+            if name == "llm":
+                stage = self.spans.get(parent_id, ("(none)",))[0]
+                calls[stage] = calls.get(stage, 0) + 1
+        return dict(sorted(calls.items()))
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+async def run_corpus(corpus, repeat, concurrency, stream=False):
+    from src.batch import answer_question, astream_answer
+    from src.utils.action_analyzer import ActionAnalyzer
+    from src.utils.action_registry import get_registry
+
+    analyzer = ActionAnalyzer()
+    registry = get_registry()
+    await registry.awarm_up(analyzer.available_actions)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    first_outputs = []
+    errors = 0
+
+    async def stream_one(question, started):
+        result = None
+        waiting = True
+        async for event in astream_answer(analyzer, question, registry):
+            if waiting and event["type"] not in ("route", "action_start", "action_end", "done"):
+                first_outputs.append(time.perf_counter() - started)
+                waiting = False
+            if event["type"] == "done":
+                result = event
+        return result
+
+    async def run_one(question):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                if stream:
+                    result = await stream_one(question, started)
+                else:
+                    result = await answer_question(analyzer, question, registry)
+                if any(str(value).startswith(("error", "timeout", "Error")) for value in result["results"].values()):
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    try:
+        for _ in range(repeat):
+            await asyncio.gather(*(run_one(entry["question"]) for entry in corpus))
+    finally:
+        await registry.ashutdown()
+    return latencies, first_outputs, errors, time.perf_counter() - started
+
+def resolve_corpus_files(corpus):
+    """Resolve the corpus's CSV files against the repository root
+
+    Raises:
+        FileNotFoundError: If a file is missing, since the CSV action would
+            otherwise quietly answer from another file
+    """
+    resolved = []
+    for entry in corpus:
+        if "file" in entry:
+            # Absolute paths are kept as they are
+            path = os.path.join(ROOT, entry["file"])
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"CSV file for {entry['question']!r} not found: {path}")
+            entry = {**entry, "file": path}
+        resolved.append(entry)
+    return resolved
+
+def run_benchmark(args):
+    corpus = DEFAULT_CORPUS
+    if args.corpus:
+        with open(args.corpus, "r") as f:
+            corpus = [json.loads(line) for line in f if line.strip()]
+    corpus = resolve_corpus_files(corpus)
+
+    configure_environment(args.workdir)
+    os.environ["LLM_REQUESTS_PER_MINUTE"] = str(args.rpm)
+    os.environ["LLM_TOKENS_PER_MINUTE"] = str(args.tpm)
+    os.environ["PLANNER_ENABLED"] = str(args.planner)
+    generate_database(os.path.join(args.workdir, "bench.db"), args.db_rows, args.seed)
+
+    from src.utils.llm import set_llm_factory
+    from src.utils.telemetry import get_telemetry, get_callbacks
+
+    ScriptedChatModel = create_scripted_model_class()
+    set_llm_factory(lambda: ScriptedChatModel(
+        script=corpus, latency=args.latency, jitter=args.jitter,
+        prompt_tokens=args.prompt_tokens, completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate, callbacks=get_callbacks()
+    ))
+    telemetry = get_telemetry()
+    collector = SpanCollector()
+    telemetry.add_exporter(collector)
+
+    latencies, first_outputs, errors, wall_time = asyncio.run(
+        run_corpus(corpus, args.repeat, args.concurrency, args.stream)
+    )
+
+    snapshot = telemetry.snapshot()
+    counters = {}
+    for counter in snapshot["counters"]:
+        labels = ",".join(f"{key}={value}" for key, value in sorted(counter["labels"].items()))
+        counters[f"{counter['name']}[{labels}]" if labels else counter["name"]] = counter["value"]
+
+    return {
+        "config": {
+            "questions": len(corpus), "repeat": args.repeat, "concurrency": args.concurrency,
+            "latency": args.latency, "jitter": args.jitter, "db_rows": args.db_rows, "seed": args.seed,
+            "error_rate": args.error_rate, "rpm": args.rpm, "tpm": args.tpm, "planner": args.planner,
+            "stream": args.stream
+        },
+        "runs": len(latencies),
+        "errors": errors,
+        "throughput_qps": round(len(latencies) / wall_time, 2) if wall_time else None,
+        "latency": summarize(latencies),
+        "first_output": summarize(first_outputs) if args.stream else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "llm_calls_by_stage": collector.llm_calls_by_stage(),
+        "counters": dict(sorted(counters.items())),
+        "stages": {name: summarize(durations) for name, durations in sorted(collector.stage_durations().items())},
+        "cache_stats": snapshot["stats"]
+    }
+
+# Metrics shown by --compare, with whether higher is better
+COMPARED_METRICS = [
+    ("throughput_qps", True), ("latency.p50_ms", False), ("latency.p95_ms", False),
+    ("latency.p99_ms", False), ("peak_rss_mb", False), ("counters.llm_calls", False)
+]
+
+def compare(results, baseline):
+    """Print the change of the main metrics against a baseline result file"""
+    def lookup(data, path):
+        for key in path.split("."):
+            data = (data or {}).get(key)
+        return data
+
+    print(f"{'metric':<22}{'baseline':>12}{'current':>12}{'change':>10}")
+    for path, higher_is_better in COMPARED_METRICS:
+        old, new = lookup(baseline, path), lookup(results, path)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        worse = change < 0 if higher_is_better else change > 0
+        flag = "  regression" if worse and abs(change) >= 10 else ""
+        print(f"{path:<22}{old:>12}{new:>12}{change:>9.1f}%{flag}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline with a scripted LLM")
+    parser.add_argument("--output", default="benchmark.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--corpus", help="JSONL file of scripted questions; defaults to the built-in corpus. "
+                        "Relative CSV paths in it are resolved against the repository root")
+    parser.add_argument("--repeat", type=int, default=3, help="Times the corpus is run")
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions answered at once")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds each LLM call takes")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Extra seconds added per call, up to this much")
+    parser.add_argument("--prompt-tokens", type=int, default=0, help="Fixed prompt tokens per call (0: from length)")
+    parser.add_argument("--completion-tokens", type=int, default=0, help="Fixed completion tokens per call (0: from length)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of LLM calls that fail with a 429")
+    parser.add_argument("--rpm", type=int, default=0, help="LLM requests per minute allowed by the gateway (0: unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="LLM tokens per minute allowed by the gateway (0: unlimited)")
+    parser.add_argument("--planner", action="store_true", help="Plan actions, sources and SQL mode in one LLM call")
+    parser.add_argument("--stream", action="store_true",
+                        help="Answer through the streaming API and report the time to the first output")
+    parser.add_argument("--db-rows", type=int, default=100000, help="Orders in the generated database")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=".cache/benchmark", help="Directory for the database and caches")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"Wrote {args.output}: {results['runs']} runs, p50 {results['latency']['p50_ms']} ms, "
+          f"p95 {results['latency']['p95_ms']} ms, {results['throughput_qps']} questions/s")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            compare(results, json.load(f))
@@ -16,6 +16,7 @@ IMPORT_TO_PACKAGE = {
     'decouple': 'python-decouple',
     'openai': 'openai',
     'pandas': 'pandas',
+    'pyarrow': 'pyarrow',
     'sqlalchemy': 'sqlalchemy',
     're': None,  # Standard library
     'os': None,  # Standard library
@@ -27,6 +28,8 @@ IMPORT_TO_PACKAGE = {
     'glob': None,  # Standard library
     'datetime': None,  # Standard library
     'requests': 'requests',
+    'aiohttp': 'aiohttp',
+    'httpx': 'httpx',
     'langchain': 'langchain',
     'langchain_openai': 'langchain-openai',
     'langchain_community': 'langchain-community',
@@ -0,0 +1,31 @@
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.fast_router import HashedNgramClassifier, load_routing_log
+from src.config.config import ROUTING_LOG_PATH, FAST_ROUTER_MODEL_PATH
+
+def train_fast_router(log_path, model_path, epochs=10):
+    """Train the fast router's classifier from logged LLM routing decisions"""
+    examples = load_routing_log(log_path)
+    if not examples:
+        print(f"No routing decisions found in {log_path}")
+        sys.exit(1)
+    
+    print(f"Training on {len(examples)} routing decisions...")
+    classifier = HashedNgramClassifier()
+    classifier.train(examples, epochs=epochs)
+    classifier.save(model_path)
+    print(f"Model saved to {model_path} ({len(classifier.labels)} actions)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the local fast-path router")
+    parser.add_argument("--log", default=ROUTING_LOG_PATH or ".cache/routing_log.jsonl",
+                        help="JSONL routing log written by ActionAnalyzer")
+    parser.add_argument("--model", default=FAST_ROUTER_MODEL_PATH or ".cache/fast_router.json",
+                        help="Where to write the trained model")
+    parser.add_argument("--epochs", type=int, default=10)
+    args = parser.parse_args()
+    train_fast_router(args.log, args.model, args.epochs)
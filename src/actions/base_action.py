@@ -1,12 +1,39 @@
+import asyncio
 from abc import ABC, abstractmethod
 
 class BaseAction(ABC):
+    # Actions whose output this action uses, when they are selected together.
+    # The executor runs those first and passes their results on.
+    depends_on = ()
+
     @abstractmethod
     def execute(self, *args, **kwargs):
         """Execute the action with given parameters"""
         pass
 
+    async def aexecute(self, *args, **kwargs):
+        """Execute the action without blocking the event loop
+
+        Actions that have a native async path should override this. The default
+        runs `execute` in a worker thread.
+        """
+        return await asyncio.to_thread(self.execute, *args, **kwargs)
+
+    async def astream(self, *args, **kwargs):
+        """Yield progress events while the action runs, ending with its result
+
+        Events are dicts with a "type", as listed in `src/utils/streaming.py`;
+        the last one is {"type": "result", "result": ...}. Actions that can
+        report progress, such as agent steps or rows, should override this.
+        The default yields only the result of `aexecute`.
+        """
+        yield {"type": "result", "result": await self.aexecute(*args, **kwargs)}
+
+    def close(self):
+        """Release resources held by the action, such as database connections"""
+        pass
+
     @classmethod
     def get_description(cls) -> str:
         """Return a description of what this action does"""
-        pass 
\ No newline at end of file
+        pass
@@ -1,31 +1,53 @@
 from .base_action import BaseAction
-from langchain_openai import ChatOpenAI
-from langchain_experimental.agents import create_csv_agent
-from langchain.prompts import ChatPromptTemplate
-from ..config.config import OPENAI_API_KEY, DEFAULT_CSV_PATH
+from langchain_core.prompts import ChatPromptTemplate
+from ..config.config import (
+    DEFAULT_CSV_PATH, CSV_DATA_DIR, CSV_SHORTLIST_K, CSV_QUERY_PLAN_ENABLED, CSV_PLAN_MAX_ROWS,
+    CSV_STREAMING_THRESHOLD_MB, CSV_SANDBOX_ENABLED, AGENT_VERBOSE
+)
+from ..utils.llm import get_llm, llm_priority
+from ..utils.csv_catalog import get_csv_catalog
+from ..utils.dataframe_cache import get_dataframe_cache, file_fingerprint
+from ..utils.query_plan import PLAN_FORMAT, parse_plan, validate_plan, execute_plan, format_result
+from ..utils.routing_cache import normalize_question
+from ..utils.streaming_csv import execute_plan_streaming
+from ..utils.code_sandbox import SandboxedPythonTool, get_sandbox_pool
+from ..utils.streaming import astream_run, result_event
+from ..utils.telemetry import get_callbacks, traced
+from collections import OrderedDict
+from contextlib import aclosing
 import os
-import glob
+import re
+import asyncio
+import threading
 import pandas as pd
 
+# Number of query plans kept for repeated questions
+MAX_CACHED_PLANS = 256
+# Rows of the file shown to the agent in its prompt
+AGENT_HEAD_ROWS = 5
+
 class CSVAction(BaseAction):
-    def __init__(self):
+    def __init__(self, llm=None):
         try:
-            # Initialize the LLM
-            self.llm = ChatOpenAI(api_key=OPENAI_API_KEY)
+            # Use the shared LLM client unless one is provided
+            self.llm = llm or get_llm()
+            self._plans = OrderedDict()
+            self._plans_lock = threading.Lock()
             self.error = None
         except Exception as e:
             self.error = f"Error initializing CSV agent: {str(e)}"
             self.llm = None
 
-    def _find_best_csv_file(self, question, data_dir="data"):
-        """Use LLM to determine the most relevant CSV file based on the question
+    def _prepare_csv_selection(self, question, data_dir=CSV_DATA_DIR):
+        """Resolve the CSV file locally or build the LLM prompt to choose one
         
         Args:
             question (str): The user question
             data_dir (str): Directory containing CSV files
             
         Returns:
-            str: Path to the most relevant CSV file
+            tuple: (file_path, message, None, None) when the file was resolved
+                without the LLM, otherwise (None, None, messages, csv_files)
         """
         # Check if a specific file path is mentioned in the question
         direct_path_patterns = [
@@ -35,38 +57,28 @@ class CSVAction(BaseAction):
         ]
         
         for pattern in direct_path_patterns:
-            import re
             match = re.search(pattern, question, re.IGNORECASE)
             if match:
                 path = match.group(2) if len(match.groups()) > 1 else match.group(1)
                 if os.path.exists(path):
-                    return path, f"Using explicitly mentioned file: {path}"
+                    return path, f"Using explicitly mentioned file: {path}", None, None
         
-        # Find all CSV files in the data directory
-        csv_files = glob.glob(os.path.join(data_dir, "*.csv"))
+        # Look up the CSV files in the data directory from the catalog
+        catalog = get_csv_catalog(data_dir)
+        csv_metadata = sorted(catalog.entries(), key=lambda meta: meta["file_path"])
+        csv_files = [meta["file_path"] for meta in csv_metadata]
         if not csv_files:
-            return DEFAULT_CSV_PATH, f"No CSV files found in {data_dir}, using default"
+            return DEFAULT_CSV_PATH, f"No CSV files found in {data_dir}, using default", None, None
             
         # If only one CSV file, use it
         if len(csv_files) == 1:
-            return csv_files[0], f"Only one CSV file available: {csv_files[0]}"
-            
-        # Get CSV file metadata to help LLM decide
-        csv_metadata = []
-        for file_path in csv_files:
-            try:
-                # Read a small sample to get column info
-                df = pd.read_csv(file_path, nrows=5)
-                columns = ", ".join(df.columns)
-                metadata = {
-                    "file_path": file_path,
-                    "columns": columns,
-                    "sample_values": str(df.iloc[0].to_dict())
-                }
-                csv_metadata.append(metadata)
-            except Exception as e:
-                print(f"Error reading CSV file {file_path}: {str(e)}")
-                
+            return csv_files[0], f"Only one CSV file available: {csv_files[0]}", None, None
+            
+        # Only show the LLM the files that best match the question
+        if len(csv_files) > CSV_SHORTLIST_K:
+            csv_metadata = catalog.search(question, CSV_SHORTLIST_K)
+            csv_files = [meta["file_path"] for meta in csv_metadata]
+            
         # Create a prompt for the LLM
         template = """
         I need to determine which CSV file is most relevant to answer the following question:
@@ -81,21 +93,25 @@ class CSVAction(BaseAction):
         
         # Format the CSV files information
         csv_files_info = "\n".join([
-            f"File: {meta['file_path']}\nColumns: {meta['columns']}\nSample row: {meta['sample_values']}"
+            f"File: {meta['file_path']}\n"
+            f"Columns: {', '.join(f'{column} ({dtype})' for column, dtype in meta['dtypes'].items())}\n"
+            f"Rows: {meta['row_count']}\n"
+            f"Sample row: {meta['samples'][0] if meta['samples'] else {}}"
             for meta in csv_metadata
         ])
         
         # Create the prompt
         prompt = ChatPromptTemplate.from_template(template)
         
-        # Get response from LLM
         messages = prompt.format_messages(
             question=question,
             csv_files=csv_files_info
         )
-        
-        response = self.llm.invoke(messages)
-        selected_file = response.content.strip()
+        return None, None, messages, csv_files
+
+    def _resolve_selected_file(self, response_content, csv_files):
+        """Validate the file path returned by the LLM"""
+        selected_file = response_content.strip()
         
         # Verify the selected file exists
         if os.path.exists(selected_file):
@@ -103,7 +119,222 @@ class CSVAction(BaseAction):
         else:
             # Fall back to first file if LLM returned an invalid path
             return csv_files[0], f"Invalid path from LLM, using first file: {csv_files[0]}"
+
+    @traced("csv.select_file")
+    def _find_best_csv_file(self, question, data_dir=CSV_DATA_DIR):
+        """Use LLM to determine the most relevant CSV file based on the question
+        
+        Args:
+            question (str): The user question
+            data_dir (str): Directory containing CSV files
+            
+        Returns:
+            str: Path to the most relevant CSV file
+        """
+        file_path, message, messages, csv_files = self._prepare_csv_selection(question, data_dir)
+        if file_path:
+            return file_path, message
+        
+        # Get response from LLM
+        with llm_priority("planning"):
+            response = self.llm.invoke(messages)
+        return self._resolve_selected_file(response.content, csv_files)
+
+    @traced("csv.select_file")
+    async def _afind_best_csv_file(self, question, data_dir=CSV_DATA_DIR):
+        """Async variant of `_find_best_csv_file`"""
+        file_path, message, messages, csv_files = await asyncio.to_thread(
+            self._prepare_csv_selection, question, data_dir
+        )
+        if file_path:
+            return file_path, message
+        
+        with llm_priority("planning"):
+            response = await self.llm.ainvoke(messages)
+        return self._resolve_selected_file(response.content, csv_files)
+
+    def _file_columns(self, file_path):
+        """Return (column, dtype, sample values) for a file, preferring the catalog"""
+        entry = get_csv_catalog().get(file_path)
+        if entry:
+            return [
+                (column, dtype, entry["stats"].get(column, {}).get("sample_values", []))
+                for column, dtype in entry["dtypes"].items()
+            ]
+        df = pd.read_csv(file_path, nrows=5)
+        return [
+            (column, str(dtype), df[column].dropna().unique().tolist()[:5] if dtype == object else [])
+            for column, dtype in df.dtypes.items()
+        ]
+
+    def _plan_messages(self, question, columns, file_path):
+        """Build the prompt asking the LLM for a structured query plan"""
+        template = """
+        Translate the question about the CSV file below into a JSON query plan.
+        
+        File: {file_path}
+        Columns:
+        {columns}
+        
+        Question: {question}
+        
+        If the question can be answered by filtering, grouping, aggregating, sorting and
+        limiting these columns, return only a JSON object in this format:
+        {plan_format}
+        Omit keys you don't need. Use exact column names and literal values.
+        If the question needs anything else, return only: null
+        """
+        columns_info = "\n".join(
+            f"- {column} ({dtype})" + (f", e.g. {values}" if values else "")
+            for column, dtype, values in columns
+        )
+        prompt = ChatPromptTemplate.from_template(template)
+        return prompt.format_messages(
+            question=question,
+            file_path=file_path,
+            columns=columns_info,
+            plan_format=PLAN_FORMAT
+        )
+
+    def _plan_key(self, question, file_path, pandas_kwargs):
+        return (normalize_question(question), file_fingerprint(file_path), str(sorted((pandas_kwargs or {}).items())))
+
+    def _cached_plan(self, key):
+        """Return (found, plan) from the plan cache"""
+        with self._plans_lock:
+            if key in self._plans:
+                self._plans.move_to_end(key)
+                return True, self._plans[key]
+        return False, None
+
+    def _remember_plan(self, key, plan):
+        with self._plans_lock:
+            self._plans[key] = plan
+            while len(self._plans) > MAX_CACHED_PLANS:
+                self._plans.popitem(last=False)
+
+    def _parse_and_validate_plan(self, content, columns):
+        """Turn the LLM response into a validated plan, or None to use the agent"""
+        plan = parse_plan(content)
+        if plan is None:
+            return None
+        try:
+            return validate_plan(plan, [column for column, _, _ in columns])
+        except ValueError as e:
+            print(f"Discarding query plan: {str(e)}")
+            return None
+
+    @staticmethod
+    def _is_large(file_path):
+        """Whether a file is above the streaming threshold"""
+        return os.path.getsize(file_path) > CSV_STREAMING_THRESHOLD_MB * 1024 * 1024
+
+    def _run_plan(self, plan, file_path, pandas_kwargs):
+        """Execute a plan on the cached frame, returning None if it fails
+        
+        Files above CSV_STREAMING_THRESHOLD_MB are never loaded whole; the
+        plan runs over chunks of the file instead.
+        """
+        try:
+            if self._is_large(file_path):
+                result, stats = execute_plan_streaming(
+                    file_path, plan, pandas_kwargs, max_rows=CSV_PLAN_MAX_ROWS
+                )
+                peak_mb = stats["peak_chunk_bytes"] / (1024 * 1024)
+                message = (f"Streamed {stats['rows']} rows in {stats['chunks']} chunks "
+                           f"(peak chunk memory {peak_mb:.1f} MB")
+                if stats["peak_rss_bytes"]:
+                    message += f", peak process RSS {stats['peak_rss_bytes'] / (1024 * 1024):.0f} MB"
+                print(message + ")")
+                answer = format_result(result, CSV_PLAN_MAX_ROWS)
+                if not plan["aggregations"] and plan["limit"] is None and stats["matched_rows"] > len(result):
+                    answer += f"\n... ({stats['matched_rows'] - len(result)} more rows)"
+                return answer
+            df = get_dataframe_cache().get(file_path, pandas_kwargs)
+            return format_result(execute_plan(df, plan), CSV_PLAN_MAX_ROWS)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Query plan failed, falling back to the agent: {str(e)}")
+            return None
+
+    @traced("csv.plan")
+    def _answer_with_plan(self, question, file_path, pandas_kwargs=None):
+        """Answer with a single LLM call and a vectorized pandas plan
+        
+        Returns:
+            str: The answer, or None when the question needs the agent
+        """
+        key = self._plan_key(question, file_path, pandas_kwargs)
+        found, plan = self._cached_plan(key)
+        if not found:
+            columns = self._file_columns(file_path)
+            with llm_priority("planning"):
+                response = self.llm.invoke(self._plan_messages(question, columns, file_path))
+            plan = self._parse_and_validate_plan(response.content, columns)
+            self._remember_plan(key, plan)
+        if plan is None:
+            return None
+        print(f"Using query plan: {plan}")
+        return self._run_plan(plan, file_path, pandas_kwargs)
+
+    @traced("csv.plan")
+    async def _aanswer_with_plan(self, question, file_path, pandas_kwargs=None):
+        """Async variant of `_answer_with_plan`"""
+        key = self._plan_key(question, file_path, pandas_kwargs)
+        found, plan = self._cached_plan(key)
+        if not found:
+            columns = await asyncio.to_thread(self._file_columns, file_path)
+            with llm_priority("planning"):
+                response = await self.llm.ainvoke(self._plan_messages(question, columns, file_path))
+            plan = self._parse_and_validate_plan(response.content, columns)
+            self._remember_plan(key, plan)
+        if plan is None:
+            return None
+        print(f"Using query plan: {plan}")
+        return await asyncio.to_thread(self._run_plan, plan, file_path, pandas_kwargs)
+
+    @staticmethod
+    def _too_large_message(file_path):
+        size_mb = os.path.getsize(file_path) / (1024 * 1024)
+        return (f"{file_path} is too large for the CSV agent ({size_mb:.0f} MB). Files above "
+                f"{CSV_STREAMING_THRESHOLD_MB} MB only support questions that can be answered "
+                f"with filters, group-by, aggregations, sorting and limits")
+
+    @traced("csv.agent_setup")
+    def _create_agent(self, file_path, pandas_kwargs=None):
+        """Create a CSV agent over the given file
+        
+        When the sandbox is enabled, the code the agent writes runs in a
+        worker process, which loads the whole file, and this process only
+        reads the rows shown in the agent's prompt. Otherwise the file is
+        parsed through the shared DataFrame cache, so repeated questions
+        about the same file don't parse the CSV again.
+        """
+        # Only questions the query plan can't answer need the agent toolkit
+        from langchain_experimental.agents import create_pandas_dataframe_agent
+
+        cache = get_dataframe_cache()
+        if CSV_SANDBOX_ENABLED:
+            kwargs = dict(pandas_kwargs or {})
+            kwargs["nrows"] = min(kwargs.get("nrows") or AGENT_HEAD_ROWS, AGENT_HEAD_ROWS)
+            df = pd.read_csv(file_path, **kwargs)
+        else:
+            df = cache.get(file_path, pandas_kwargs)
+        agent = create_pandas_dataframe_agent(
+            llm=self.llm,
+            df=df,
+            agent_type="openai-tools",
+            number_of_head_rows=AGENT_HEAD_ROWS,
+            verbose=AGENT_VERBOSE,
+            allow_dangerous_code=True
+        )
+        if CSV_SANDBOX_ENABLED:
+            agent.tools = [SandboxedPythonTool(
+                pool=get_sandbox_pool(),
+                source=cache.source(file_path, pandas_kwargs)
+            )]
+        return agent
     
+    @traced("action.csv")
     def execute(self, file_path=None, query=None, pandas_kwargs=None, *args, **kwargs):
         """Process CSV data using LangChain's CSV agent
         
@@ -129,24 +360,105 @@ class CSVAction(BaseAction):
             if not os.path.exists(file_path):
                 return f"CSV file not found at {file_path}"
                 
+            # Try a structured query plan before the multi-step agent
+            if CSV_QUERY_PLAN_ENABLED:
+                answer = self._answer_with_plan(query, file_path, pandas_kwargs)
+                if answer is not None:
+                    return answer
+                
+            if self._is_large(file_path):
+                return self._too_large_message(file_path)
+                
             # Create CSV agent
-            agent = create_csv_agent(
-                llm=self.llm,
-                path=file_path,
-                pandas_kwargs=pandas_kwargs or {},
-                agent_type="openai-tools",
-                verbose=True,
-                allow_dangerous_code=True
-            )
+            agent = self._create_agent(file_path, pandas_kwargs)
             
             # Execute the query
-            result = agent.invoke({"input": query})
+            result = agent.invoke({"input": query}, config={"callbacks": get_callbacks()})
             
             return result.get("output", "No result found")
             
         except Exception as e:
             return f"Error analyzing CSV data: {str(e)}"
 
+    @traced("action.csv")
+    async def aexecute(self, file_path=None, query=None, pandas_kwargs=None, *args, **kwargs):
+        """Async variant of `execute` using the agent's `ainvoke`"""
+        if self.error:
+            return self.error
+            
+        if not query:
+            return "Please provide a query to analyze the CSV data"
+            
+        try:
+            if not file_path:
+                file_path, selection_message = await self._afind_best_csv_file(query)
+                print(selection_message)
+                
+            if not os.path.exists(file_path):
+                return f"CSV file not found at {file_path}"
+                
+            if CSV_QUERY_PLAN_ENABLED:
+                answer = await self._aanswer_with_plan(query, file_path, pandas_kwargs)
+                if answer is not None:
+                    return answer
+                
+            if self._is_large(file_path):
+                return self._too_large_message(file_path)
+                
+            # Loading the CSV is blocking, keep it off the event loop
+            agent = await asyncio.to_thread(self._create_agent, file_path, pandas_kwargs)
+            
+            result = await agent.ainvoke({"input": query}, config={"callbacks": get_callbacks()})
+            
+            return result.get("output", "No result found")
+            
+        except Exception as e:
+            return f"Error analyzing CSV data: {str(e)}"
+
+    @traced("action.csv")
+    async def astream(self, file_path=None, query=None, pandas_kwargs=None, *args, **kwargs):
+        """Yield the chosen file and the agent's tokens and tool calls, then the result
+        
+        Questions answered by a query plan only yield the result.
+        """
+        if self.error:
+            yield result_event(self.error)
+            return
+            
+        if not query:
+            yield result_event("Please provide a query to analyze the CSV data")
+            return
+            
+        try:
+            if not file_path:
+                file_path, selection_message = await self._afind_best_csv_file(query)
+                yield {"type": "source", "file": file_path, "message": selection_message}
+                
+            if not os.path.exists(file_path):
+                yield result_event(f"CSV file not found at {file_path}")
+                return
+                
+            if CSV_QUERY_PLAN_ENABLED:
+                answer = await self._aanswer_with_plan(query, file_path, pandas_kwargs)
+                if answer is not None:
+                    yield result_event(answer)
+                    return
+                
+            if self._is_large(file_path):
+                yield result_event(self._too_large_message(file_path))
+                return
+                
+            agent = await asyncio.to_thread(self._create_agent, file_path, pandas_kwargs)
+            async with aclosing(astream_run(agent, {"input": query})) as events:
+                async for event in events:
+                    if event["type"] == "output":
+                        yield result_event(event["output"].get("output", "No result found"))
+                    else:
+                        yield event
+                        
+        except Exception as e:
+            yield result_event(f"Error analyzing CSV data: {str(e)}")
+
     @classmethod
     def get_description(cls) -> str:
         return "Read a CSV file and extract data" 
\ No newline at end of file
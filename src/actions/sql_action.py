@@ -1,20 +1,36 @@
+import threading
+from collections import OrderedDict
+from contextlib import aclosing
+from sqlalchemy import inspect
 from .base_action import BaseAction
-from langchain_community.utilities.sql_database import SQLDatabase
-from langchain_openai import ChatOpenAI
 from langchain.chains import create_sql_query_chain
 from langchain.agents import create_sql_agent
 from langchain.agents.agent_toolkits import SQLDatabaseToolkit
 from langchain.prompts import ChatPromptTemplate
-from ..config.config import OPENAI_API_KEY, DB_CONNECTION_STRING
+from ..config.config import (
+    DB_CONNECTION_STRING, SQL_TABLE_SHORTLIST_K, SQL_FETCH_SIZE, AGENT_VERBOSE,
+    STREAM_ROW_BATCH_SIZE, STREAM_MAX_ROWS
+)
+from ..utils.llm import get_llm
+from ..utils.source_index import SourceIndex
+from ..utils.db_engine import run_in_db_executor
+from ..utils.sql_database import CachingSQLDatabase, get_database
+from ..utils.sql_result_cache import is_read_only, is_sql_statement
+from ..utils.streaming import astream_run, result_event
+from ..utils.telemetry import get_callbacks, traced
+
+# Number of table-scoped agents kept for reuse
+MAX_SCOPED_AGENTS = 32
 
 class SQLDatabaseAction(BaseAction):
-    def __init__(self):
+    def __init__(self, llm=None):
         try:
-            # Initialize the SQL database utility
-            self.db = SQLDatabase.from_uri(DB_CONNECTION_STRING)
+            # Initialize the SQL database utility on the shared connection pool;
+            # tables are reflected lazily and their schemas cached between runs
+            self.db = get_database(DB_CONNECTION_STRING)
             
-            # Initialize the LLM
-            self.llm = ChatOpenAI(api_key=OPENAI_API_KEY)
+            # Use the shared LLM client unless one is provided
+            self.llm = llm or get_llm()
             
             # Create the SQL toolkit
             self.toolkit = SQLDatabaseToolkit(db=self.db, llm=self.llm)
@@ -23,13 +39,19 @@ class SQLDatabaseAction(BaseAction):
             self.agent = create_sql_agent(
                 llm=self.llm,
                 toolkit=self.toolkit,
-                verbose=True,
+                verbose=AGENT_VERBOSE,
                 handle_parsing_errors=True
             )
             
             # Also create a simpler query chain for direct SQL generation
             self.query_chain = create_sql_query_chain(self.llm, self.db)
             
+            # Table index and agents restricted to shortlisted tables, built on demand
+            self._table_index = None
+            self._table_index_version = None
+            self._scoped_agents = OrderedDict()
+            self._lock = threading.Lock()
+            
             self.error = None
             
         except Exception as e:
@@ -38,6 +60,95 @@ class SQLDatabaseAction(BaseAction):
             self.agent = None
             self.query_chain = None
 
+    def _build_table_index(self):
+        """Index table names, column names and comments for shortlisting"""
+        inspector = inspect(self.db._engine)
+        documents = {}
+        for table in self.db.get_usable_table_names():
+            words = [table]
+            try:
+                comment = inspector.get_table_comment(table).get("text")
+                if comment:
+                    words.append(comment)
+            except NotImplementedError:
+                # Not every dialect supports table comments
+                pass
+            for column in inspector.get_columns(table):
+                words.append(column["name"])
+                if column.get("comment"):
+                    words.append(column["comment"])
+            documents[table] = " ".join(words)
+        index = SourceIndex()
+        index.build(documents)
+        return index
+
+    @traced("sql.shortlist")
+    def _shortlist_tables(self, question):
+        """Return the tables most relevant to the question
+        
+        Returns:
+            list: Shortlisted table names, or None when the database is small
+                enough to show every table
+        """
+        if len(list(self.db.get_usable_table_names())) <= SQL_TABLE_SHORTLIST_K:
+            return None
+        with self._lock:
+            # Rebuild the index and drop scoped agents when the schema changes
+            version = self.db.schema_cache.version
+            if self._table_index is None or self._table_index_version != version:
+                self._table_index = self._build_table_index()
+                self._table_index_version = version
+                self._scoped_agents.clear()
+            index = self._table_index
+        return [table for table, _ in index.search(question, SQL_TABLE_SHORTLIST_K)]
+
+    def _get_agent(self, question, tables=None):
+        """Return an agent whose toolkit only exposes the tables relevant to the question
+        
+        Args:
+            question (str): The user question, used to shortlist tables
+            tables (list, optional): Tables to expose instead of the shortlist
+        """
+        tables = tables or self._shortlist_tables(question)
+        if tables is None:
+            return self.agent
+        
+        key = frozenset(tables)
+        with self._lock:
+            agent = self._scoped_agents.get(key)
+            if agent is not None:
+                self._scoped_agents.move_to_end(key)
+                return agent
+        
+        db = CachingSQLDatabase(
+            self.db._engine, include_tables=tables,
+            schema_cache=self.db.schema_cache, result_cache=self.db.result_cache
+        )
+        agent = create_sql_agent(
+            llm=self.llm,
+            toolkit=SQLDatabaseToolkit(db=db, llm=self.llm),
+            verbose=AGENT_VERBOSE,
+            handle_parsing_errors=True
+        )
+        with self._lock:
+            self._scoped_agents[key] = agent
+            while len(self._scoped_agents) > MAX_SCOPED_AGENTS:
+                self._scoped_agents.popitem(last=False)
+        return agent
+
+    def _query_chain_input(self, query, tables=None):
+        """Build the query chain input, limiting the schema to the given or shortlisted tables"""
+        chain_input = {"question": query}
+        tables = tables or self._shortlist_tables(query)
+        if tables is not None:
+            chain_input["table_names_to_use"] = tables
+        return chain_input
+
+    def _is_statement(self, query: str) -> bool:
+        """Whether the query is SQL to run as is, rather than a question to generate SQL for"""
+        return is_sql_statement(query, self.db.get_usable_table_names())
+
+    @traced("action.sql")
     def execute(self, query: str = None, list_tables: bool = False, get_schema: bool = False, 
                 table_names: list = None, agent_mode: bool = True):
         """Execute SQL operations using LangChain's SQLDatabase toolkit
@@ -46,7 +157,8 @@ class SQLDatabaseAction(BaseAction):
             query: Natural language query or SQL query to execute
             list_tables: If True, list all tables in the database
             get_schema: If True, return the schema for specified tables
-            table_names: List of table names to get schema for (when get_schema is True)
+            table_names: List of table names to get schema for (when get_schema is True),
+                or to limit a natural language query to instead of the shortlist
             agent_mode: If True, use the SQL agent, otherwise use direct operations
         """
         if self.error:
@@ -63,7 +175,7 @@ class SQLDatabaseAction(BaseAction):
                     else:
                         # Get schema for all tables if none specified
                         return self.db.get_table_info()
-                elif query and query.strip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE')):
+                elif query and self._is_statement(query):
                     # Direct SQL execution
                     return self.db.run(query)
             
@@ -71,11 +183,11 @@ class SQLDatabaseAction(BaseAction):
             if query:
                 if agent_mode:
                     # Use the SQL agent to answer the query
-                    result = self.agent.invoke({"input": query})
+                    result = self._get_agent(query, table_names).invoke({"input": query}, config={"callbacks": get_callbacks()})
                     return result.get("output", "No result found")
                 else:
                     # Generate SQL from natural language and execute it
-                    sql_query = self.query_chain.invoke({"question": query})
+                    sql_query = self.query_chain.invoke(self._query_chain_input(query, table_names), config={"callbacks": get_callbacks()})
                     print(f"Generated SQL: {sql_query}")
                     return self.db.run(sql_query)
                     
@@ -84,6 +196,117 @@ class SQLDatabaseAction(BaseAction):
         except Exception as e:
             return f"Error executing SQL operation: {str(e)}"
 
+    @traced("action.sql")
+    async def aexecute(self, query: str = None, list_tables: bool = False, get_schema: bool = False,
+                       table_names: list = None, agent_mode: bool = True):
+        """Async variant of `execute`
+        
+        LLM-backed paths use `ainvoke`; direct database operations run in the
+        bounded database thread pool so they don't block the event loop.
+        """
+        if self.error:
+            return self.error
+            
+        is_direct = not agent_mode and (
+            list_tables or get_schema or
+            (query and await run_in_db_executor(self._is_statement, query))
+        )
+        if is_direct or not query:
+            # Direct operations are plain database calls
+            return await run_in_db_executor(
+                self.execute, query=query, list_tables=list_tables, get_schema=get_schema,
+                table_names=table_names, agent_mode=agent_mode
+            )
+            
+        try:
+            if agent_mode:
+                agent = await run_in_db_executor(self._get_agent, query, table_names)
+                result = await agent.ainvoke({"input": query}, config={"callbacks": get_callbacks()})
+                return result.get("output", "No result found")
+            else:
+                chain_input = await run_in_db_executor(self._query_chain_input, query, table_names)
+                sql_query = await self.query_chain.ainvoke(chain_input, config={"callbacks": get_callbacks()})
+                print(f"Generated SQL: {sql_query}")
+                return await self.db.arun(sql_query)
+        except Exception as e:
+            return f"Error executing SQL operation: {str(e)}"
+
+    @traced("action.sql")
+    async def astream(self, query: str = None, list_tables: bool = False, get_schema: bool = False,
+                      table_names: list = None, agent_mode: bool = True):
+        """Yield progress events while answering, then the result
+        
+        In agent mode these are the agent's LLM tokens, tool calls and their
+        output. Otherwise the generated SQL statement, with its tokens, is
+        followed by the result rows in batches of STREAM_ROW_BATCH_SIZE, up to
+        STREAM_MAX_ROWS rows. The result is formatted as `execute` would.
+        """
+        if self.error:
+            yield result_event(self.error)
+            return
+            
+        if not query or list_tables or get_schema:
+            yield result_event(await self.aexecute(
+                query=query, list_tables=list_tables, get_schema=get_schema,
+                table_names=table_names, agent_mode=agent_mode
+            ))
+            return
+            
+        try:
+            if agent_mode:
+                agent = await run_in_db_executor(self._get_agent, query, table_names)
+                async with aclosing(astream_run(agent, {"input": query})) as events:
+                    async for event in events:
+                        if event["type"] == "output":
+                            yield result_event(event["output"].get("output", "No result found"))
+                        else:
+                            yield event
+                return
+                
+            sql_query = query
+            if not await run_in_db_executor(self._is_statement, query):
+                # Generate SQL from natural language
+                chain_input = await run_in_db_executor(self._query_chain_input, query, table_names)
+                async with aclosing(astream_run(self.query_chain, chain_input)) as events:
+                    async for event in events:
+                        if event["type"] == "output":
+                            sql_query = event["output"]
+                        else:
+                            yield event
+                yield {"type": "sql", "sql": sql_query}
+                
+            if not is_read_only(sql_query):
+                yield result_event(await self.db.arun(sql_query))
+                return
+                
+            rows = []
+            async with aclosing(self.db.astream(sql_query, batch_size=STREAM_ROW_BATCH_SIZE)) as batches:
+                async for batch in batches:
+                    batch = batch[:STREAM_MAX_ROWS - len(rows)]
+                    rows.extend(batch)
+                    yield {"type": "rows", "rows": batch}
+                    if len(rows) >= STREAM_MAX_ROWS:
+                        break
+            yield result_event(self.db.format_rows(rows))
+        except Exception as e:
+            yield result_event(f"Error executing SQL operation: {str(e)}")
+
+    def stream(self, query: str, fetch_size: int = SQL_FETCH_SIZE):
+        """Iterate over all rows of a read-only SQL query as dicts
+        
+        Unlike `execute`, the result isn't capped or formatted for a prompt;
+        rows are fetched from a server-side cursor `fetch_size` at a time.
+        """
+        if self.error:
+            raise RuntimeError(self.error)
+        return self.db.stream(query, fetch_size=fetch_size)
+
+    def stream_batches(self, query: str, batch_size: int = SQL_FETCH_SIZE):
+        """Iterate over all results of a read-only SQL query as pyarrow RecordBatches"""
+        if self.error:
+            raise RuntimeError(self.error)
+        return self.db.stream_batches(query, batch_size=batch_size)
+
     @classmethod
     def get_description(cls) -> str:
         return "Execute SQL queries on a database" 
\ No newline at end of file
@@ -1,14 +1,74 @@
+from contextlib import aclosing
 from .base_action import BaseAction
+from ..utils.http_fetcher import HTTPFetcher
+from ..utils.streaming import result_event
+from ..utils.telemetry import traced
 
 class WebAction(BaseAction):
-    def execute(self, url=None, *args, **kwargs):
-        """Fetch data from a URL"""
-        # This is a placeholder implementation
-        # In a real application, you would make an HTTP request to the URL
-        if url:
-            return f"Simulated web data from: {url}"
-        return "No URL provided"
+    def __init__(self):
+        # Pooled HTTP client with an on-disk cache, started on first use
+        self.fetcher = HTTPFetcher()
+
+    @staticmethod
+    def _format_results(results):
+        """Render fetched pages as text for the caller"""
+        sections = []
+        for result in results:
+            if "error" in result:
+                sections.append(f"Error fetching {result['url']}: {result['error']}")
+                continue
+            text = result["text"] or "(no text content)"
+            if result["truncated"]:
+                text += "\n... (page truncated)"
+            sections.append(f"Content from {result['url']} (HTTP {result['status']}):\n{text}")
+        return "\n\n".join(sections)
+
+    @staticmethod
+    def _urls(url=None, urls=None):
+        urls = list(urls or [])
+        if url and url not in urls:
+            urls.insert(0, url)
+        return urls
+
+    @traced("action.web")
+    def execute(self, url=None, urls=None, *args, **kwargs):
+        """Fetch the text content of one or more URLs
+        
+        Args:
+            url: A single URL to fetch
+            urls: Several URLs to fetch concurrently
+        """
+        urls = self._urls(url, urls)
+        if not urls:
+            return "No URL provided"
+        return self._format_results(self.fetcher.fetch_many(urls))
+
+    @traced("action.web")
+    async def aexecute(self, url=None, urls=None, *args, **kwargs):
+        """Async variant of `execute`"""
+        urls = self._urls(url, urls)
+        if not urls:
+            return "No URL provided"
+        return self._format_results(await self.fetcher.afetch_many(urls))
+
+    @traced("action.web")
+    async def astream(self, url=None, urls=None, *args, **kwargs):
+        """Yield a "page" event for each URL as soon as it is fetched, then the result"""
+        urls = self._urls(url, urls)
+        if not urls:
+            yield result_event("No URL provided")
+            return
+        pages = {}
+        async with aclosing(self.fetcher.afetch_each(urls)) as fetched:
+            async for requested, page in fetched:
+                pages[requested] = page
+                yield {"type": "page", **page}
+        yield result_event(self._format_results([pages[requested] for requested in urls]))
+
+    def close(self):
+        """Close pooled HTTP connections"""
+        self.fetcher.close()
 
     @classmethod
     def get_description(cls) -> str:
-        return "Connect to internet and browse for data" 
\ No newline at end of file
+        return "Connect to internet and browse for data" 
@@ -0,0 +1,198 @@
+import argparse
+import asyncio
+import json
+import time
+from contextlib import aclosing
+from .utils.action_analyzer import ActionAnalyzer
+from .utils.action_registry import get_registry
+from .utils.action_executor import ActionExecutor, build_tasks
+from .utils.telemetry import get_telemetry, traced
+from .main import get_action_params
+from .config.config import BATCH_CONCURRENCY
+
+# Fields checked, in order, for the question text of a JSONL record
+QUESTION_FIELDS = ("question", "body", "title")
+
+# Fields checked, in order, for an identifier to echo back in the output
+ID_FIELDS = ("id", "request_id")
+
+def _extract_field(record, fields):
+    """Return the first non-empty value among the given fields"""
+    for field in fields:
+        value = record.get(field)
+        if value is not None and value != "":
+            return value
+    return None
+
+def read_questions(input_path):
+    """Yield (index, record_id, question) tuples from a JSONL file
+
+    Args:
+        input_path (str): Path to a JSONL file with one question per line
+    """
+    with open(input_path, "r") as f:
+        for index, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Plain text lines are treated as the question itself
+                record = {"question": line}
+            if isinstance(record, str):
+                record = {"question": record}
+            yield index, _extract_field(record, ID_FIELDS), _extract_field(record, QUESTION_FIELDS)
+
+def _format_outcome(outcome):
+    """The result of an action, or its status and error when it did not succeed"""
+    return outcome["result"] if outcome["status"] == "ok" else f"{outcome['status']}: {outcome['error']}"
+
+@traced("question")
+async def answer_question(analyzer, question, registry):
+    """Route a question and run every selected action on it
+
+    Args:
+        analyzer (ActionAnalyzer): The analyzer used for routing
+        question (str): The user question
+        registry (ActionRegistry): Registry holding the shared action instances
+
+    Returns:
+        dict: The selected actions and the result of each one
+    """
+    plan = await analyzer.aplan(question)
+    required_actions = plan.actions
+
+    results = {}
+    tasks = build_tasks(required_actions, lambda action_class: get_action_params(action_class, question, plan))
+    for action_class in required_actions:
+        action_name = action_class.get_description()
+        if not any(task.name == action_name for task in tasks):
+            results[action_name] = f"No implementation available for action: {action_name}"
+
+    outcomes = await ActionExecutor(registry).run(tasks)
+    for name, outcome in outcomes.items():
+        results[name] = _format_outcome(outcome)
+
+    return {
+        "actions": [action_class.get_description() for action_class in required_actions],
+        "results": results
+    }
+
+@traced("question")
+async def astream_answer(analyzer, question, registry):
+    """Route a question and yield events as the selected actions make progress
+
+    The first event is the routing decision ("route"). It is followed by the
+    actions' events from `ActionExecutor.stream`, such as LLM tokens, agent
+    steps and SQL rows, and a final "done" event with the same "actions" and
+    "results" as `answer_question`. Closing the generator, for example when
+    the client disconnects, cancels the actions still running.
+
+    Args:
+        analyzer (ActionAnalyzer): The analyzer used for routing
+        question (str): The user question
+        registry (ActionRegistry): Registry holding the shared action instances
+    """
+    started = time.perf_counter()
+    plan = await analyzer.aplan(question)
+    required_actions = plan.actions
+    action_names = [action_class.get_description() for action_class in required_actions]
+    yield {"type": "route", "actions": action_names, "source": plan.source, "csv_files": plan.csv_files,
+           "tables": plan.tables, "sql_mode": plan.sql_mode}
+
+    results = {}
+    tasks = build_tasks(required_actions, lambda action_class: get_action_params(action_class, question, plan))
+    for action_name in action_names:
+        if not any(task.name == action_name for task in tasks):
+            results[action_name] = f"No implementation available for action: {action_name}"
+            yield {"type": "action_end", "action": action_name, "status": "error",
+                   "error": results[action_name], "elapsed": 0.0}
+
+    first_output = True
+    async with aclosing(ActionExecutor(registry).stream(tasks)) as events:
+        async for event in events:
+            if first_output and event["type"] not in ("action_start", "action_end"):
+                # How long callers wait before the actions show any progress
+                get_telemetry().observe("stream.first_output", time.perf_counter() - started)
+                first_output = False
+            if event["type"] == "action_end":
+                results[event["action"]] = _format_outcome(event)
+            yield event
+
+    yield {"type": "done", "actions": action_names, "results": results}
+
+async def run_batch(input_path, output_path, concurrency=BATCH_CONCURRENCY):
+    """Answer every question in a JSONL file with bounded concurrency
+
+    Results are written to the output JSONL as soon as each question finishes,
+    so the output is in completion order. Each line carries the input line
+    index (and id, when present) to correlate it with its question.
+
+    Args:
+        input_path (str): JSONL file of questions
+        output_path (str): JSONL file the results are written to
+        concurrency (int): Maximum number of questions processed at once
+
+    Returns:
+        dict: Summary with the number of processed and failed questions
+    """
+    analyzer = ActionAnalyzer()
+    registry = get_registry()
+    await registry.awarm_up(analyzer.available_actions)
+
+    # Bounded queue so large inputs are read lazily instead of all at once
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    summary = {"processed": 0, "failed": 0}
+
+    async def worker(output):
+        while True:
+            item = await queue.get()
+            if item is None:
+                queue.task_done()
+                return
+            index, record_id, question = item
+            started = time.perf_counter()
+            entry = {"index": index, "id": record_id, "question": question}
+            try:
+                if not question:
+                    raise ValueError("No question found in record")
+                entry.update(await answer_question(analyzer, question, registry))
+            except Exception as e:
+                entry["error"] = str(e)
+                summary["failed"] += 1
+            entry["elapsed"] = round(time.perf_counter() - started, 3)
+            output.write(json.dumps(entry, default=str) + "\n")
+            output.flush()
+            summary["processed"] += 1
+            queue.task_done()
+
+    try:
+        with open(output_path, "w") as output:
+            workers = [asyncio.create_task(worker(output)) for _ in range(concurrency)]
+            for item in read_questions(input_path):
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+    finally:
+        await registry.ashutdown()
+
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions in batch mode")
+    parser.add_argument("input", help="JSONL file with one question per line")
+    parser.add_argument("output", help="JSONL file to write results to")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help="Maximum number of questions processed at once")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    summary = asyncio.run(run_batch(args.input, args.output, args.concurrency))
+    elapsed = time.perf_counter() - started
+    print(f"Processed {summary['processed']} questions "
+          f"({summary['failed']} failed) in {elapsed:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -2,4 +2,126 @@ from decouple import config
 
 OPENAI_API_KEY = config('OPENAI_API_KEY')
 DB_CONNECTION_STRING = config('DB_CONNECTION_STRING', default='sqlite:///chinook.db')
-DEFAULT_CSV_PATH = config('DEFAULT_CSV_PATH', default='data/data.csv') 
\ No newline at end of file
+DEFAULT_CSV_PATH = config('DEFAULT_CSV_PATH', default='data/data.csv')
+
+# Batch mode
+BATCH_CONCURRENCY = config('BATCH_CONCURRENCY', default=8, cast=int)
+
+# Shared LLM client
+LLM_MAX_CONNECTIONS = config('LLM_MAX_CONNECTIONS', default=20, cast=int)
+LLM_MAX_KEEPALIVE_CONNECTIONS = config('LLM_MAX_KEEPALIVE_CONNECTIONS', default=10, cast=int)
+
+# Routing cache
+ROUTING_CACHE_SIZE = config('ROUTING_CACHE_SIZE', default=1024, cast=int)
+ROUTING_CACHE_TTL = config('ROUTING_CACHE_TTL', default=86400, cast=int)
+ROUTING_CACHE_PATH = config('ROUTING_CACHE_PATH', default='')
+ROUTING_CACHE_DISK_SIZE = config('ROUTING_CACHE_DISK_SIZE', default=100000, cast=int)
+
+# Fast-path router
+FAST_ROUTER_ENABLED = config('FAST_ROUTER_ENABLED', default=True, cast=bool)
+FAST_ROUTER_THRESHOLD = config('FAST_ROUTER_THRESHOLD', default=0.9, cast=float)
+FAST_ROUTER_MODEL_PATH = config('FAST_ROUTER_MODEL_PATH', default='')
+ROUTING_LOG_PATH = config('ROUTING_LOG_PATH', default='')
+
+# CSV catalog
+CSV_DATA_DIR = config('CSV_DATA_DIR', default='data')
+CSV_CATALOG_PATH = config('CSV_CATALOG_PATH', default='.cache/csv_catalog.json')
+CSV_CATALOG_REFRESH_INTERVAL = config('CSV_CATALOG_REFRESH_INTERVAL', default=10, cast=float)
+CSV_CATALOG_CHUNK_SIZE = config('CSV_CATALOG_CHUNK_SIZE', default=100000, cast=int)
+
+# Source shortlisting
+CSV_SHORTLIST_K = config('CSV_SHORTLIST_K', default=5, cast=int)
+SQL_TABLE_SHORTLIST_K = config('SQL_TABLE_SHORTLIST_K', default=10, cast=int)
+
+# DataFrame cache
+DATAFRAME_CACHE_MAX_MB = config('DATAFRAME_CACHE_MAX_MB', default=1024, cast=int)
+DATAFRAME_SPILL_DIR = config('DATAFRAME_SPILL_DIR', default='.cache/frames')
+
+# CSV query plans
+CSV_QUERY_PLAN_ENABLED = config('CSV_QUERY_PLAN_ENABLED', default=True, cast=bool)
+CSV_PLAN_MAX_ROWS = config('CSV_PLAN_MAX_ROWS', default=100, cast=int)
+
+# Streaming CSV execution
+CSV_STREAMING_THRESHOLD_MB = config('CSV_STREAMING_THRESHOLD_MB', default=512, cast=int)
+CSV_STREAMING_CHUNK_SIZE = config('CSV_STREAMING_CHUNK_SIZE', default=200000, cast=int)
+
+# CSV agent code sandbox
+CSV_SANDBOX_ENABLED = config('CSV_SANDBOX_ENABLED', default=True, cast=bool)
+CSV_SANDBOX_WORKERS = config('CSV_SANDBOX_WORKERS', default=0, cast=int)
+CSV_SANDBOX_CPU_SECONDS = config('CSV_SANDBOX_CPU_SECONDS', default=30, cast=float)
+CSV_SANDBOX_TIMEOUT = config('CSV_SANDBOX_TIMEOUT', default=60, cast=float)
+CSV_SANDBOX_MEMORY_MB = config('CSV_SANDBOX_MEMORY_MB', default=4096, cast=int)
+CSV_SANDBOX_FRAMES_PER_WORKER = config('CSV_SANDBOX_FRAMES_PER_WORKER', default=4, cast=int)
+
+# SQL schema cache
+SQL_SCHEMA_CACHE_PATH = config('SQL_SCHEMA_CACHE_PATH', default='.cache/sql_schema.json')
+SQL_SCHEMA_CHECK_INTERVAL = config('SQL_SCHEMA_CHECK_INTERVAL', default=5, cast=float)
+SQL_SCHEMA_FINGERPRINT_QUERY = config('SQL_SCHEMA_FINGERPRINT_QUERY', default='')
+SQL_SCHEMA_CACHE_TTL = config('SQL_SCHEMA_CACHE_TTL', default=3600, cast=int)
+
+# SQL result cache
+SQL_RESULT_CACHE_ENABLED = config('SQL_RESULT_CACHE_ENABLED', default=True, cast=bool)
+SQL_RESULT_CACHE_SIZE = config('SQL_RESULT_CACHE_SIZE', default=512, cast=int)
+SQL_RESULT_CACHE_TTL = config('SQL_RESULT_CACHE_TTL', default=300, cast=float)
+
+# SQL result streaming
+SQL_FETCH_SIZE = config('SQL_FETCH_SIZE', default=1000, cast=int)
+SQL_PROMPT_MAX_ROWS = config('SQL_PROMPT_MAX_ROWS', default=100, cast=int)
+SQL_PROMPT_MAX_BYTES = config('SQL_PROMPT_MAX_BYTES', default=16000, cast=int)
+
+# SQL connection pool
+SQL_POOL_SIZE = config('SQL_POOL_SIZE', default=5, cast=int)
+SQL_MAX_OVERFLOW = config('SQL_MAX_OVERFLOW', default=10, cast=int)
+SQL_POOL_RECYCLE = config('SQL_POOL_RECYCLE', default=1800, cast=int)
+SQL_POOL_TIMEOUT = config('SQL_POOL_TIMEOUT', default=30, cast=float)
+SQL_POOL_PRE_PING = config('SQL_POOL_PRE_PING', default=True, cast=bool)
+SQL_ASYNC_WORKERS = config('SQL_ASYNC_WORKERS', default=0, cast=int)
+
+# Action execution
+ACTION_TIMEOUT = config('ACTION_TIMEOUT', default=300, cast=float)
+PIPELINE_TIMEOUT = config('PIPELINE_TIMEOUT', default=0, cast=float)
+
+# Web fetching
+WEB_MAX_CONNECTIONS = config('WEB_MAX_CONNECTIONS', default=100, cast=int)
+WEB_MAX_CONNECTIONS_PER_HOST = config('WEB_MAX_CONNECTIONS_PER_HOST', default=8, cast=int)
+WEB_HOST_RATE_LIMIT = config('WEB_HOST_RATE_LIMIT', default=5, cast=float)
+WEB_TIMEOUT = config('WEB_TIMEOUT', default=30, cast=float)
+WEB_CACHE_DIR = config('WEB_CACHE_DIR', default='.cache/http')
+WEB_MAX_TEXT_CHARS = config('WEB_MAX_TEXT_CHARS', default=20000, cast=int)
+WEB_MAX_BYTES = config('WEB_MAX_BYTES', default=5 * 1024 * 1024, cast=int)
+WEB_USER_AGENT = config('WEB_USER_AGENT', default='intelligent-agent/1.0')
+
+# Telemetry
+TELEMETRY_ENABLED = config('TELEMETRY_ENABLED', default=True, cast=bool)
+TELEMETRY_JSONL_PATH = config('TELEMETRY_JSONL_PATH', default='')
+TELEMETRY_OTEL_PATH = config('TELEMETRY_OTEL_PATH', default='')
+TELEMETRY_METRICS_PORT = config('TELEMETRY_METRICS_PORT', default=0, cast=int)
+LLM_PROMPT_COST_PER_1K = config('LLM_PROMPT_COST_PER_1K', default=0, cast=float)
+LLM_COMPLETION_COST_PER_1K = config('LLM_COMPLETION_COST_PER_1K', default=0, cast=float)
+
+# Service mode
+SERVER_HOST = config('SERVER_HOST', default='127.0.0.1')
+SERVER_PORT = config('SERVER_PORT', default=8080, cast=int)
+SERVER_SOCKET = config('SERVER_SOCKET', default='')
+SERVER_WORKERS = config('SERVER_WORKERS', default=8, cast=int)
+SERVER_QUEUE_SIZE = config('SERVER_QUEUE_SIZE', default=64, cast=int)
+SERVER_REQUEST_TIMEOUT = config('SERVER_REQUEST_TIMEOUT', default=120, cast=float)
+
+# LLM gateway
+LLM_GATEWAY_ENABLED = config('LLM_GATEWAY_ENABLED', default=True, cast=bool)
+LLM_REQUESTS_PER_MINUTE = config('LLM_REQUESTS_PER_MINUTE', default=0, cast=int)
+LLM_TOKENS_PER_MINUTE = config('LLM_TOKENS_PER_MINUTE', default=0, cast=int)
+LLM_COMPLETION_TOKEN_ESTIMATE = config('LLM_COMPLETION_TOKEN_ESTIMATE', default=256, cast=int)
+LLM_MAX_RETRIES = config('LLM_MAX_RETRIES', default=5, cast=int)
+LLM_RETRY_BASE_DELAY = config('LLM_RETRY_BASE_DELAY', default=0.5, cast=float)
+LLM_RETRY_MAX_DELAY = config('LLM_RETRY_MAX_DELAY', default=30, cast=float)
+
+# Single-pass planner
+PLANNER_ENABLED = config('PLANNER_ENABLED', default=False, cast=bool)
+
+# Streaming
+AGENT_VERBOSE = config('AGENT_VERBOSE', default=False, cast=bool)
+STREAM_QUEUE_SIZE = config('STREAM_QUEUE_SIZE', default=64, cast=int)
+STREAM_ROW_BATCH_SIZE = config('STREAM_ROW_BATCH_SIZE', default=100, cast=int)
+STREAM_MAX_ROWS = config('STREAM_MAX_ROWS', default=10000, cast=int)
+STREAM_MAX_OBSERVATION_CHARS = config('STREAM_MAX_OBSERVATION_CHARS', default=2000, cast=int)
@@ -1,5 +1,7 @@
 from .utils.action_analyzer import ActionAnalyzer
-from .actions.sql_action import SQLDatabaseAction
+from .utils.action_registry import get_registry
+from .utils.http_fetcher import extract_urls
+import asyncio
 import re
 import os
 
@@ -35,47 +37,100 @@ def parse_sql_query(question):
     # For everything else, use the agent mode
     return {"query": question, "agent_mode": True}
 
+def planned_sql_params(question, plan):
+    """Build the SQL parameters for the mode and tables chosen by the planner"""
+    tables = plan.tables or None
+    if plan.sql_mode == "direct":
+        params = parse_sql_query(question)
+        if not params.get("agent_mode"):
+            return params
+        # The action runs SQL statements as they are and generates SQL for
+        # anything else, since only it knows the database's tables
+        return {"query": question, "agent_mode": False, "table_names": tables}
+    return {"query": question, "agent_mode": plan.sql_mode == "agent", "table_names": tables}
+
+def get_action_params(action_class, question, plan=None):
+    """Build the keyword arguments for executing an action on a question
+    
+    Args:
+        action_class: The action class selected for the question
+        question (str): The user question
+        plan (ActionPlan, optional): Sources and SQL mode chosen by the planner
+        
+    Returns:
+        dict: Keyword arguments for the action's execute method, or None when
+            there is no implementation for the action
+    """
+    action_name = action_class.get_description()
+    
+    if action_name == "Execute SQL queries on a database":
+        if plan is not None and plan.sql_mode:
+            return planned_sql_params(question, plan)
+        # Parse the question to get SQL parameters
+        return parse_sql_query(question)
+        
+    elif action_name == "Read a CSV file and extract data":
+        # Execute the CSV action with the query, on the planned file if any
+        if plan is not None and plan.csv_files:
+            return {"query": question, "file_path": plan.csv_files[0]}
+        return {"query": question}
+        
+    elif action_name == "Connect to internet and browse for data":
+        # Fetch the URLs mentioned in the question
+        return {"urls": extract_urls(question)}
+        
+    return None
+
+def print_event(event):
+    """Print a stream event from `astream_answer` for the interactive prompt"""
+    kind = event["type"]
+    if kind == "route":
+        print("\nRequired actions:")
+        for action_name in event["actions"]:
+            print(f"- {action_name}")
+    elif kind == "action_start":
+        print(f"\nExecuting: {event['action']}")
+    elif kind == "source":
+        print(event["message"])
+    elif kind == "token":
+        print(event["text"], end="", flush=True)
+    elif kind == "step":
+        print(f"\n[{event['action']}] Calling {event['tool']}: {event['input']}")
+    elif kind == "observation":
+        print(f"\n[{event['action']}] {event['tool']} returned: {event['output']}")
+    elif kind == "sql":
+        print(f"\nGenerated SQL: {event['sql']}")
+    elif kind == "rows":
+        print(f"\n[{event['action']}] Received {len(event['rows'])} rows")
+    elif kind == "page":
+        print(f"\n[{event['action']}] Fetched {event['url']}")
+    elif kind == "action_end":
+        if event["status"] == "ok":
+            print(f"\nResult ({event['action']}): {event['result']}")
+        else:
+            print(f"\n{event['status'].capitalize()} ({event['action']}): {event['error']}")
+
+async def stream_answer(analyzer, question, registry):
+    """Answer a question, printing progress as the actions make it"""
+    # batch imports get_action_params from this module
+    from .batch import astream_answer
+    async for event in astream_answer(analyzer, question, registry):
+        print_event(event)
+
 def main():
-    # Initialize the action analyzer
+    # Initialize the action analyzer and the shared action instances
     analyzer = ActionAnalyzer()
+    registry = get_registry()
     
     # Get the question from the user
     question = input("Enter your question: ")
     
-    # Get the required actions
-    required_actions = analyzer.get_required_actions(question)
-    
-    # Print the required actions
-    print("\nRequired actions:")
-    for action_class in required_actions:
-        print(f"- {action_class.get_description()}")
-    
-    # Execute each action
-    for action_class in required_actions:
-        action = action_class()
-        action_name = action_class.get_description()
-        print(f"\nExecuting: {action_name}")
-        
-        if action_name == "Execute SQL queries on a database":
-            # Parse the question to get SQL parameters
-            params = parse_sql_query(question)
-            print(f"Using SQL {'agent' if params.get('agent_mode', True) else 'direct'} mode")
-            result = action.execute(**params)
-            print(f"\nResult: {result}")
-            
-        elif action_name == "Read a CSV file and extract data":
-            # Execute the CSV action with the query
-            result = action.execute(query=question)
-            print(f"\nResult: {result}")
-            
-        elif action_name == "Connect to internet and browse for data":
-            # Execute the web action with a generated URL
-            # This is a simplification - in a real app, you would generate an appropriate URL
-            result = action.execute(url="https://example.com")
-            print(f"\nResult: {result}")
-            
-        else:
-            print(f"No implementation available for action: {action_name}")
+    # Route the question and run the actions concurrently, printing agent
+    # steps, tokens and rows as they arrive instead of after each action ends
+    try:
+        asyncio.run(stream_answer(analyzer, question, registry))
+    finally:
+        registry.shutdown()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import functools
+import json
+import time
+from aiohttp import web
+from .utils.action_analyzer import ActionAnalyzer
+from .utils.action_registry import get_registry
+from .utils.request_queue import AdmissionQueue, QueueFullError, DeadlineExceededError, PRIORITIES
+from .utils.telemetry import get_telemetry
+from .batch import answer_question, astream_answer
+from .config.config import (
+    SERVER_HOST, SERVER_PORT, SERVER_SOCKET, SERVER_WORKERS, SERVER_QUEUE_SIZE, SERVER_REQUEST_TIMEOUT,
+    STREAM_QUEUE_SIZE
+)
+
+# Results can hold values json doesn't know, such as dates from SQL rows
+_dumps = functools.partial(json.dumps, default=str)
+
+class AgentService:
+    """Answers questions for many concurrent clients from one warm process
+
+    Questions go through an AdmissionQueue and are answered by a fixed number
+    of worker tasks sharing one analyzer and the action registry. When the
+    queue is full, or a question couldn't start before its deadline, the
+    client is told to back off with a 503 and a Retry-After header instead of
+    piling more work onto the process.
+
+    /ask/stream answers as newline-delimited JSON events (see
+    `astream_answer`), written as they are produced. When a client
+    disconnects, the work on its question is cancelled.
+
+    Args:
+        workers (int): Questions answered at once
+        queue_size (int): Questions allowed to wait for a worker
+        request_timeout (float): Default and maximum deadline of a question, in seconds
+    """
+
+    def __init__(self, workers: int = SERVER_WORKERS, queue_size: int = SERVER_QUEUE_SIZE,
+                 request_timeout: float = SERVER_REQUEST_TIMEOUT):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.request_timeout = request_timeout
+        self.analyzer = None
+        self.registry = get_registry()
+        self.queue = None
+        self._workers = []
+
+    async def start(self, app=None):
+        """Warm up the analyzer and actions, then start the workers"""
+        self.analyzer = ActionAnalyzer()
+        await self.registry.awarm_up(self.analyzer.available_actions)
+        self.queue = AdmissionQueue(self.queue_size, self.workers)
+        get_telemetry().register_stats("server_queue", self.queue.stats)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, app=None):
+        """Fail waiting questions, stop the workers and close the actions"""
+        if self.queue is not None:
+            await self.queue.close()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self.registry.ashutdown()
+
+    async def _answer(self, question: str, events: asyncio.Queue = None) -> dict:
+        """Answer a question, passing its stream events on when a queue is given"""
+        if events is None:
+            return await answer_question(self.analyzer, question, self.registry)
+        result = None
+        async for event in astream_answer(self.analyzer, question, self.registry):
+            await events.put(event)
+            if event["type"] == "done":
+                result = {"actions": event["actions"], "results": event["results"]}
+        return result
+
+    async def _worker(self):
+        telemetry = get_telemetry()
+        while True:
+            request = await self.queue.get()
+            started = time.monotonic()
+            request.queued = started - request.enqueued
+            telemetry.observe("server.queue_wait", request.queued)
+            remaining = request.remaining
+            work = asyncio.ensure_future(self._answer(*request.payload))
+            # The client went away: stop working on its question
+            request.future.add_done_callback(lambda future, work=work: future.cancelled() and work.cancel())
+            try:
+                result = await asyncio.wait_for(work, timeout=remaining if remaining != float("inf") else None)
+                if not request.future.done():
+                    request.future.set_result(result)
+            except asyncio.TimeoutError:
+                request.fail(DeadlineExceededError("The deadline passed while the question was answered"))
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    # The worker itself is stopping
+                    request.future.cancel()
+                    raise
+                if request.future.cancelled():
+                    # The client went away, nobody is waiting for the answer
+                    telemetry.increment("server_cancelled")
+                else:
+                    request.fail(RuntimeError("Answering the question was cancelled"))
+            except Exception as e:
+                request.fail(e)
+            finally:
+                self.queue.task_done(time.monotonic() - started)
+
+    async def ask(self, question: str, priority: str = "normal", timeout: float = None) -> dict:
+        """Queue a question and wait for its answer
+
+        Raises:
+            ValueError: On an unknown priority
+            QueueFullError: When the question is not admitted or is evicted
+            DeadlineExceededError: When the answer isn't ready by the deadline
+        """
+        timeout = min(timeout, self.request_timeout) if timeout else self.request_timeout
+        request = await self.queue.submit((question, None), priority, timeout)
+        result = await request.future
+        return {**result, "queued": round(request.queued, 3)}
+
+    @staticmethod
+    async def _parse_ask(request: web.Request):
+        """Return the question, priority and timeout of a request
+
+        Raises:
+            ValueError: On a malformed body
+        """
+        try:
+            body = await request.json()
+            question = body.get("question")
+            priority = body.get("priority", "normal")
+            timeout = float(body.get("timeout") or 0)
+        except (ValueError, TypeError, AttributeError) as e:
+            raise ValueError(str(e))
+        if not isinstance(question, str) or not question.strip():
+            raise ValueError("Field 'question' must be a non-empty string")
+        if priority not in PRIORITIES:
+            raise ValueError(f"Field 'priority' must be one of {list(PRIORITIES)}")
+        return question, priority, timeout
+
+    async def handle_ask(self, request: web.Request) -> web.Response:
+        started = time.monotonic()
+        try:
+            question, priority, timeout = await self._parse_ask(request)
+        except ValueError as e:
+            return self._respond({"error": f"Invalid request: {str(e)}"}, 400, "normal", started)
+
+        try:
+            result = await self.ask(question, priority, timeout)
+        except QueueFullError as e:
+            headers = {"Retry-After": str(int(e.retry_after + 0.5))}
+            return self._respond({"error": str(e)}, 503, priority, started, headers)
+        except DeadlineExceededError as e:
+            return self._respond({"error": str(e)}, 504, priority, started)
+        except Exception as e:
+            return self._respond({"error": str(e)}, 500, priority, started)
+        return self._respond(result, 200, priority, started)
+
+    async def handle_ask_stream(self, request: web.Request) -> web.StreamResponse:
+        """Answer a question as newline-delimited JSON events, written as they happen
+
+        Errors before the answer starts get the same status codes as /ask.
+        Once the response has started, errors are sent as a final event with
+        the type "error".
+        """
+        started = time.monotonic()
+        try:
+            question, priority, timeout = await self._parse_ask(request)
+        except ValueError as e:
+            return self._respond({"error": f"Invalid request: {str(e)}"}, 400, "normal", started)
+
+        timeout = min(timeout, self.request_timeout) if timeout else self.request_timeout
+        events = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        try:
+            queued = await self.queue.submit((question, events), priority, timeout)
+        except QueueFullError as e:
+            headers = {"Retry-After": str(int(e.retry_after + 0.5))}
+            return self._respond({"error": str(e)}, 503, priority, started, headers)
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        status = 200
+        try:
+            await response.prepare(request)
+            while True:
+                get = asyncio.ensure_future(events.get())
+                await asyncio.wait({get, queued.future}, return_when=asyncio.FIRST_COMPLETED)
+                if not get.done():
+                    get.cancel()
+                    break
+                await response.write((_dumps(get.result()) + "\n").encode("utf-8"))
+            while not events.empty():
+                await response.write((_dumps(events.get_nowait()) + "\n").encode("utf-8"))
+            error = queued.future.exception()
+            if error is not None:
+                status = 504 if isinstance(error, DeadlineExceededError) else 503 if isinstance(error, QueueFullError) else 500
+                await response.write((_dumps({"type": "error", "error": str(error), "status": status}) + "\n").encode("utf-8"))
+            await response.write_eof()
+        except (ConnectionResetError, asyncio.CancelledError):
+            # The client disconnected; the worker stops answering
+            status = 499
+            raise
+        finally:
+            queued.future.cancel()
+            elapsed = time.monotonic() - started
+            telemetry = get_telemetry()
+            telemetry.increment("server_requests", status=status, priority=priority)
+            telemetry.observe("server.request", elapsed)
+        return response
+
+    def _respond(self, body: dict, status: int, priority: str, started: float, headers=None) -> web.Response:
+        elapsed = time.monotonic() - started
+        telemetry = get_telemetry()
+        telemetry.increment("server_requests", status=status, priority=priority)
+        telemetry.observe("server.request", elapsed)
+        return web.json_response({**body, "elapsed": round(elapsed, 3)}, status=status,
+                                 headers=headers, dumps=_dumps)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "queue": self.queue.stats()})
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=get_telemetry().prometheus_text(),
+                            content_type="text/plain", charset="utf-8")
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/ask", self.handle_ask)
+        app.router.add_post("/ask/stream", self.handle_ask_stream)
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_get("/metrics", self.handle_metrics)
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
+        return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve questions over HTTP or a Unix socket")
+    parser.add_argument("--host", default=SERVER_HOST, help="Address to listen on")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Port to listen on")
+    parser.add_argument("--socket", default=SERVER_SOCKET,
+                        help="Unix socket path to listen on instead of a TCP port")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS,
+                        help="Maximum number of questions answered at once")
+    parser.add_argument("--queue-size", type=int, default=SERVER_QUEUE_SIZE,
+                        help="Maximum number of questions waiting for a worker")
+    parser.add_argument("--timeout", type=float, default=SERVER_REQUEST_TIMEOUT,
+                        help="Default and maximum seconds a question may take, queueing included")
+    args = parser.parse_args()
+
+    service = AgentService(args.workers, args.queue_size, args.timeout)
+    # Cancel handlers of clients that disconnect, so their questions are dropped
+    if args.socket:
+        web.run_app(service.create_app(), path=args.socket, handler_cancellation=True)
+    else:
+        web.run_app(service.create_app(), host=args.host, port=args.port, handler_cancellation=True)
+
+if __name__ == "__main__":
+    main()
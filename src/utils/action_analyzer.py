@@ -1,23 +1,39 @@
-from typing import List, Type
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from ..config.config import OPENAI_API_KEY
-from ..actions.base_action import BaseAction
-from ..actions.csv_action import CSVAction
-from ..actions.web_action import WebAction
-from ..actions.sql_action import SQLDatabaseAction
+from typing import List
+from .llm import get_llm, llm_priority
+from .action_registry import ActionSpec, get_registry
+from .routing_cache import RoutingCache, routing_fingerprint
+from .fast_router import FastRouter
+from .telemetry import get_telemetry, traced, set_span_attribute
+from ..config.config import FAST_ROUTER_ENABLED, ROUTING_LOG_PATH, PLANNER_ENABLED
+import ast
 import re
+import os
+import json
+import threading
 
 class ActionAnalyzer:
-    def __init__(self):
-        self.llm = ChatOpenAI(api_key=OPENAI_API_KEY)
-        self.available_actions = [
-            CSVAction,
-            WebAction,
-            SQLDatabaseAction
-        ]
+    def __init__(self, llm=None, cache=None, fast_router=None, actions=None, planner=None):
+        self._llm = llm
+        self.cache = cache or RoutingCache()
+        self.fast_router = fast_router or (FastRouter() if FAST_ROUTER_ENABLED else None)
+        self.routing_log_path = ROUTING_LOG_PATH
+        self._log_lock = threading.Lock()
+        # Specs only: an action's module is imported once it is selected
+        self.available_actions = list(actions or get_registry().available_actions())
+        self.planner = planner
+        if planner is None and PLANNER_ENABLED:
+            # The planner reads the CSV catalog and the database's tables
+            from .planner import Planner
+            self.planner = Planner(self.available_actions, llm=llm, cache=self.cache)
         self._create_prompt_template()
 
+    @property
+    def llm(self):
+        # Questions the fast router or the cache answers never need the client
+        if self._llm is None:
+            self._llm = get_llm()
+        return self._llm
+
     def _create_prompt_template(self):
         template = """
         Given the following question: {question}
@@ -31,46 +47,65 @@ class ActionAnalyzer:
         Only include actions that are directly relevant to answering the question.
         """
         
-        self.prompt = ChatPromptTemplate.from_template(template)
+        self.template = template
+        self._prompt = None
+
+    @property
+    def prompt(self):
+        # Built on the first LLM routing call; importing the prompt classes is slow
+        if self._prompt is None:
+            from langchain_core.prompts import ChatPromptTemplate
+            self._prompt = ChatPromptTemplate.from_template(self.template)
+        return self._prompt
 
     def _parse_response(self, response_content: str) -> List[str]:
         """Parse the response from OpenAI to extract action names"""
-        # First, try to evaluate as a Python list
-        try:
-            return eval(response_content)
-        except (SyntaxError, ValueError):
-            # If eval fails, try to parse as bullet points
-            action_names = []
-            lines = response_content.strip().split('\n')
-            for line in lines:
-                line = line.strip()
-                # Check for bullet point format (- Action name)
-                if line.startswith('- '):
-                    action_names.append(line[2:].strip())
-                # Check for numbered list format (1. Action name)
-                elif re.match(r'^\d+\.\s+', line):
-                    action_names.append(re.sub(r'^\d+\.\s+', '', line).strip())
-            return action_names
-
-    def get_required_actions(self, question: str) -> List[Type[BaseAction]]:
-        """Analyze the question and return a list of required actions"""
-        # Create the action descriptions string
-        action_descriptions = "\n".join(
+        # First, try to read it as a JSON or Python list literal
+        content = response_content.strip()
+        for parse in (json.loads, ast.literal_eval):
+            try:
+                action_names = parse(content)
+            except (SyntaxError, ValueError, TypeError, MemoryError, RecursionError):
+                continue
+            if isinstance(action_names, list) and all(isinstance(name, str) for name in action_names):
+                return action_names
+        
+        # Otherwise, try to parse it as bullet points
+        action_names = []
+        for line in content.split('\n'):
+            line = line.strip()
+            # Check for bullet point format (- Action name)
+            if line.startswith('- '):
+                action_names.append(line[2:].strip())
+            # Check for numbered list format (1. Action name)
+            elif re.match(r'^\d+\.\s+', line):
+                action_names.append(re.sub(r'^\d+\.\s+', '', line).strip())
+        return action_names
+
+    def _action_descriptions(self) -> str:
+        """Create the action descriptions string"""
+        return "\n".join(
             f"- {action.get_description()}" 
             for action in self.available_actions
         )
-        
-        # Get the response from OpenAI
-        messages = self.prompt.format_messages(
+
+    def _build_messages(self, question: str):
+        """Format the routing prompt for the question"""
+        return self.prompt.format_messages(
             question=question,
-            actions=action_descriptions
+            actions=self._action_descriptions()
         )
-        response = self.llm.invoke(messages)
-        
-        # Parse the response to get action names
-        action_names = self._parse_response(response.content)
-        
-        # Map the descriptions back to action classes
+
+    def _cache_key(self, question: str) -> str:
+        """Cache key covering the question, the action set and the prompt template"""
+        fingerprint = routing_fingerprint(
+            [action.get_description() for action in self.available_actions],
+            self.template
+        )
+        return self.cache.make_key(question, fingerprint)
+
+    def _map_action_names(self, action_names: List[str]) -> List[ActionSpec]:
+        """Map the descriptions back to action specs"""
         selected_actions = []
         for name in action_names:
             for action in self.available_actions:
@@ -78,3 +113,111 @@ class ActionAnalyzer:
                     selected_actions.append(action)
                     
         return selected_actions
+
+    def _fast_route(self, question: str):
+        """Route locally when the intent is obvious, without calling the LLM"""
+        if self.fast_router is None:
+            return None
+        action_names = [action.get_description() for action in self.available_actions]
+        return self.fast_router.route(question, action_names)
+
+    def _log_decision(self, question: str, action_names: List[str]):
+        """Append an LLM routing decision to the log used to train the fast router"""
+        if not self.routing_log_path:
+            return
+        try:
+            directory = os.path.dirname(self.routing_log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            line = json.dumps({"question": question, "actions": action_names})
+            with self._log_lock:
+                with open(self.routing_log_path, "a") as f:
+                    f.write(line + "\n")
+        except Exception as e:
+            print(f"Error writing routing log: {str(e)}")
+
+    def _record_route(self, source: str):
+        """Count where a routing decision came from"""
+        set_span_attribute("source", source)
+        get_telemetry().increment("routing_decisions", source=source)
+
+    @traced("routing")
+    def get_required_actions(self, question: str) -> List[ActionSpec]:
+        """Analyze the question and return a list of required actions"""
+        action_names = self._fast_route(question)
+        if action_names is not None:
+            self._record_route("fast_router")
+            return self._map_action_names(action_names)
+        
+        cache_key = self._cache_key(question)
+        action_names = self.cache.get(cache_key)
+        self._record_route("cache" if action_names is not None else "llm")
+        
+        if action_names is None:
+            # Get the response from OpenAI
+            messages = self._build_messages(question)
+            with llm_priority("routing"):
+                response = self.llm.invoke(messages)
+            
+            # Parse the response to get action names
+            action_names = self._parse_response(response.content)
+            if action_names:
+                self.cache.set(cache_key, action_names)
+                self._log_decision(question, action_names)
+        
+        return self._map_action_names(action_names)
+
+    @traced("routing")
+    async def aget_required_actions(self, question: str) -> List[ActionSpec]:
+        """Async variant of `get_required_actions`"""
+        action_names = self._fast_route(question)
+        if action_names is not None:
+            self._record_route("fast_router")
+            return self._map_action_names(action_names)
+        
+        cache_key = self._cache_key(question)
+        action_names = self.cache.get(cache_key)
+        self._record_route("cache" if action_names is not None else "llm")
+        
+        if action_names is None:
+            messages = self._build_messages(question)
+            with llm_priority("routing"):
+                response = await self.llm.ainvoke(messages)
+            
+            action_names = self._parse_response(response.content)
+            if action_names:
+                self.cache.set(cache_key, action_names)
+                self._log_decision(question, action_names)
+        
+        return self._map_action_names(action_names)
+
+    def _from_planner(self, question: str, plan):
+        """Record where a plan came from and log fresh decisions for the fast router"""
+        self._record_route("planner" if plan.source == "planner" else "planner_cache")
+        if plan.source == "planner":
+            self._log_decision(question, [action.get_description() for action in plan.actions])
+        return plan
+
+    def plan(self, question: str):
+        """Return an ActionPlan for the question
+
+        With the planner enabled, one LLM call chooses the actions, their
+        sources and the SQL mode. Otherwise, when the fast router is confident,
+        or when the planner's answer is unusable, the question is routed and
+        the actions choose their sources.
+        """
+        if self.planner is not None and self._fast_route(question) is None:
+            plan = self.planner.plan(question)
+            if plan is not None:
+                return self._from_planner(question, plan)
+        from .planner import ActionPlan
+        return ActionPlan(self.get_required_actions(question))
+
+    async def aplan(self, question: str):
+        """Async variant of `plan`"""
+        if self.planner is not None and self._fast_route(question) is None:
+            plan = await self.planner.aplan(question)
+            if plan is not None:
+                return self._from_planner(question, plan)
+        from .planner import ActionPlan
+        return ActionPlan(await self.aget_required_actions(question))
@@ -0,0 +1,248 @@
+import asyncio
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Type
+from ..actions.base_action import BaseAction
+from .telemetry import get_telemetry
+from ..config.config import ACTION_TIMEOUT, PIPELINE_TIMEOUT, STREAM_QUEUE_SIZE
+
+# Receives the stream events of a run
+EventSink = Callable[[dict], Awaitable[None]]
+
+def add_upstream_context(params: dict, upstream: Dict[str, object]) -> dict:
+    """Default way to feed dependency outputs into an action
+
+    The results of the actions it depends on are appended to the action's
+    `query` parameter as context. Actions without a query get the params
+    unchanged.
+    """
+    if not upstream or not params.get("query"):
+        return params
+    context = "\n".join(f"- {name}: {result}" for name, result in upstream.items())
+    return {**params, "query": f"{params['query']}\n\nUse these results from other sources:\n{context}"}
+
+class ActionTask:
+    """One node of an action DAG
+
+    Args:
+        name (str): Unique name of the task, used for dependencies and results
+        action_class (type): The action to run, or an ActionSpec for it
+        params (dict): Keyword arguments for the action's `aexecute`
+        depends_on (iterable): Names of tasks whose results this task needs
+        timeout (float, optional): Seconds the action may run; defaults to ACTION_TIMEOUT
+        prepare (callable, optional): Builds the final params from `params` and
+            a dict of dependency results. Defaults to `add_upstream_context`.
+    """
+
+    def __init__(self, name: str, action_class: Type[BaseAction], params: dict,
+                 depends_on: Iterable[str] = (), timeout: Optional[float] = None,
+                 prepare: Optional[Callable[[dict, Dict[str, object]], dict]] = None):
+        self.name = name
+        self.action_class = action_class
+        self.params = params
+        self.depends_on = list(depends_on)
+        self.timeout = timeout
+        self.prepare = prepare or add_upstream_context
+
+def validate_tasks(tasks: List[ActionTask]):
+    """Check that task names are unique and dependencies form a DAG
+
+    Raises:
+        ValueError: On duplicate names, unknown dependencies or cycles
+    """
+    names = [task.name for task in tasks]
+    if len(set(names)) != len(names):
+        raise ValueError("Task names must be unique")
+    by_name = {task.name: task for task in tasks}
+    for task in tasks:
+        unknown = [name for name in task.depends_on if name not in by_name]
+        if unknown:
+            raise ValueError(f"Task {task.name} depends on unknown tasks: {unknown}")
+
+    # Kahn's algorithm: every task must become ready eventually
+    remaining = {task.name: set(task.depends_on) for task in tasks}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Task dependencies contain a cycle: {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+def build_tasks(action_classes: List[Type[BaseAction]], get_params: Callable) -> List[ActionTask]:
+    """Build one task per selected action, named by its description
+
+    Dependencies come from each action's `depends_on` attribute and are kept
+    only when the action they name was selected too.
+
+    Args:
+        action_classes (list): The selected actions, as classes or ActionSpecs
+        get_params (callable): Returns the params for an action, or None when
+            the action has no implementation; such actions are left out
+    """
+    selected = {action_class.get_description() for action_class in action_classes}
+    tasks = []
+    for action_class in action_classes:
+        params = get_params(action_class)
+        if params is None:
+            continue
+        tasks.append(ActionTask(
+            action_class.get_description(), action_class, params,
+            depends_on=[dependency.get_description() for dependency in action_class.depends_on
+                        if dependency.get_description() in selected]
+        ))
+    # Drop dependencies on actions that were left out for lack of params
+    names = {task.name for task in tasks}
+    for task in tasks:
+        task.depends_on = [name for name in task.depends_on if name in names]
+    return tasks
+
+class ActionExecutor:
+    """Run action tasks concurrently, respecting their dependencies
+
+    Each task starts as soon as the tasks it depends on have finished, so
+    independent actions overlap and the total latency approaches that of the
+    slowest chain rather than the sum. Every task has its own timeout, the
+    whole run can have a deadline, and the caller always gets back a result
+    entry for every task:
+
+        {"status": "ok" | "error" | "timeout" | "skipped" | "cancelled",
+         "result": ..., "error": ..., "elapsed": seconds}
+
+    A task is skipped when one of its dependencies did not succeed. Actions
+    that run in worker threads can't be interrupted; on timeout their result
+    is discarded.
+
+    `stream` runs the same way but uses each action's `astream`, and yields
+    the actions' progress events as they happen.
+    """
+
+    def __init__(self, registry, timeout: float = ACTION_TIMEOUT,
+                 deadline: float = PIPELINE_TIMEOUT):
+        self.registry = registry
+        self.timeout = timeout
+        self.deadline = deadline
+
+    @staticmethod
+    async def _stream_action(name: str, action: BaseAction, params: dict, events: EventSink):
+        """Forward an action's events, tagged with its name, and return its result"""
+        result = None
+        async with aclosing(action.astream(**params)) as stream:
+            async for event in stream:
+                if event["type"] == "result":
+                    # Sent with the outcome in "action_end"
+                    result = event["result"]
+                else:
+                    await events({**event, "action": name})
+        return result
+
+    async def _run_task(self, task: ActionTask, futures: Dict[str, asyncio.Future],
+                        outcomes: Dict[str, dict], events: Optional[EventSink] = None) -> dict:
+        if task.depends_on:
+            await asyncio.gather(*(futures[name] for name in task.depends_on), return_exceptions=True)
+            failed = [name for name in task.depends_on if outcomes.get(name, {}).get("status") != "ok"]
+            if failed:
+                return {"status": "skipped", "error": f"Dependencies did not succeed: {failed}", "elapsed": 0.0}
+
+        start = time.perf_counter()
+        timeout = task.timeout if task.timeout is not None else self.timeout
+        try:
+            upstream = {name: outcomes[name]["result"] for name in task.depends_on}
+            params = task.prepare(task.params, upstream) if task.depends_on else task.params
+            action = await self.registry.aget(task.action_class)
+            if events is None:
+                run = action.aexecute(**params)
+            else:
+                await events({"type": "action_start", "action": task.name})
+                run = self._stream_action(task.name, action, params, events)
+            result = await asyncio.wait_for(run, timeout=timeout or None)
+            return {"status": "ok", "result": result, "elapsed": time.perf_counter() - start}
+        except asyncio.TimeoutError:
+            return {"status": "timeout", "error": f"Action did not finish within {timeout} seconds",
+                    "elapsed": time.perf_counter() - start}
+        except Exception as e:
+            return {"status": "error", "error": str(e), "elapsed": time.perf_counter() - start}
+
+    async def run(self, tasks: List[ActionTask], deadline: Optional[float] = None,
+                  events: Optional[EventSink] = None) -> Dict[str, dict]:
+        """Run the tasks and return an outcome per task name, in task order
+
+        Args:
+            tasks (list): Tasks to run
+            deadline (float, optional): Seconds for the whole run; tasks still
+                running then are cancelled. Defaults to the executor's deadline.
+            events (callable, optional): Coroutine function that receives the
+                stream events of the run; actions then run through `astream`
+        """
+        validate_tasks(tasks)
+        deadline = self.deadline if deadline is None else deadline
+        outcomes: Dict[str, dict] = {}
+        futures: Dict[str, asyncio.Future] = {}
+
+        async def run_and_record(task):
+            outcomes[task.name] = await self._run_task(task, futures, outcomes, events)
+            if events is not None:
+                await events({"type": "action_end", "action": task.name, **outcomes[task.name]})
+
+        # Create every future before any task awaits its dependencies
+        for task in tasks:
+            futures[task.name] = asyncio.ensure_future(run_and_record(task))
+
+        try:
+            _, pending = await asyncio.wait(futures.values(), timeout=deadline or None)
+        except asyncio.CancelledError:
+            for future in futures.values():
+                future.cancel()
+            # Let the tasks unwind, so none is left running once we return
+            await asyncio.gather(*futures.values(), return_exceptions=True)
+            raise
+
+        for future in pending:
+            future.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        for task in tasks:
+            if task.name not in outcomes:
+                outcomes[task.name] = {"status": "cancelled", "error": "The run's deadline passed",
+                                       "elapsed": deadline}
+                if events is not None:
+                    await events({"type": "action_end", "action": task.name, **outcomes[task.name]})
+        telemetry = get_telemetry()
+        for task in tasks:
+            telemetry.increment("actions", action=task.name, status=outcomes[task.name]["status"])
+        return {task.name: outcomes[task.name] for task in tasks}
+
+    async def stream(self, tasks: List[ActionTask], deadline: Optional[float] = None) -> AsyncIterator[dict]:
+        """Run the tasks and yield their events as they happen
+
+        Each task yields "action_start", the events of its action's `astream`
+        tagged with the task name, and "action_end" with its outcome. Events of
+        concurrent tasks are interleaved. Up to STREAM_QUEUE_SIZE events are
+        buffered; after that, actions wait for the consumer. Closing the
+        generator, or cancelling its consumer, cancels the tasks still running.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        run = asyncio.ensure_future(self.run(tasks, deadline, events=queue.put))
+        get = None
+        try:
+            while True:
+                get = asyncio.ensure_future(queue.get())
+                await asyncio.wait({get, run}, return_when=asyncio.FIRST_COMPLETED)
+                if not get.done():
+                    break
+                yield get.result()
+            while not queue.empty():
+                yield queue.get_nowait()
+            # Raise errors of the run itself, such as invalid tasks
+            run.result()
+        finally:
+            if get is not None:
+                get.cancel()
+            if not run.done():
+                run.cancel()
+                await asyncio.gather(run, return_exceptions=True)
+
+    def execute(self, tasks: List[ActionTask], deadline: Optional[float] = None) -> Dict[str, dict]:
+        """Synchronous variant of `run` for callers without an event loop"""
+        return asyncio.run(self.run(tasks, deadline))
@@ -0,0 +1,214 @@
+import asyncio
+import importlib
+import sys
+import threading
+from importlib.metadata import entry_points
+from typing import Dict, Iterable, List, Optional, Type, Union
+from ..actions.base_action import BaseAction
+from .fast_router import SQL_ACTION, CSV_ACTION, WEB_ACTION
+from .llm import get_llm, close_llm, aclose_llm
+
+# Entry point group through which installed packages contribute actions
+ENTRY_POINT_GROUP = "intelligent_agent.actions"
+
+class ActionSpec:
+    """Describes an action without importing it
+
+    Routing only needs an action's description, so actions are listed as
+    specs and their module, with its agents and data libraries, is imported
+    the first time the action is selected. A spec can stand in for its action
+    class wherever one is expected: it has `get_description()` and
+    `depends_on`, and the registry builds the action from it.
+
+    Args:
+        description (str): What the action does, as shown to the router.
+            Must match the class's `get_description()`.
+        target (str): Where the class lives, as "package.module:ClassName"
+    """
+
+    def __init__(self, description: str, target: str):
+        self.description = description
+        self.target = target
+        self._action_class = None
+        self._lock = threading.Lock()
+
+    def get_description(self) -> str:
+        return self.description
+
+    def load(self) -> Type[BaseAction]:
+        """Import the action's module and return its class
+
+        Raises:
+            ImportError: If the module or class can't be found
+            TypeError: If the target is not a BaseAction subclass
+        """
+        if self._action_class is None:
+            with self._lock:
+                if self._action_class is None:
+                    module_name, _, class_name = self.target.partition(":")
+                    module = importlib.import_module(module_name)
+                    try:
+                        action_class = getattr(module, class_name)
+                    except AttributeError:
+                        raise ImportError(f"Module {module_name} has no action {class_name}") from None
+                    if not (isinstance(action_class, type) and issubclass(action_class, BaseAction)):
+                        raise TypeError(f"{self.target} is not a BaseAction subclass")
+                    self._action_class = action_class
+        return self._action_class
+
+    @property
+    def loaded(self) -> bool:
+        return self._action_class is not None
+
+    @property
+    def depends_on(self):
+        return self.load().depends_on
+
+    def __repr__(self):
+        return f"ActionSpec({self.description!r}, {self.target!r})"
+
+# Actions that ship with the agent, in the order they are offered to the router
+BUILTIN_ACTIONS = [
+    ActionSpec(CSV_ACTION, "src.actions.csv_action:CSVAction"),
+    ActionSpec(WEB_ACTION, "src.actions.web_action:WebAction"),
+    ActionSpec(SQL_ACTION, "src.actions.sql_action:SQLDatabaseAction"),
+]
+
+def resolve_action(action: Union[ActionSpec, Type[BaseAction]]) -> Type[BaseAction]:
+    """Return the action class for a spec, or the class itself"""
+    return action.load() if isinstance(action, ActionSpec) else action
+
+def discover_actions(group: str = ENTRY_POINT_GROUP) -> List[ActionSpec]:
+    """List the built-in actions followed by those installed as plugins
+
+    A plugin registers an entry point in the group that names either an
+    ActionSpec, so the plugin's heavy module stays unimported until the action
+    is selected, or a BaseAction subclass. Plugins whose description clashes
+    with an action already listed, or that fail to load, are skipped.
+    """
+    actions = list(BUILTIN_ACTIONS)
+    descriptions = {action.get_description() for action in actions}
+    for entry_point in entry_points(group=group):
+        try:
+            action = entry_point.load()
+            if not isinstance(action, ActionSpec):
+                if not (isinstance(action, type) and issubclass(action, BaseAction)):
+                    raise TypeError("entry point must name an ActionSpec or a BaseAction subclass")
+                action = ActionSpec(action.get_description(), entry_point.value)
+        except Exception as e:
+            print(f"Error loading action plugin {entry_point.name}: {str(e)}")
+            continue
+        if action.get_description() in descriptions:
+            print(f"Skipping action plugin {entry_point.name}: "
+                  f"an action named {action.get_description()!r} already exists")
+            continue
+        descriptions.add(action.get_description())
+        actions.append(action)
+    return actions
+
+class ActionRegistry:
+    """Long-lived pool of action instances shared across requests
+
+    Each action is built once, on first use or during `warm_up`, together with
+    its agents and database connections, and reused for every later request.
+    All actions share the process-wide LLM client from `get_llm`. Actions can
+    be given as classes or as ActionSpecs, which are imported on first use.
+    """
+
+    def __init__(self, action_classes: Optional[Iterable[Union[ActionSpec, Type[BaseAction]]]] = None):
+        self.action_classes = list(action_classes or [])
+        self._instances: Dict[Type[BaseAction], BaseAction] = {}
+        self._lock = threading.Lock()
+        self._available = None
+
+    def available_actions(self) -> List[ActionSpec]:
+        """Return the specs of every known action, discovering plugins once"""
+        if self._available is None:
+            with self._lock:
+                if self._available is None:
+                    self._available = discover_actions()
+        return self._available
+
+    def get(self, action_class: Union[ActionSpec, Type[BaseAction]]) -> BaseAction:
+        """Return the shared instance of an action, building it if needed"""
+        action_class = resolve_action(action_class)
+        instance = self._instances.get(action_class)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(action_class)
+                if instance is None:
+                    instance = action_class()
+                    self._instances[action_class] = instance
+        return instance
+
+    async def aget(self, action_class: Union[ActionSpec, Type[BaseAction]]) -> BaseAction:
+        """Async variant of `get` that imports and builds the action in a worker thread"""
+        instance = None
+        if not isinstance(action_class, ActionSpec) or action_class.loaded:
+            instance = self._instances.get(resolve_action(action_class))
+        if instance is None:
+            instance = await asyncio.to_thread(self.get, action_class)
+        return instance
+
+    def warm_up(self, action_classes: Optional[Iterable[Union[ActionSpec, Type[BaseAction]]]] = None):
+        """Build the LLM client and the given actions ahead of the first request
+
+        Args:
+            action_classes: Actions to build. Defaults to the registry's actions.
+        """
+        get_llm()
+        for action_class in action_classes or self.action_classes:
+            self.get(action_class)
+
+    async def awarm_up(self, action_classes: Optional[Iterable[Union[ActionSpec, Type[BaseAction]]]] = None):
+        """Async variant of `warm_up`"""
+        await asyncio.to_thread(self.warm_up, action_classes)
+
+    def _release_instances(self):
+        """Close every built action and forget it"""
+        with self._lock:
+            instances, self._instances = self._instances, {}
+        for instance in instances.values():
+            try:
+                instance.close()
+            except Exception as e:
+                print(f"Error closing action {type(instance).__name__}: {str(e)}")
+
+    @staticmethod
+    def _close_shared_resources():
+        """Stop the process-wide pools that actions share
+
+        Actions don't close these themselves since the planner and other
+        action instances may still use them. Only modules that were imported
+        can have started a pool, so the others aren't imported here.
+        """
+        db_engine = sys.modules.get(f"{__package__}.db_engine")
+        if db_engine is not None:
+            db_engine.shutdown_db()
+        code_sandbox = sys.modules.get(f"{__package__}.code_sandbox")
+        if code_sandbox is not None:
+            code_sandbox.shutdown_sandbox_pool()
+
+    def shutdown(self):
+        """Close every action, the shared database and sandbox pools and the LLM client"""
+        self._release_instances()
+        self._close_shared_resources()
+        close_llm()
+
+    async def ashutdown(self):
+        """Async variant of `shutdown` that also closes async connection pools"""
+        await asyncio.to_thread(self._release_instances)
+        await asyncio.to_thread(self._close_shared_resources)
+        await aclose_llm()
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> ActionRegistry:
+    """Return the process-wide action registry"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ActionRegistry()
+    return _registry
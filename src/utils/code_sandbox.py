@@ -0,0 +1,202 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Type
+from langchain_core.tools import BaseTool
+from langchain_experimental.tools.python.tool import sanitize_input
+from pydantic import BaseModel, Field
+from . import sandbox_worker
+from ..config.config import (
+    CSV_SANDBOX_WORKERS, CSV_SANDBOX_CPU_SECONDS, CSV_SANDBOX_TIMEOUT,
+    CSV_SANDBOX_MEMORY_MB, CSV_SANDBOX_FRAMES_PER_WORKER
+)
+
+class SandboxPool:
+    """Pool of worker processes that run LLM-generated pandas code
+
+    Code runs outside the serving process, so it doesn't hold the GIL or
+    crash the service. Each worker keeps recently used DataFrames loaded,
+    and receives only the code and a small source description per call.
+    Calls are limited in CPU time and wall-clock time, and each worker's
+    address space is capped.
+
+    Every worker is a single-process executor that runs one call at a time;
+    calls wait for a free worker. A worker whose call hangs, crashes or is
+    abandoned by a cancelled caller is killed and replaced on its own, so
+    the calls running on the other workers carry on.
+    """
+
+    def __init__(self, max_workers: int = CSV_SANDBOX_WORKERS,
+                 cpu_seconds: float = CSV_SANDBOX_CPU_SECONDS,
+                 timeout: float = CSV_SANDBOX_TIMEOUT,
+                 memory_mb: int = CSV_SANDBOX_MEMORY_MB,
+                 frames_per_worker: int = CSV_SANDBOX_FRAMES_PER_WORKER):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cpu_seconds = cpu_seconds
+        self.timeout = timeout
+        self.memory_bytes = memory_mb * 1024 * 1024 if memory_mb else 0
+        self.frames_per_worker = frames_per_worker
+        self._workers = set()
+        self._idle = []
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _new_worker(self) -> ProcessPoolExecutor:
+        # Called with the lock held; the process starts on the first call
+        worker = ProcessPoolExecutor(
+            max_workers=1,
+            # Spawned workers don't inherit the parent's threads or locks
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=sandbox_worker.init_worker,
+            initargs=(self.memory_bytes, self.frames_per_worker)
+        )
+        self._workers.add(worker)
+        return worker
+
+    def _checkout(self) -> concurrent.futures.Future:
+        """Return a future that resolves to a worker reserved for one call"""
+        waiter = concurrent.futures.Future()
+        with self._lock:
+            if self._idle:
+                waiter.set_result(self._idle.pop())
+            elif len(self._workers) < self.max_workers:
+                waiter.set_result(self._new_worker())
+            else:
+                self._waiters.append(waiter)
+        return waiter
+
+    def _checkin(self, worker: ProcessPoolExecutor):
+        """Hand a worker to the next waiting call, or mark it idle"""
+        with self._lock:
+            if worker not in self._workers:
+                # The pool was shut down
+                return
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                try:
+                    waiter.set_result(worker)
+                    return
+                except concurrent.futures.InvalidStateError:
+                    # The waiting caller was cancelled
+                    continue
+            self._idle.append(worker)
+
+    def _replace(self, worker: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Kill a worker that is stuck or dead and return a fresh one in its place"""
+        for process in list(getattr(worker, "_processes", {}).values()):
+            process.terminate()
+        worker.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            if worker not in self._workers:
+                return worker
+            self._workers.discard(worker)
+            return self._new_worker()
+
+    def run(self, code: str, source: dict) -> str:
+        """Run code against a source DataFrame in a worker process"""
+        worker = self._checkout().result()
+        try:
+            future = worker.submit(sandbox_worker.run_code, code, source, self.cpu_seconds)
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            worker = self._replace(worker)
+            return f"TimeoutError: the code did not finish within {self.timeout} seconds"
+        except BrokenProcessPool:
+            worker = self._replace(worker)
+            return "RuntimeError: the sandbox worker crashed while running the code"
+        finally:
+            self._checkin(worker)
+
+    async def arun(self, code: str, source: dict) -> str:
+        """Async variant of `run`"""
+        waiter = self._checkout()
+        try:
+            worker = await asyncio.wrap_future(waiter)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # A worker was handed over just as the caller was cancelled
+                self._checkin(waiter.result())
+            raise
+        future = None
+        try:
+            future = worker.submit(sandbox_worker.run_code, code, source, self.cpu_seconds)
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            worker = self._replace(worker)
+            return f"TimeoutError: the code did not finish within {self.timeout} seconds"
+        except BrokenProcessPool:
+            worker = self._replace(worker)
+            return "RuntimeError: the sandbox worker crashed while running the code"
+        except asyncio.CancelledError:
+            if future is not None and not future.done():
+                # Nobody waits for the code any more; stop it
+                worker = self._replace(worker)
+            raise
+        finally:
+            self._checkin(worker)
+
+    def shutdown(self):
+        """Stop all worker processes"""
+        with self._lock:
+            workers, self._workers = list(self._workers), set()
+            self._idle = []
+            waiters, self._waiters = self._waiters, deque()
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_exception(RuntimeError("The sandbox was shut down"))
+        for worker in workers:
+            worker.shutdown(wait=True, cancel_futures=True)
+
+class SandboxInput(BaseModel):
+    query: str = Field(description="code snippet to run")
+
+class SandboxedPythonTool(BaseTool):
+    """Drop-in replacement for the pandas agent's REPL tool that runs in the sandbox
+
+    It keeps the REPL tool's name and arguments, so agents created with
+    `create_pandas_dataframe_agent` can use it without changing their prompt
+    or bound tool schema.
+    """
+    name: str = "python_repl_ast"
+    description: str = (
+        "A Python shell. Use this to execute python commands. "
+        "Input should be a valid python command. "
+        "The dataframe is available as `df` and pandas as `pd`. "
+        "Each call starts with a fresh namespace, so define everything you need in the same call. "
+        "When using this tool, sometimes output is abbreviated - "
+        "make sure it does not look abbreviated before using it in your answer."
+    )
+    args_schema: Type[BaseModel] = SandboxInput
+    pool: SandboxPool
+    source: dict
+
+    def _run(self, query: str, run_manager=None) -> str:
+        return self.pool.run(sanitize_input(query), self.source)
+
+    async def _arun(self, query: str, run_manager=None) -> str:
+        return await self.pool.arun(sanitize_input(query), self.source)
+
+_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+def get_sandbox_pool() -> SandboxPool:
+    """Return the process-wide sandbox pool; workers start on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SandboxPool()
+    return _pool
+
+def shutdown_sandbox_pool():
+    """Stop the process-wide sandbox pool, if it was started"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
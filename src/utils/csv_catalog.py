@@ -0,0 +1,227 @@
+import glob
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+import pandas as pd
+from .source_index import SourceIndex
+from ..config.config import (
+    CSV_DATA_DIR, CSV_CATALOG_PATH, CSV_CATALOG_REFRESH_INTERVAL, CSV_CATALOG_CHUNK_SIZE
+)
+
+# Number of distinct sample values kept for each non-numeric column
+MAX_SAMPLE_VALUES = 5
+
+def _json_value(value):
+    """Convert a pandas/numpy scalar into something json can store"""
+    if pd.isna(value):
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    return value if isinstance(value, (int, float, bool)) else str(value)
+
+def profile_csv(file_path: str, sample_rows: int = 5, chunk_size: int = CSV_CATALOG_CHUNK_SIZE) -> dict:
+    """Read a CSV in chunks and collect its columns, dtypes, row count and statistics
+
+    Args:
+        file_path (str): Path to the CSV file
+        sample_rows (int): Number of leading rows to keep as samples
+        chunk_size (int): Rows read per chunk, bounding memory for large files
+
+    Returns:
+        dict: Catalog entry for the file (without its fingerprint)
+    """
+    row_count = 0
+    dtypes: Dict[str, str] = {}
+    stats: Dict[str, dict] = {}
+    samples: List[dict] = []
+
+    for chunk in pd.read_csv(file_path, chunksize=chunk_size):
+        if not dtypes:
+            dtypes = {column: str(dtype) for column, dtype in chunk.dtypes.items()}
+            samples = [
+                {column: _json_value(value) for column, value in row.items()}
+                for row in chunk.head(sample_rows).to_dict(orient="records")
+            ]
+            stats = {column: {"nulls": 0} for column in chunk.columns}
+        row_count += len(chunk)
+
+        for column in chunk.columns:
+            series = chunk[column]
+            column_stats = stats.setdefault(column, {"nulls": 0})
+            column_stats["nulls"] += int(series.isna().sum())
+            non_null = series.dropna()
+            if non_null.empty:
+                continue
+            if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                low, high = _json_value(non_null.min()), _json_value(non_null.max())
+                column_stats["min"] = low if "min" not in column_stats else min(column_stats["min"], low)
+                column_stats["max"] = high if "max" not in column_stats else max(column_stats["max"], high)
+                column_stats["sum"] = column_stats.get("sum", 0.0) + float(non_null.sum())
+                column_stats["count"] = column_stats.get("count", 0) + int(non_null.count())
+            else:
+                values = column_stats.setdefault("sample_values", [])
+                for value in non_null.unique():
+                    if len(values) >= MAX_SAMPLE_VALUES:
+                        break
+                    value = _json_value(value)
+                    if value not in values:
+                        values.append(value)
+            if dtypes.get(column) != str(series.dtype):
+                # Inference differed between chunks
+                both_numeric = (
+                    pd.api.types.is_numeric_dtype(series) and
+                    pd.api.types.is_numeric_dtype(pd.api.types.pandas_dtype(dtypes[column]))
+                )
+                dtypes[column] = "float64" if both_numeric else "object"
+
+    for column_stats in stats.values():
+        count = column_stats.pop("count", 0)
+        total = column_stats.pop("sum", None)
+        if count:
+            column_stats["mean"] = total / count
+
+    return {
+        "columns": list(dtypes),
+        "dtypes": dtypes,
+        "row_count": row_count,
+        "stats": stats,
+        "samples": samples
+    }
+
+class CSVCatalog:
+    """Persistent catalog of the CSV files in a data directory
+
+    Each entry is keyed by file path and stores the file's mtime and size, so
+    `refresh` only re-reads files that were added or changed since the last
+    scan. The catalog is saved as JSON and reloaded on startup.
+    """
+
+    def __init__(self, data_dir: str = CSV_DATA_DIR, path: Optional[str] = CSV_CATALOG_PATH,
+                 refresh_interval: float = CSV_CATALOG_REFRESH_INTERVAL, sample_rows: int = 5):
+        self.data_dir = data_dir
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.sample_rows = sample_rows
+        self._entries: Dict[str, dict] = {}
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._index = SourceIndex()
+        self._index_state = None
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self._entries = data.get(self.data_dir, {})
+        except Exception as e:
+            print(f"Error loading CSV catalog {self.path}: {str(e)}")
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            data = {}
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            data[self.data_dir] = self._entries
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Write to a temporary file first so readers never see a partial catalog
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error saving CSV catalog {self.path}: {str(e)}")
+
+    def refresh(self, force: bool = False) -> List[dict]:
+        """Re-profile added or changed files and drop deleted ones
+
+        Scans are skipped if the last one happened less than `refresh_interval`
+        seconds ago, unless `force` is set.
+
+        Returns:
+            list: Catalog entries for all CSV files in the data directory
+        """
+        with self._lock:
+            now = time.time()
+            if not force and self._entries and now - self._last_refresh < self.refresh_interval:
+                return list(self._entries.values())
+
+            changed = False
+            seen = set()
+            for file_path in glob.glob(os.path.join(self.data_dir, "*.csv")):
+                seen.add(file_path)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                entry = self._entries.get(file_path)
+                if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                    continue
+                try:
+                    entry = profile_csv(file_path, self.sample_rows)
+                except Exception as e:
+                    print(f"Error reading CSV file {file_path}: {str(e)}")
+                    continue
+                entry.update({"file_path": file_path, "mtime": stat.st_mtime, "size": stat.st_size})
+                self._entries[file_path] = entry
+                changed = True
+
+            for file_path in set(self._entries) - seen:
+                del self._entries[file_path]
+                changed = True
+
+            if changed:
+                self._save()
+            self._last_refresh = now
+            return list(self._entries.values())
+
+    def entries(self) -> List[dict]:
+        """Return up-to-date catalog entries, refreshing if needed"""
+        return self.refresh()
+
+    def get(self, file_path: str) -> Optional[dict]:
+        """Return the catalog entry for a file, if it is in the data directory"""
+        self.refresh()
+        return self._entries.get(file_path)
+
+    @staticmethod
+    def _describe(entry: dict) -> str:
+        """Text indexed for a file: its name, columns and sample text values"""
+        words = [os.path.splitext(os.path.basename(entry["file_path"]))[0]]
+        words.extend(entry["columns"])
+        for column_stats in entry["stats"].values():
+            words.extend(str(value) for value in column_stats.get("sample_values", []))
+        return " ".join(words)
+
+    def search(self, question: str, top_k: int) -> List[dict]:
+        """Return the `top_k` catalog entries most relevant to the question"""
+        entries = self.refresh()
+        with self._lock:
+            state = sorted((e["file_path"], e["mtime"], e["size"]) for e in entries)
+            if state != self._index_state:
+                self._index.build({e["file_path"]: self._describe(e) for e in entries})
+                self._index_state = state
+            ranked = self._index.search(question, top_k)
+        by_path = {e["file_path"]: e for e in entries}
+        return [by_path[file_path] for file_path, _ in ranked if file_path in by_path]
+
+_catalogs: Dict[str, CSVCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+def get_csv_catalog(data_dir: str = CSV_DATA_DIR) -> CSVCatalog:
+    """Return the process-wide catalog for a data directory"""
+    with _catalogs_lock:
+        catalog = _catalogs.get(data_dir)
+        if catalog is None:
+            catalog = CSVCatalog(data_dir)
+            _catalogs[data_dir] = catalog
+        return catalog
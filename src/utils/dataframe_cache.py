@@ -0,0 +1,174 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+import pandas as pd
+from .telemetry import get_telemetry, traced
+from ..config.config import DATAFRAME_CACHE_MAX_MB, DATAFRAME_SPILL_DIR
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    # Spilling to columnar sidecars is optional
+    pa = None
+    feather = None
+
+def _hash(value: str) -> str:
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()[:16]
+
+def file_fingerprint(file_path: str) -> str:
+    """Identify a file's current contents by its path, mtime and size"""
+    stat = os.stat(file_path)
+    return _hash(f"{os.path.abspath(file_path)}:{stat.st_mtime_ns}:{stat.st_size}")
+
+class DataFrameCache:
+    """Process-wide cache of parsed CSV files
+
+    Frames are keyed by the file fingerprint and the `pandas_kwargs` used to
+    parse them, and held in memory up to `max_bytes` with LRU eviction. When
+    pyarrow is installed, each parsed frame is also written to a Feather
+    sidecar in `spill_dir`; later cold loads memory-map that columnar file
+    instead of parsing the CSV text again.
+    """
+
+    def __init__(self, max_bytes: int = DATAFRAME_CACHE_MAX_MB * 1024 * 1024,
+                 spill_dir: Optional[str] = DATAFRAME_SPILL_DIR):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir if spill_dir and feather is not None else None
+        self._frames = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "spill_hits": 0, "misses": 0, "evictions": 0}
+        get_telemetry().register_stats("dataframe_cache", self.stats)
+
+    @staticmethod
+    def _kwargs_key(pandas_kwargs: Optional[dict]) -> str:
+        return json.dumps(pandas_kwargs or {}, sort_keys=True, default=str)
+
+    def _spill_path(self, file_path: str, fingerprint: str, kwargs_key: str) -> str:
+        path_hash = _hash(os.path.abspath(file_path))
+        return os.path.join(self.spill_dir, f"{path_hash}-{fingerprint}-{_hash(kwargs_key)}.feather")
+
+    def _read_spill(self, spill_path: str) -> Optional[pd.DataFrame]:
+        if not os.path.exists(spill_path):
+            return None
+        try:
+            return feather.read_table(spill_path, memory_map=True).to_pandas()
+        except Exception as e:
+            print(f"Error reading spilled frame {spill_path}: {str(e)}")
+            return None
+
+    def _write_spill(self, df: pd.DataFrame, spill_path: str):
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            # Remove sidecars for older versions of the same file
+            prefix, fingerprint = os.path.basename(spill_path).split("-")[:2]
+            for stale in glob.glob(os.path.join(self.spill_dir, f"{prefix}-*.feather")):
+                if os.path.basename(stale).split("-")[1] != fingerprint:
+                    os.remove(stale)
+            tmp_path = f"{spill_path}.{os.getpid()}.tmp"
+            feather.write_feather(pa.Table.from_pandas(df, preserve_index=True), tmp_path)
+            os.replace(tmp_path, spill_path)
+        except Exception as e:
+            print(f"Error spilling frame to {spill_path}: {str(e)}")
+
+    def _insert(self, key, df: pd.DataFrame):
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            # Too large to keep resident; later loads come from the spill file
+            return
+        with self._lock:
+            if key in self._frames:
+                return
+            self._frames[key] = (df, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._frames:
+                _, (_, evicted_size) = self._frames.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+
+    @traced("csv.load")
+    def get(self, file_path: str, pandas_kwargs: Optional[dict] = None) -> pd.DataFrame:
+        """Return the parsed CSV, loading it from memory, the spill file or the CSV
+
+        The returned frame is a shallow copy, so adding or replacing columns
+        does not affect the cached frame.
+        """
+        fingerprint = file_fingerprint(file_path)
+        kwargs_key = self._kwargs_key(pandas_kwargs)
+        key = (fingerprint, kwargs_key)
+
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is not None:
+                self._frames.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry[0].copy(deep=False)
+
+        df = None
+        spill_path = None
+        if self.spill_dir:
+            spill_path = self._spill_path(file_path, fingerprint, kwargs_key)
+            df = self._read_spill(spill_path)
+
+        with self._lock:
+            self._stats["spill_hits" if df is not None else "misses"] += 1
+
+        if df is None:
+            df = pd.read_csv(file_path, **(pandas_kwargs or {}))
+            if spill_path:
+                self._write_spill(df, spill_path)
+
+        self._insert(key, df)
+        return df.copy(deep=False)
+
+    def source(self, file_path: str, pandas_kwargs: Optional[dict] = None) -> dict:
+        """Describe a cached frame so another process can load it without pickling
+
+        The spill path is included when the frame has been spilled, letting the
+        other process memory-map the Feather file instead of parsing the CSV.
+        """
+        fingerprint = file_fingerprint(file_path)
+        kwargs_key = self._kwargs_key(pandas_kwargs)
+        spill_path = None
+        if self.spill_dir:
+            spill_path = self._spill_path(file_path, fingerprint, kwargs_key)
+            if not os.path.exists(spill_path):
+                spill_path = None
+        return {
+            "file_path": file_path,
+            "fingerprint": fingerprint,
+            "kwargs_key": kwargs_key,
+            "pandas_kwargs": pandas_kwargs or {},
+            "spill_path": spill_path
+        }
+
+    def clear(self):
+        """Drop every frame held in memory"""
+        with self._lock:
+            self._frames.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the memory currently used"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["frames"] = len(self._frames)
+            stats["bytes"] = self._bytes
+        return stats
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_dataframe_cache() -> DataFrameCache:
+    """Return the process-wide DataFrame cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DataFrameCache()
+    return _cache
@@ -0,0 +1,93 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import StaticPool
+from ..config.config import (
+    SQL_POOL_SIZE, SQL_MAX_OVERFLOW, SQL_POOL_RECYCLE, SQL_POOL_TIMEOUT, SQL_POOL_PRE_PING,
+    SQL_ASYNC_WORKERS
+)
+
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _pool_options(uri: str) -> dict:
+    url = make_url(uri)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # Every connection to an in-memory database is a separate database
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+    options = {
+        "pool_size": SQL_POOL_SIZE,
+        "max_overflow": SQL_MAX_OVERFLOW,
+        "pool_recycle": SQL_POOL_RECYCLE,
+        "pool_timeout": SQL_POOL_TIMEOUT,
+        "pool_pre_ping": SQL_POOL_PRE_PING
+    }
+    if url.get_backend_name() == "sqlite":
+        # Pooled connections are handed to whichever thread checks them out
+        options["connect_args"] = {"check_same_thread": False}
+    return options
+
+def get_engine(uri: str) -> Engine:
+    """Return the process-wide engine for a database URI
+
+    Every caller shares one connection pool per URI, sized by SQL_POOL_SIZE and
+    SQL_MAX_OVERFLOW. Connections are recycled after SQL_POOL_RECYCLE seconds
+    and checked with a ping before use, so idle connections dropped by the
+    server are replaced transparently.
+    """
+    engine = _engines.get(uri)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(uri)
+            if engine is None:
+                engine = create_engine(uri, **_pool_options(uri))
+                _engines[uri] = engine
+    return engine
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Return the thread pool that runs blocking database calls for async code
+
+    It has as many threads as the engine pool has connections (or
+    SQL_ASYNC_WORKERS), so async callers queue for a thread instead of piling
+    up on the connection pool.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = SQL_ASYNC_WORKERS or SQL_POOL_SIZE + SQL_MAX_OVERFLOW
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sql")
+    return _executor
+
+async def run_in_db_executor(func: Callable, *args, **kwargs):
+    """Run a blocking database call in the bounded database thread pool"""
+    loop = asyncio.get_running_loop()
+    # Carry context variables such as the current telemetry span into the thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+def shutdown_db_executor():
+    """Stop the database thread pool, if it was started"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+def shutdown_db():
+    """Stop the database thread pool and close every engine's pooled connections
+
+    Engines stay usable and reconnect on their next use.
+    """
+    shutdown_db_executor()
+    with _engines_lock:
+        engines = list(_engines.values())
+    for engine in engines:
+        engine.dispose()
@@ -0,0 +1,198 @@
+import json
+import math
+import os
+import random
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+from .sql_result_cache import SQL_STATEMENT_PATTERN
+from ..config.config import FAST_ROUTER_THRESHOLD, FAST_ROUTER_MODEL_PATH
+
+SQL_ACTION = "Execute SQL queries on a database"
+CSV_ACTION = "Read a CSV file and extract data"
+WEB_ACTION = "Connect to internet and browse for data"
+
+# (action description, confidence, pattern) for questions whose intent is obvious
+ROUTING_RULES = [
+    (WEB_ACTION, 0.98, r"https?://\S+|\bwww\.[\w\-]+\.\w+"),
+    (CSV_ACTION, 0.97, r"[\w\-\./]+\.csv\b"),
+    (CSV_ACTION, 0.9, r"\bcsv (file|data|dataset)\b"),
+    (SQL_ACTION, 0.97, r"what tables (are available|do we have)|list (all )?tables|show (me )?(all )?tables"),
+    (SQL_ACTION, 0.95, r"(what is|show) the schema (of|for) |describe ([a-zA-Z_, ]+) table|describe tables? "),
+    (SQL_ACTION, 0.95, SQL_STATEMENT_PATTERN),
+    # "the kitchen table" isn't always a database table, so alone this stays below the threshold
+    (SQL_ACTION, 0.8, r"\b(the|in the|from the) [a-zA-Z_]+ table\b"),
+    (SQL_ACTION, 0.85, r"\b(sql|database)\b"),
+]
+
+COMPILED_RULES = [
+    (action, confidence, re.compile(pattern, re.IGNORECASE))
+    for action, confidence, pattern in ROUTING_RULES
+]
+
+def _tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9_]+(?:\.[a-z0-9]+)?", text.lower())
+
+class HashedNgramClassifier:
+    """Multi-label linear classifier over hashed word n-grams
+
+    Each action gets an independent logistic regression over word unigrams and
+    bigrams hashed into a fixed number of buckets, so the model stays small and
+    needs no vocabulary. It is trained from logged routing decisions.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18):
+        self.n_features = n_features
+        self.labels: Dict[str, dict] = {}
+
+    @property
+    def is_trained(self) -> bool:
+        return bool(self.labels)
+
+    def _features(self, text: str) -> Dict[int, float]:
+        tokens = _tokenize(text)
+        ngrams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        features: Dict[int, float] = {}
+        for ngram in ngrams:
+            index = zlib.crc32(ngram.encode("utf-8")) % self.n_features
+            features[index] = features.get(index, 0.0) + 1.0
+        # L2-normalize so long questions don't dominate
+        norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+        return {k: v / norm for k, v in features.items()}
+
+    @staticmethod
+    def _sigmoid(z: float) -> float:
+        if z < -30:
+            return 0.0
+        if z > 30:
+            return 1.0
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def _score(self, model: dict, features: Dict[int, float]) -> float:
+        weights = model["weights"]
+        z = model["bias"] + sum(weights.get(k, 0.0) * v for k, v in features.items())
+        return self._sigmoid(z)
+
+    def train(self, examples: Iterable[Tuple[str, List[str]]], epochs: int = 10,
+              learning_rate: float = 0.5, l2: float = 1e-5, seed: int = 0):
+        """Fit the classifier on (question, action descriptions) pairs"""
+        data = [(self._features(question), set(actions)) for question, actions in examples]
+        label_names = sorted({label for _, actions in data for label in actions})
+        self.labels = {label: {"bias": 0.0, "weights": {}} for label in label_names}
+
+        rng = random.Random(seed)
+        for _ in range(epochs):
+            rng.shuffle(data)
+            for features, actions in data:
+                for label, model in self.labels.items():
+                    target = 1.0 if label in actions else 0.0
+                    error = self._score(model, features) - target
+                    weights = model["weights"]
+                    for k, v in features.items():
+                        w = weights.get(k, 0.0)
+                        weights[k] = w - learning_rate * (error * v + l2 * w)
+                    model["bias"] -= learning_rate * error
+
+    def predict_proba(self, question: str) -> Dict[str, float]:
+        """Return the probability that each known action is required"""
+        features = self._features(question)
+        return {label: self._score(model, features) for label, model in self.labels.items()}
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"n_features": self.n_features, "labels": self.labels}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "HashedNgramClassifier":
+        with open(path, "r") as f:
+            data = json.load(f)
+        classifier = cls(n_features=data["n_features"])
+        classifier.labels = {
+            label: {"bias": model["bias"], "weights": {int(k): v for k, v in model["weights"].items()}}
+            for label, model in data["labels"].items()
+        }
+        return classifier
+
+def load_routing_log(path: str) -> List[Tuple[str, List[str]]]:
+    """Read (question, actions) pairs logged by ActionAnalyzer"""
+    examples = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("question") and isinstance(record.get("actions"), list):
+                examples.append((record["question"], record["actions"]))
+    return examples
+
+class FastRouter:
+    """Local pre-routing stage that answers obvious questions without the LLM
+
+    Compiled keyword/regex rules catch explicit mentions of tables, `.csv`
+    files and URLs. When a trained classifier is available its probabilities
+    are combined with the rules. Actions are returned only when the decision
+    is at least `threshold` confident; otherwise the caller falls back to the
+    LLM.
+    """
+
+    def __init__(self, threshold: float = FAST_ROUTER_THRESHOLD,
+                 classifier: Optional[HashedNgramClassifier] = None,
+                 model_path: Optional[str] = FAST_ROUTER_MODEL_PATH):
+        self.threshold = threshold
+        self.classifier = classifier
+        if self.classifier is None and model_path and os.path.exists(model_path):
+            try:
+                self.classifier = HashedNgramClassifier.load(model_path)
+            except Exception as e:
+                print(f"Error loading fast router model {model_path}: {str(e)}")
+
+    def _rule_scores(self, question: str) -> Dict[str, float]:
+        scores: Dict[str, float] = {}
+        for action, confidence, pattern in COMPILED_RULES:
+            if pattern.search(question):
+                scores[action] = max(scores.get(action, 0.0), confidence)
+        return scores
+
+    def classify(self, question: str, action_names: List[str]) -> Tuple[List[str], float]:
+        """Score the question against the available actions
+
+        Returns:
+            tuple: (selected action names, confidence of the decision)
+        """
+        scores = self._rule_scores(question)
+        classifier_scores = {}
+        if self.classifier is not None and self.classifier.is_trained:
+            classifier_scores = self.classifier.predict_proba(question)
+
+        selected = []
+        confidence = 1.0
+        for name in action_names:
+            rule_score = scores.get(name)
+            if name in classifier_scores:
+                score = max(classifier_scores[name], rule_score or 0.0)
+            elif rule_score is not None:
+                score = rule_score
+            else:
+                # Neither rules nor model know anything about this action
+                continue
+            if score >= 0.5:
+                selected.append(name)
+            confidence = min(confidence, max(score, 1.0 - score))
+
+        if not selected:
+            return [], 0.0
+        return selected, confidence
+
+    def route(self, question: str, action_names: List[str]) -> Optional[List[str]]:
+        """Return the action names for the question, or None if the LLM is needed"""
+        selected, confidence = self.classify(question, action_names)
+        if selected and confidence >= self.threshold:
+            return selected
+        return None
@@ -0,0 +1,351 @@
+import asyncio
+import codecs
+import email.utils
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from html.parser import HTMLParser
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from ..config.config import (
+    WEB_MAX_CONNECTIONS, WEB_MAX_CONNECTIONS_PER_HOST, WEB_HOST_RATE_LIMIT, WEB_TIMEOUT,
+    WEB_CACHE_DIR, WEB_MAX_TEXT_CHARS, WEB_MAX_BYTES, WEB_USER_AGENT
+)
+
+if TYPE_CHECKING:
+    import aiohttp
+
+# Elements whose content is never shown as page text
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "head"}
+
+# Elements that start a new line of text
+BLOCK_TAGS = {
+    "p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6",
+    "section", "article", "header", "footer", "table", "ul", "ol", "pre", "blockquote", "title"
+}
+
+URL_PATTERN = re.compile(r"\bhttps?://[^\s<>\"'`)\]]+|\bwww\.[^\s<>\"'`)\]]+", re.IGNORECASE)
+
+def extract_urls(text: str) -> List[str]:
+    """Return the URLs mentioned in a question, in order and without duplicates"""
+    urls = []
+    for match in URL_PATTERN.finditer(text):
+        url = match.group(0).rstrip(".,;:!?")
+        if not url.lower().startswith(("http://", "https://")):
+            url = f"https://{url}"
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+class TextExtractor(HTMLParser):
+    """Incremental HTML to text converter
+
+    Feed it decoded chunks as they arrive; it keeps only the visible text and
+    stops collecting once `max_chars` characters have been gathered.
+    """
+
+    def __init__(self, max_chars: int = WEB_MAX_TEXT_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self._parts = []
+        self._size = 0
+        self._skip_depth = 0
+
+    @property
+    def full(self) -> bool:
+        return self._size >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self._append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in BLOCK_TAGS:
+            self._append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._append(re.sub(r"[ \t\r\f\v]+", " ", data))
+
+    def _append(self, text):
+        if not self.full:
+            text = text[:self.max_chars - self._size]
+            self._parts.append(text)
+            self._size += len(text)
+
+    def text(self) -> str:
+        text = "".join(self._parts)
+        lines = (line.strip() for line in text.splitlines())
+        return "\n".join(line for line in lines if line)
+
+class HTTPCache:
+    """On-disk cache of extracted page text with HTTP validators
+
+    Entries follow the response's Cache-Control (`no-store`, `no-cache`,
+    `max-age`, `s-maxage`) or Expires header; responses with only a
+    Last-Modified date stay fresh for a tenth of their age. Stale entries keep
+    their ETag and Last-Modified so the fetcher can revalidate them with a
+    conditional GET instead of downloading the page again.
+    """
+
+    def __init__(self, directory: Optional[str] = WEB_CACHE_DIR):
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url: str) -> Optional[dict]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(url), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, url: str, entry: dict):
+        if not self.directory:
+            return
+        path = self._path(url)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error saving HTTP cache entry for {url}: {str(e)}")
+
+    @staticmethod
+    def policy(headers) -> dict:
+        """Read the caching headers of a response into a cache entry's fields"""
+        directives = {}
+        for part in headers.get("Cache-Control", "").split(","):
+            name, _, value = part.strip().partition("=")
+            if name:
+                directives[name.lower()] = value.strip('"')
+        max_age = None
+        for name in ("s-maxage", "max-age"):
+            if directives.get(name, "").isdigit():
+                max_age = int(directives[name])
+                break
+        now = time.time()
+        expires = None
+        if max_age is not None:
+            expires = now + max_age
+        elif headers.get("Expires"):
+            parsed = email.utils.parsedate_tz(headers["Expires"])
+            expires = email.utils.mktime_tz(parsed) if parsed else now
+        elif headers.get("Last-Modified"):
+            parsed = email.utils.parsedate_tz(headers["Last-Modified"])
+            if parsed:
+                expires = now + max(0, now - email.utils.mktime_tz(parsed)) / 10
+        return {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "no_store": "no-store" in directives,
+            "revalidate": "no-cache" in directives,
+            "expires": expires
+        }
+
+    @staticmethod
+    def is_fresh(entry: dict) -> bool:
+        return not entry.get("revalidate") and bool(entry.get("expires")) and time.time() < entry["expires"]
+
+class HostRateLimiter:
+    """Space out requests to each host to at most `rate` per second"""
+
+    def __init__(self, rate: float = WEB_HOST_RATE_LIMIT):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, host: str):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, now))
+            self._next[host] = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+class HTTPFetcher:
+    """Pooled async HTTP client that returns the text of web pages
+
+    All requests run on one event loop in a background thread, sharing an
+    aiohttp session whose connector keeps connections alive and limits them
+    per host. Sync callers use `fetch_many`, async callers `afetch_many`,
+    from any thread or event loop. Response bodies are read in chunks and
+    converted to text as they arrive; reading stops at WEB_MAX_TEXT_CHARS
+    characters of text or WEB_MAX_BYTES bytes, so large pages are never
+    buffered whole.
+    """
+
+    def __init__(self, cache: Optional[HTTPCache] = None, rate_limit: float = WEB_HOST_RATE_LIMIT,
+                 max_text_chars: int = WEB_MAX_TEXT_CHARS, max_bytes: int = WEB_MAX_BYTES):
+        self.cache = cache if cache is not None else HTTPCache()
+        self.rate_limit = rate_limit
+        self.max_text_chars = max_text_chars
+        self.max_bytes = max_bytes
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._limiter = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="http-fetcher", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    async def _get_session(self) -> "aiohttp.ClientSession":
+        # Only called on the fetcher's loop, so no lock is needed
+        if self._session is None:
+            # Imported on first fetch so `extract_urls` stays cheap to import
+            import aiohttp
+            connector = aiohttp.TCPConnector(
+                limit=WEB_MAX_CONNECTIONS, limit_per_host=WEB_MAX_CONNECTIONS_PER_HOST
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=WEB_TIMEOUT),
+                headers={"User-Agent": WEB_USER_AGENT}
+            )
+            self._limiter = HostRateLimiter(self.rate_limit)
+        return self._session
+
+    async def _read_text(self, response: "aiohttp.ClientResponse") -> dict:
+        """Convert a response body to text while it streams in"""
+        decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(errors="replace")
+        is_html = "html" in (response.content_type or "")
+        extractor = TextExtractor(self.max_text_chars) if is_html else None
+        parts = []
+        size = 0
+        received = 0
+        truncated = False
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            received += len(chunk)
+            text = decoder.decode(chunk)
+            if extractor is not None:
+                extractor.feed(text)
+                full = extractor.full
+            else:
+                parts.append(text[:self.max_text_chars - size])
+                size += len(parts[-1])
+                full = size >= self.max_text_chars
+            if full or received >= self.max_bytes:
+                # Stop downloading; the rest of the page isn't needed
+                truncated = True
+                break
+        if extractor is not None:
+            extractor.feed(decoder.decode(b"", final=True))
+            extractor.close()
+            text = extractor.text()
+        else:
+            text = "".join(parts).strip()
+        return {"text": text, "truncated": truncated, "bytes": received}
+
+    async def _fetch(self, url: str) -> dict:
+        entry = self.cache.get(url)
+        if entry is not None and HTTPCache.is_fresh(entry):
+            return {"url": url, "status": entry["status"], "text": entry["text"],
+                    "truncated": entry.get("truncated", False), "cache": "hit"}
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        session = await self._get_session()
+        await self._limiter.wait(urlsplit(url).netloc)
+        async with session.get(url, headers=headers) as response:
+            if response.status == 304 and entry is not None:
+                # Unchanged: keep the stored text with the refreshed policy
+                policy = HTTPCache.policy(response.headers)
+                entry.update(expires=policy["expires"], revalidate=policy["revalidate"])
+                for key in ("etag", "last_modified"):
+                    if policy[key]:
+                        entry[key] = policy[key]
+                self.cache.set(url, entry)
+                return {"url": url, "status": entry["status"], "text": entry["text"],
+                        "truncated": entry.get("truncated", False), "cache": "revalidated"}
+
+            body = await self._read_text(response)
+            result = {"url": str(response.url), "status": response.status, "text": body["text"],
+                      "truncated": body["truncated"], "cache": "miss"}
+            policy = HTTPCache.policy(response.headers)
+            if response.status == 200 and not policy["no_store"]:
+                self.cache.set(url, {**policy, "status": response.status, "text": body["text"],
+                                     "truncated": body["truncated"], "stored": time.time()})
+            return result
+
+    async def _fetch_one(self, url: str) -> dict:
+        try:
+            return await self._fetch(url)
+        except Exception as e:
+            return {"url": url, "error": f"{type(e).__name__}: {str(e)}"}
+
+    async def _fetch_many(self, urls: List[str]) -> List[dict]:
+        return await asyncio.gather(*(self._fetch_one(url) for url in urls))
+
+    def fetch_many(self, urls: List[str]) -> List[dict]:
+        """Fetch several URLs concurrently and return one result per URL
+
+        Each result has the URL and either `status`, `text`, `truncated` and
+        `cache` ("hit", "revalidated" or "miss"), or `error`.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._fetch_many(urls), self._ensure_loop())
+        return future.result()
+
+    async def afetch_many(self, urls: List[str]) -> List[dict]:
+        """Async variant of `fetch_many`, usable from any event loop"""
+        future = asyncio.run_coroutine_threadsafe(self._fetch_many(urls), self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    async def afetch_each(self, urls: List[str]) -> AsyncIterator[Tuple[str, dict]]:
+        """Fetch several URLs concurrently and yield (url, result) pairs as each one finishes
+
+        Closing the generator cancels the fetches still running.
+        """
+        loop = self._ensure_loop()
+        futures = {
+            asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._fetch_one(url), loop)): url
+            for url in urls
+        }
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    yield futures[future], future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def close(self):
+        """Close the HTTP session and stop the background loop"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+            thread, self._thread = self._thread, None
+        if loop is None:
+            return
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), loop).result()
+            self._session = None
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
@@ -0,0 +1,115 @@
+import contextvars
+import threading
+from contextlib import contextmanager
+from .telemetry import get_callbacks
+from ..config.config import (
+    OPENAI_API_KEY, LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS, LLM_GATEWAY_ENABLED
+)
+
+_llm = None
+_factory = None
+_lock = threading.Lock()
+
+# Priority classes; lower values get rate-limited capacity first
+LLM_PRIORITIES = {"routing": 0, "planning": 1, "agent": 2}
+
+_priority = contextvars.ContextVar("llm_priority", default="agent")
+
+@contextmanager
+def llm_priority(name: str):
+    """Give the LLM calls made inside the block a priority class
+
+    Calls default to "agent". Routing and planning calls are short and gate
+    everything else a question does, so they jump ahead of agent steps when
+    the gateway is rate limited.
+    """
+    if name not in LLM_PRIORITIES:
+        raise ValueError(f"Unknown LLM priority {name!r}; use one of {list(LLM_PRIORITIES)}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_llm_priority() -> str:
+    """Priority class of LLM calls made from the current context"""
+    return _priority.get()
+
+def _create_llm():
+    """Create a ChatOpenAI client backed by pooled keep-alive HTTP connections"""
+    # Imported here so startup doesn't pay for the OpenAI client until it's used
+    import httpx
+    from langchain_openai import ChatOpenAI
+    limits = httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS
+    )
+    return ChatOpenAI(
+        api_key=OPENAI_API_KEY,
+        http_client=httpx.Client(limits=limits),
+        http_async_client=httpx.AsyncClient(limits=limits),
+        # The gateway retries with backoff shared across callers instead
+        max_retries=0 if LLM_GATEWAY_ENABLED else None,
+        callbacks=get_callbacks()
+    )
+
+def set_llm_factory(factory):
+    """Replace how the shared LLM client is created
+    
+    Benchmarks and tests use this to run every component against a fake chat
+    model without an OpenAI key. Pass None to go back to ChatOpenAI. The
+    current client is dropped, so the next `get_llm` call uses the factory.
+    """
+    global _factory
+    _factory = factory
+    _detach_llm()
+
+def get_llm():
+    """Return the process-wide LLM client, creating it on first use
+    
+    The analyzer and every action share this client, so its HTTP connection
+    pool stays warm across requests. With LLM_GATEWAY_ENABLED the client is
+    wrapped in a GatewayChatModel, so every call shares the gateway's rate
+    limits, retries and deduplication.
+    """
+    global _llm
+    if _llm is None:
+        with _lock:
+            if _llm is None:
+                llm = (_factory or _create_llm)()
+                if LLM_GATEWAY_ENABLED:
+                    from .llm_gateway import GatewayChatModel, get_gateway
+                    llm = GatewayChatModel(inner=llm, gateway=get_gateway(), callbacks=get_callbacks())
+                _llm = llm
+    return _llm
+
+def _detach_llm():
+    """Drop the shared client so the next `get_llm` call creates a new one
+    
+    Returns the underlying client, unwrapped from the gateway model.
+    """
+    global _llm
+    with _lock:
+        llm, _llm = _llm, None
+    if LLM_GATEWAY_ENABLED and llm is not None:
+        from .llm_gateway import GatewayChatModel
+        if isinstance(llm, GatewayChatModel):
+            llm = llm.inner
+    return llm
+
+def close_llm():
+    """Close the shared LLM client's HTTP connections
+    
+    Use `aclose_llm` from async code so the async connection pool is closed
+    on its event loop as well.
+    """
+    llm = _detach_llm()
+    if getattr(llm, "http_client", None) is not None:
+        llm.http_client.close()
+
+async def aclose_llm():
+    """Close the shared LLM client, including its async connection pool"""
+    llm = _detach_llm()
+    if getattr(llm, "http_client", None) is not None:
+        llm.http_client.close()
+        await llm.http_async_client.aclose()
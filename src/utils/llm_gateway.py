@@ -0,0 +1,435 @@
+import asyncio
+import concurrent.futures
+import copy
+import hashlib
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from typing import Any, Callable, Iterator, AsyncIterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+from .llm import LLM_PRIORITIES, current_llm_priority
+from .telemetry import get_telemetry
+from ..config.config import (
+    LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_COMPLETION_TOKEN_ESTIMATE,
+    LLM_MAX_RETRIES, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY
+)
+
+# HTTP statuses and client exceptions worth retrying
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+RETRY_ERRORS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError"}
+
+# Seconds between checks while waiting behind other callers
+POLL_INTERVAL = 0.05
+
+class TokenBucket:
+    """Allows `per_minute` units a minute, in bursts of up to a minute's worth
+
+    A limit of 0 means unlimited. The level can go negative when a call used
+    more than was reserved for it; later calls then wait for the debt.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available"""
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def consume(self, amount: float):
+        if self.rate:
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """Take `amount` more units, or give them back when negative"""
+        if self.rate:
+            self.level = min(self.capacity, self.level - amount)
+
+class _LeaderGone(Exception):
+    """The caller making a shared call stopped, e.g. was cancelled, before it finished"""
+
+class _Ticket:
+    __slots__ = ("rank", "sequence", "tokens")
+
+    def __init__(self, rank: int, sequence: int, tokens: int):
+        self.rank = rank
+        self.sequence = sequence
+        self.tokens = tokens
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.rank, self.sequence) < (other.rank, other.sequence)
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+def _retry_after(error: Exception) -> float:
+    """Seconds the provider asked us to wait, from the Retry-After header"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after") or 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+class LLMGateway:
+    """Single point through which every LLM call in the process is scheduled
+
+    - Rate limiting: token buckets on requests and tokens per minute. A call
+      reserves its estimated tokens up front and the difference is settled
+      once the provider reports actual usage.
+    - Priorities: callers waiting for capacity are served by priority class
+      (see `llm_priority`), then in arrival order.
+    - Retries: rate-limit, timeout and server errors are retried with full
+      jitter exponential backoff. A 429 pauses every caller for its
+      Retry-After, so the process backs off as a whole.
+    - Single-flight: identical calls in flight at the same time are sent
+      once and every caller gets a copy of the result.
+
+    Sync and async callers, from any thread or event loop, share the limits.
+    """
+
+    def __init__(self, requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = LLM_TOKENS_PER_MINUTE, max_retries: int = LLM_MAX_RETRIES,
+                 base_delay: float = LLM_RETRY_BASE_DELAY, max_delay: float = LLM_RETRY_MAX_DELAY):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._waiting: List[_Ticket] = []
+        self._sequence = itertools.count()
+        self._blocked_until = 0.0
+        self._in_flight = {}
+        self.calls = 0
+        self.deduplicated = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        get_telemetry().register_stats("llm_gateway", self.stats)
+
+    def _enqueue(self, tokens: int) -> _Ticket:
+        ticket = _Ticket(LLM_PRIORITIES[current_llm_priority()], next(self._sequence), tokens)
+        with self._lock:
+            heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _try_acquire(self, ticket: _Ticket) -> float:
+        """Take capacity if the ticket is first in line; otherwise return seconds to wait"""
+        with self._lock:
+            if self._waiting[0] is not ticket:
+                return POLL_INTERVAL
+            now = time.monotonic()
+            wait = max(self._blocked_until - now, self.requests.wait_time(1, now),
+                       self.tokens.wait_time(ticket.tokens, now))
+            if wait > 0:
+                return wait
+            heapq.heappop(self._waiting)
+            self.requests.consume(1)
+            self.tokens.consume(ticket.tokens)
+            return 0.0
+
+    def _abandon(self, ticket: _Ticket):
+        with self._lock:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+
+    def _record_wait(self, seconds: float):
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds += seconds
+        get_telemetry().observe("llm.rate_limit_wait", seconds)
+
+    def acquire(self, tokens: int):
+        """Block until a call of about `tokens` tokens may be sent"""
+        ticket = self._enqueue(tokens)
+        started = None
+        try:
+            while True:
+                wait = self._try_acquire(ticket)
+                if not wait:
+                    break
+                started = started or time.monotonic()
+                time.sleep(wait)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        if started is not None:
+            self._record_wait(time.monotonic() - started)
+
+    async def aacquire(self, tokens: int):
+        """Async variant of `acquire`"""
+        ticket = self._enqueue(tokens)
+        started = None
+        try:
+            while True:
+                wait = self._try_acquire(ticket)
+                if not wait:
+                    break
+                started = started or time.monotonic()
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        if started is not None:
+            self._record_wait(time.monotonic() - started)
+
+    def _settle(self, reserved: int, used: Optional[int]):
+        if used is not None:
+            with self._lock:
+                self.tokens.adjust(used - reserved)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying, or None when the error is final"""
+        status = _status_code(error)
+        if attempt >= self.max_retries or (status not in RETRY_STATUSES and type(error).__name__ not in RETRY_ERRORS):
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        with self._lock:
+            self.retries += 1
+            if status == 429 or type(error).__name__ == "RateLimitError":
+                self.rate_limited += 1
+                pause = _retry_after(error)
+                self._blocked_until = max(self._blocked_until, time.monotonic() + pause)
+                delay = max(delay, pause)
+        get_telemetry().increment("llm_retries", status=status or type(error).__name__)
+        return delay
+
+    def _send(self, func: Callable, tokens: int, count_tokens: Callable):
+        for attempt in itertools.count():
+            self.acquire(tokens)
+            try:
+                result = func()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self._settle(tokens, count_tokens(result))
+            return result
+
+    async def _asend(self, func: Callable, tokens: int, count_tokens: Callable):
+        for attempt in itertools.count():
+            await self.aacquire(tokens)
+            try:
+                result = await func()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self._settle(tokens, count_tokens(result))
+            return result
+
+    def _join(self, key: Optional[str]):
+        """Return (future, is_leader) for a single-flight key"""
+        with self._lock:
+            self.calls += 1
+            if key is None:
+                return None, True
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.deduplicated += 1
+                return future, False
+            future = concurrent.futures.Future()
+            self._in_flight[key] = future
+            return future, True
+
+    def _leave(self, key: str, future: concurrent.futures.Future, result=None, error=None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def call(self, func: Callable, key: Optional[str] = None, tokens: int = 0,
+             count_tokens: Callable = lambda result: None):
+        """Run `func` under the gateway's limits and retries
+
+        Args:
+            func (callable): Makes the call; invoked again on each retry
+            key (str, optional): Identifies the request for single-flight
+                deduplication; concurrent calls with the same key share one
+            tokens (int): Estimated tokens the call will use
+            count_tokens (callable): Returns the tokens a result actually used,
+                or None when unknown
+        """
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                return copy.deepcopy(future.result())
+            except _LeaderGone:
+                # One of the waiting callers makes the call instead
+                return self.call(func, key, tokens, count_tokens)
+        if future is None:
+            return self._send(func, tokens, count_tokens)
+        try:
+            result = self._send(func, tokens, count_tokens)
+        except Exception as e:
+            self._leave(key, future, error=e)
+            raise
+        except BaseException:
+            # Our interruption isn't the other callers' error
+            self._leave(key, future, error=_LeaderGone())
+            raise
+        self._leave(key, future, result)
+        return result
+
+    async def acall(self, func: Callable, key: Optional[str] = None, tokens: int = 0,
+                    count_tokens: Callable = lambda result: None):
+        """Async variant of `call`; `func` returns an awaitable"""
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                # Shielded so a caller that gives up doesn't cancel the shared call
+                return copy.deepcopy(await asyncio.shield(asyncio.wrap_future(future)))
+            except _LeaderGone:
+                # One of the waiting callers makes the call instead
+                return await self.acall(func, key, tokens, count_tokens)
+        if future is None:
+            return await self._asend(func, tokens, count_tokens)
+        try:
+            result = await self._asend(func, tokens, count_tokens)
+        except Exception as e:
+            self._leave(key, future, error=e)
+            raise
+        except BaseException:
+            # A cancelled caller, e.g. a client that disconnected, must not
+            # cancel the identical calls of other callers
+            self._leave(key, future, error=_LeaderGone())
+            raise
+        self._leave(key, future, result)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "deduplicated": self.deduplicated,
+                "dedup_rate": self.deduplicated / self.calls if self.calls else 0.0,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "waiting": len(self._waiting),
+                "in_flight": len(self._in_flight),
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 3)
+            }
+
+def _estimate_tokens(messages: List[BaseMessage], kwargs: dict) -> int:
+    """Rough token count of a call: about four characters per token"""
+    characters = sum(len(str(message.content)) for message in messages)
+    if kwargs:
+        characters += len(json.dumps(kwargs, default=str))
+    return characters // 4 + LLM_COMPLETION_TOKEN_ESTIMATE
+
+def _result_tokens(result: ChatResult) -> Optional[int]:
+    """Tokens used by a call, from the provider output or message metadata"""
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    if usage.get("total_tokens") is not None:
+        return usage["total_tokens"]
+    if usage.get("prompt_tokens") is not None:
+        return usage["prompt_tokens"] + usage.get("completion_tokens", 0)
+    total = 0
+    for generation in result.generations:
+        metadata = getattr(generation.message, "usage_metadata", None) or {}
+        total += metadata.get("total_tokens", 0)
+    return total or None
+
+class GatewayChatModel(BaseChatModel):
+    """Chat model that sends every call of a wrapped model through an LLMGateway
+
+    It is what `get_llm` returns when the gateway is enabled, so the analyzer,
+    the actions and their agents all share the gateway's limits. Tool binding
+    is delegated to the wrapped model. Streamed calls are rate limited but
+    neither retried nor deduplicated, since their chunks go straight to the
+    caller.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: BaseChatModel
+    gateway: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return self.inner._llm_type
+
+    @property
+    def _identifying_params(self) -> dict:
+        return self.inner._identifying_params
+
+    def _key(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: dict) -> str:
+        payload = json.dumps({
+            "model": self.inner._identifying_params,
+            "messages": [message.model_dump(exclude={"id"}) for message in messages],
+            "stop": stop,
+            "kwargs": kwargs
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return self.gateway.call(
+            lambda: self.inner._generate(messages, stop=stop, **kwargs),
+            key=self._key(messages, stop, kwargs),
+            tokens=_estimate_tokens(messages, kwargs),
+            count_tokens=_result_tokens
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return await self.gateway.acall(
+            lambda: self.inner._agenerate(messages, stop=stop, **kwargs),
+            key=self._key(messages, stop, kwargs),
+            tokens=_estimate_tokens(messages, kwargs),
+            count_tokens=_result_tokens
+        )
+
+    def _should_stream(self, *, async_api: bool, run_manager=None, **kwargs) -> bool:
+        # Stream only when the wrapped model can; otherwise calls go through `_generate`
+        return self.inner._should_stream(async_api=async_api, run_manager=run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        self.gateway.acquire(_estimate_tokens(messages, kwargs))
+        yield from self.inner._stream(messages, stop=stop, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        await self.gateway.aacquire(_estimate_tokens(messages, kwargs))
+        async for chunk in self.inner._astream(messages, stop=stop, **kwargs):
+            yield chunk
+
+    def bind_tools(self, tools, **kwargs):
+        # Let the wrapped model format the tools, but keep calls on the gateway
+        return self.bind(**self.inner.bind_tools(tools, **kwargs).kwargs)
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+def get_gateway() -> LLMGateway:
+    """Return the process-wide LLM gateway"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
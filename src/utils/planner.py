@@ -0,0 +1,220 @@
+import asyncio
+import os
+from typing import List, Optional, Tuple
+from .csv_catalog import get_csv_catalog
+from .fast_router import SQL_ACTION
+from .llm import get_llm, llm_priority
+from .query_plan import parse_plan
+from .routing_cache import RoutingCache, routing_fingerprint
+from .source_index import SourceIndex
+from .sql_database import get_database
+from .telemetry import traced
+from ..config.config import CSV_DATA_DIR, CSV_SHORTLIST_K, SQL_TABLE_SHORTLIST_K, DB_CONNECTION_STRING
+
+# How the SQL action should answer a question
+SQL_MODES = ("direct", "generated", "agent")
+
+PLANNER_TEMPLATE = """
+Plan how to answer the following question: {question}
+
+Available actions:
+{actions}
+
+CSV files:
+{csv_files}
+
+Database tables:
+{tables}
+
+Respond with a single JSON object with these fields:
+- "actions": the names of the actions needed to answer the question, exactly as they appear above
+- "csv_files": the paths of the CSV files needed, from the list above; empty if no CSV action is needed
+- "tables": the database tables needed, from the list above; empty if no SQL action is needed
+- "sql_mode": "direct" if the question is itself a SQL statement or asks to list tables or show a schema,
+  "generated" if a single SQL query answers it, "agent" if it needs several queries or exploring the data,
+  or null if no SQL action is needed
+Only include what is directly relevant to answering the question.
+"""
+
+class ActionPlan:
+    """What to do for a question: the actions and, when planned, their sources
+
+    Args:
+        actions (list): Selected actions, as ActionSpecs or classes
+        csv_files (list): CSV files the CSV action should read; empty to let it choose
+        tables (list): Tables the SQL action should use; empty to let it shortlist
+        sql_mode (str, optional): One of SQL_MODES, or None to let the SQL
+            action's parameters be parsed from the question
+        source (str, optional): Where the plan came from: "planner", "cache",
+            or None when only the actions were routed
+    """
+
+    def __init__(self, actions: list, csv_files: Optional[List[str]] = None,
+                 tables: Optional[List[str]] = None, sql_mode: Optional[str] = None,
+                 source: Optional[str] = None):
+        self.actions = list(actions)
+        self.csv_files = list(csv_files or [])
+        self.tables = list(tables or [])
+        self.sql_mode = sql_mode
+        self.source = source
+
+    def to_dict(self) -> dict:
+        return {
+            "actions": [action.get_description() for action in self.actions],
+            "csv_files": self.csv_files,
+            "tables": self.tables,
+            "sql_mode": self.sql_mode
+        }
+
+class Planner:
+    """Chooses actions, data sources and the SQL mode with a single LLM call
+
+    Routing, CSV file selection and the SQL mode decision otherwise take up
+    to three LLM round trips one after the other. The planner shows the LLM
+    the actions, a shortlist of CSV files from the catalog and of database
+    tables, and asks for all decisions as one JSON object. The answer is
+    checked against those lists: unknown actions are dropped, and files or
+    tables that weren't offered are ignored, leaving the action to choose.
+    Plans are cached like routing decisions.
+    """
+
+    def __init__(self, actions: list, llm=None, cache=None, data_dir: str = CSV_DATA_DIR,
+                 db_uri: str = DB_CONNECTION_STRING):
+        self.actions = list(actions)
+        self._llm = llm
+        self.cache = cache or RoutingCache()
+        self.data_dir = data_dir
+        self.db_uri = db_uri
+        self.template = PLANNER_TEMPLATE
+        self._prompt = None
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = get_llm()
+        return self._llm
+
+    @property
+    def prompt(self):
+        if self._prompt is None:
+            from langchain_core.prompts import ChatPromptTemplate
+            self._prompt = ChatPromptTemplate.from_template(self.template)
+        return self._prompt
+
+    def _csv_candidates(self, question: str) -> List[dict]:
+        catalog = get_csv_catalog(self.data_dir)
+        entries = sorted(catalog.entries(), key=lambda entry: entry["file_path"])
+        if len(entries) > CSV_SHORTLIST_K:
+            entries = catalog.search(question, CSV_SHORTLIST_K)
+        return entries
+
+    def _table_candidates(self, question: str) -> List[str]:
+        try:
+            tables = sorted(get_database(self.db_uri).get_usable_table_names())
+        except Exception as e:
+            print(f"Error listing database tables for the planner: {str(e)}")
+            return []
+        if len(tables) > SQL_TABLE_SHORTLIST_K:
+            index = SourceIndex()
+            index.build({table: table for table in tables})
+            tables = [table for table, _ in index.search(question, SQL_TABLE_SHORTLIST_K)]
+        return tables
+
+    def _prepare(self, question: str) -> Tuple[List[dict], List[str], str]:
+        """Gather the candidate sources and the cache key for a question"""
+        csv_entries = self._csv_candidates(question)
+        tables = self._table_candidates(question)
+        fingerprint = routing_fingerprint(
+            [action.get_description() for action in self.actions]
+            + [entry["file_path"] for entry in csv_entries] + tables,
+            self.template
+        )
+        return csv_entries, tables, self.cache.make_key(question, fingerprint)
+
+    def _build_messages(self, question: str, csv_entries: List[dict], tables: List[str]):
+        csv_files = "\n".join(
+            f"- {entry['file_path']} (columns: {', '.join(entry['columns'])})" for entry in csv_entries
+        )
+        return self.prompt.format_messages(
+            question=question,
+            actions="\n".join(f"- {action.get_description()}" for action in self.actions),
+            csv_files=csv_files or "(none)",
+            tables="\n".join(f"- {table}" for table in tables) or "(none)"
+        )
+
+    def validate(self, raw: dict, question: str, csv_files: List[str], tables: List[str],
+                 source: str = "planner") -> ActionPlan:
+        """Check a plan from the LLM against the actions and candidate sources
+
+        Raises:
+            ValueError: If the plan is malformed or names no known action
+        """
+        names = raw.get("actions")
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise ValueError("Plan field 'actions' must be a list of action names")
+        by_description = {action.get_description(): action for action in self.actions}
+        actions = []
+        for name in names:
+            action = by_description.get(name.strip())
+            if action is not None and action not in actions:
+                actions.append(action)
+        if names and not actions:
+            raise ValueError(f"Plan names no known action: {names}")
+
+        def strings(field):
+            values = raw.get(field) or []
+            return [value.strip() for value in values if isinstance(value, str)] if isinstance(values, list) else []
+
+        # A file the question names explicitly may be outside the catalog
+        chosen_files = [path for path in strings("csv_files")
+                        if path in csv_files or (path in question and os.path.exists(path))]
+        chosen_tables = [table for table in strings("tables") if table in tables]
+        sql_mode = raw.get("sql_mode")
+        if not any(action.get_description() == SQL_ACTION for action in actions):
+            sql_mode = None
+        elif sql_mode not in SQL_MODES:
+            sql_mode = "agent"
+        return ActionPlan(actions, chosen_files, chosen_tables, sql_mode, source)
+
+    def _from_response(self, content: str, question: str, csv_entries: List[dict],
+                       tables: List[str], cache_key: str) -> Optional[ActionPlan]:
+        raw = parse_plan(content)
+        if raw is None:
+            print("Planner returned no valid JSON plan")
+            return None
+        try:
+            plan = self.validate(raw, question, [entry["file_path"] for entry in csv_entries], tables)
+        except ValueError as e:
+            print(f"Invalid plan from planner: {str(e)}")
+            return None
+        if plan.actions:
+            self.cache.set(cache_key, [plan.to_dict()])
+        return plan
+
+    def _cached(self, cache_key: str, question: str, csv_entries: List[dict], tables: List[str]) -> Optional[ActionPlan]:
+        cached = self.cache.get(cache_key)
+        if not cached:
+            return None
+        return self.validate(cached[0], question, [entry["file_path"] for entry in csv_entries], tables, "cache")
+
+    @traced("planning")
+    def plan(self, question: str) -> Optional[ActionPlan]:
+        """Plan a question, or return None when the LLM's plan is unusable"""
+        csv_entries, tables, cache_key = self._prepare(question)
+        plan = self._cached(cache_key, question, csv_entries, tables)
+        if plan is not None:
+            return plan
+        with llm_priority("routing"):
+            response = self.llm.invoke(self._build_messages(question, csv_entries, tables))
+        return self._from_response(response.content, question, csv_entries, tables, cache_key)
+
+    @traced("planning")
+    async def aplan(self, question: str) -> Optional[ActionPlan]:
+        """Async variant of `plan`"""
+        csv_entries, tables, cache_key = await asyncio.to_thread(self._prepare, question)
+        plan = self._cached(cache_key, question, csv_entries, tables)
+        if plan is not None:
+            return plan
+        with llm_priority("routing"):
+            response = await self.llm.ainvoke(self._build_messages(question, csv_entries, tables))
+        return self._from_response(response.content, question, csv_entries, tables, cache_key)
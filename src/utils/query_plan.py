@@ -0,0 +1,166 @@
+import json
+import re
+from typing import List, Optional
+import pandas as pd
+
+FILTER_OPS = ("==", "!=", ">", ">=", "<", "<=", "in", "not_in", "contains")
+AGGREGATIONS = ("sum", "mean", "count", "min", "max", "median", "nunique")
+
+PLAN_FORMAT = """{
+  "filters": [{"column": "<column>", "op": "==|!=|>|>=|<|<=|in|not_in|contains", "value": <value or list>}],
+  "group_by": ["<column>", ...],
+  "aggregations": [{"column": "<column or *>", "func": "sum|mean|count|min|max|median|nunique", "alias": "<name>"}],
+  "select": ["<column>", ...],
+  "sort": [{"column": "<selected or grouped column, or alias>", "descending": true|false}],
+  "limit": <integer or null>
+}"""
+
+def parse_plan(content: str) -> Optional[dict]:
+    """Extract a JSON plan from an LLM response
+
+    Returns:
+        dict: The plan, or None if the response says the question can't be
+            expressed as a plan or isn't valid JSON
+    """
+    content = content.strip()
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", content, re.DOTALL)
+    if fenced:
+        content = fenced.group(1).strip()
+    try:
+        plan = json.loads(content)
+    except json.JSONDecodeError:
+        return None
+    return plan if isinstance(plan, dict) else None
+
+def validate_plan(plan: dict, columns: List[str]) -> dict:
+    """Check a plan against the file's columns and fill in defaults
+
+    Raises:
+        ValueError: If the plan references unknown columns or operations
+    """
+    columns = list(columns)
+    for key in ("filters", "aggregations", "sort"):
+        if not all(isinstance(item, dict) for item in plan.get(key) or []):
+            raise ValueError(f"Plan {key} must be a list of objects")
+    normalized = {
+        "filters": plan.get("filters") or [],
+        "group_by": plan.get("group_by") or [],
+        "aggregations": [dict(item) for item in plan.get("aggregations") or []],
+        "select": plan.get("select") or [],
+        "sort": plan.get("sort") or [],
+        "limit": plan.get("limit")
+    }
+
+    for condition in normalized["filters"]:
+        if condition.get("column") not in columns:
+            raise ValueError(f"Unknown filter column: {condition.get('column')}")
+        if condition.get("op") not in FILTER_OPS:
+            raise ValueError(f"Unsupported filter operation: {condition.get('op')}")
+        if condition["op"] in ("in", "not_in") and not isinstance(condition.get("value"), list):
+            raise ValueError(f"Filter operation {condition['op']} needs a list value")
+
+    for column in normalized["group_by"] + normalized["select"]:
+        if column not in columns:
+            raise ValueError(f"Unknown column: {column}")
+
+    aliases = []
+    for aggregation in normalized["aggregations"]:
+        if aggregation.get("func") not in AGGREGATIONS:
+            raise ValueError(f"Unsupported aggregation: {aggregation.get('func')}")
+        column = aggregation.get("column")
+        if column not in columns and not (column == "*" and aggregation["func"] == "count"):
+            raise ValueError(f"Unknown aggregation column: {column}")
+        aggregation.setdefault("alias", f"{aggregation['func']}_{'rows' if column == '*' else column}")
+        aliases.append(aggregation["alias"])
+
+    if normalized["group_by"] and not normalized["aggregations"]:
+        raise ValueError("group_by needs at least one aggregation")
+
+    # Sorting happens on the result, so only its columns can be sorted by
+    if normalized["aggregations"]:
+        output_columns = normalized["group_by"] + aliases
+    else:
+        output_columns = normalized["select"] or columns
+    for order in normalized["sort"]:
+        if order.get("column") not in output_columns:
+            raise ValueError(f"Sort column is not in the result: {order.get('column')}")
+
+    limit = normalized["limit"]
+    if limit is not None and (not isinstance(limit, int) or limit < 0):
+        raise ValueError(f"Invalid limit: {limit}")
+
+    return normalized
+
+def _apply_filter(df: pd.DataFrame, condition: dict) -> pd.Series:
+    series = df[condition["column"]]
+    op, value = condition["op"], condition.get("value")
+    if op == "==":
+        return series == value
+    if op == "!=":
+        return series != value
+    if op == ">":
+        return series > value
+    if op == ">=":
+        return series >= value
+    if op == "<":
+        return series < value
+    if op == "<=":
+        return series <= value
+    if op == "in":
+        return series.isin(value)
+    if op == "not_in":
+        return ~series.isin(value)
+    return series.astype(str).str.contains(str(value), case=False, regex=False, na=False)
+
+def filter_frame(df: pd.DataFrame, plan: dict) -> pd.DataFrame:
+    """Apply the plan's filters to a frame"""
+    if not plan["filters"]:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for condition in plan["filters"]:
+        mask &= _apply_filter(df, condition)
+    return df[mask]
+
+def sort_and_limit(result: pd.DataFrame, plan: dict) -> pd.DataFrame:
+    """Apply the plan's ordering and row limit to a result"""
+    if plan["sort"]:
+        result = result.sort_values(
+            by=[order["column"] for order in plan["sort"]],
+            ascending=[not order.get("descending", False) for order in plan["sort"]]
+        )
+    if plan["limit"] is not None:
+        result = result.head(plan["limit"])
+    return result.reset_index(drop=True)
+
+def execute_plan(df: pd.DataFrame, plan: dict) -> pd.DataFrame:
+    """Run a validated plan with vectorized pandas operations"""
+    df = filter_frame(df, plan)
+
+    if plan["aggregations"]:
+        named = {}
+        for aggregation in plan["aggregations"]:
+            column = aggregation["column"]
+            if column == "*":
+                # Count rows using any column; size includes nulls
+                named[aggregation["alias"]] = pd.NamedAgg(column=df.columns[0], aggfunc="size")
+            else:
+                named[aggregation["alias"]] = pd.NamedAgg(column=column, aggfunc=aggregation["func"])
+        if plan["group_by"]:
+            result = df.groupby(plan["group_by"], dropna=False).agg(**named).reset_index()
+        else:
+            result = df.assign(_all=0).groupby("_all").agg(**named).reset_index(drop=True)
+    else:
+        result = df[plan["select"]] if plan["select"] else df
+
+    return sort_and_limit(result, plan)
+
+def format_result(result: pd.DataFrame, max_rows: int = 100) -> str:
+    """Render a plan result as text for the caller"""
+    if result.empty:
+        return "No rows matched the query"
+    if len(result) == 1 and len(result.columns) == 1:
+        return str(result.iloc[0, 0])
+    text = result.head(max_rows).to_string(index=False)
+    if len(result) > max_rows:
+        text += f"\n... ({len(result) - max_rows} more rows)"
+    return text
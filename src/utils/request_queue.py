@@ -0,0 +1,180 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, List, Optional
+
+# Lower values are served first
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+# Weight of the newest sample in the running average of service times
+SERVICE_TIME_SMOOTHING = 0.2
+
+class QueueFullError(Exception):
+    """The request was not admitted, or was evicted, because the queue is full
+
+    `retry_after` is the number of seconds after which the queue is expected
+    to have room again.
+    """
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class DeadlineExceededError(Exception):
+    """The request's deadline passed before it could be answered"""
+
+class QueuedRequest:
+    """A request waiting in, or taken from, an AdmissionQueue
+
+    The submitter awaits `future`; whoever takes the request sets its result,
+    and `queued`, the seconds it waited before being taken.
+    """
+
+    __slots__ = ("payload", "priority", "sequence", "enqueued", "queued", "deadline", "future")
+
+    def __init__(self, payload: Any, priority: int, sequence: int, deadline: float):
+        self.payload = payload
+        self.priority = priority
+        self.sequence = sequence
+        self.enqueued = time.monotonic()
+        self.queued = None
+        self.deadline = deadline
+        self.future = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other: "QueuedRequest") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+    @property
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def fail(self, error: Exception):
+        if not self.future.done():
+            self.future.set_exception(error)
+
+class AdmissionQueue:
+    """Bounded priority queue that turns excess load away instead of buffering it
+
+    Requests are served by priority, then in arrival order. A request is
+    rejected with QueueFullError when `maxsize` requests are already waiting,
+    unless it outranks the lowest-priority waiting request, which is evicted
+    in its place. It is also rejected when, at the current service rate, it
+    would not start before its deadline. Requests whose deadline passes while
+    they wait are failed with DeadlineExceededError without being served, and
+    requests whose submitter stopped waiting are dropped.
+
+    Args:
+        maxsize (int): Maximum number of waiting requests
+        workers (int): Number of requests served at once, used to estimate waits
+    """
+
+    def __init__(self, maxsize: int, workers: int):
+        self.maxsize = maxsize
+        self.workers = max(1, workers)
+        self._heap: List[QueuedRequest] = []
+        self._sequence = itertools.count()
+        self._condition = asyncio.Condition()
+        self._closed = False
+        self.in_flight = 0
+        self.service_time = 0.0
+        self.admitted = 0
+        self.rejected = 0
+        self.evicted = 0
+        self.expired = 0
+        self.completed = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def estimated_wait(self, priority: int) -> float:
+        """Seconds a request of this priority would wait before being served"""
+        ahead = sum(1 for request in self._heap if request.priority <= priority)
+        busy = max(0, self.in_flight + ahead - self.workers + 1)
+        return busy / self.workers * self.service_time
+
+    def _retry_after(self) -> float:
+        return max(1.0, round(len(self._heap) / self.workers * self.service_time, 1))
+
+    def _reject(self, message: str):
+        self.rejected += 1
+        raise QueueFullError(message, self._retry_after())
+
+    async def submit(self, payload: Any, priority: str = "normal", timeout: Optional[float] = None) -> QueuedRequest:
+        """Admit a request and return it; await its `future` for the answer
+
+        Raises:
+            ValueError: On an unknown priority
+            QueueFullError: When the request is not admitted
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}; use one of {list(PRIORITIES)}")
+        rank = PRIORITIES[priority]
+        deadline = time.monotonic() + timeout if timeout else float("inf")
+        async with self._condition:
+            if self._closed:
+                self._reject("The server is shutting down")
+            if len(self._heap) >= self.maxsize:
+                worst = max(self._heap) if self._heap else None
+                if worst is None or worst.priority <= rank:
+                    self._reject("Too many requests are waiting")
+                self._heap.remove(worst)
+                heapq.heapify(self._heap)
+                self.evicted += 1
+                worst.fail(QueueFullError("Evicted by a higher-priority request", self._retry_after()))
+            if time.monotonic() + self.estimated_wait(rank) > deadline:
+                self._reject("The request would not start before its deadline")
+            request = QueuedRequest(payload, rank, next(self._sequence), deadline)
+            heapq.heappush(self._heap, request)
+            self.admitted += 1
+            self._condition.notify()
+        return request
+
+    async def get(self) -> QueuedRequest:
+        """Wait for the next request to serve and mark it in flight"""
+        async with self._condition:
+            while True:
+                while not self._heap:
+                    await self._condition.wait()
+                request = heapq.heappop(self._heap)
+                if request.future.done():
+                    # The submitter stopped waiting
+                    continue
+                if request.remaining <= 0:
+                    self.expired += 1
+                    request.fail(DeadlineExceededError("The deadline passed while the request was queued"))
+                    continue
+                self.in_flight += 1
+                return request
+
+    def task_done(self, service_time: float):
+        """Record that a request taken with `get` has been served"""
+        self.in_flight -= 1
+        self.completed += 1
+        if self.service_time:
+            self.service_time += SERVICE_TIME_SMOOTHING * (service_time - self.service_time)
+        else:
+            self.service_time = service_time
+
+    async def close(self):
+        """Reject new requests and fail every waiting one"""
+        async with self._condition:
+            self._closed = True
+            waiting, self._heap = self._heap, []
+        for request in waiting:
+            request.fail(QueueFullError("The server is shutting down"))
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._heap),
+            "capacity": self.maxsize,
+            "in_flight": self.in_flight,
+            "workers": self.workers,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "completed": self.completed,
+            "service_seconds": round(self.service_time, 4),
+            "utilization": self.in_flight / self.workers
+        }
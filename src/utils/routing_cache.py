@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+from .telemetry import get_telemetry
+from ..config.config import (
+    ROUTING_CACHE_SIZE, ROUTING_CACHE_TTL, ROUTING_CACHE_PATH, ROUTING_CACHE_DISK_SIZE
+)
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so trivially different phrasings share a cache entry"""
+    question = question.lower().strip()
+    question = re.sub(r"\s+", " ", question)
+    return question.rstrip("?!. ")
+
+def routing_fingerprint(action_descriptions: Iterable[str], template: str) -> str:
+    """Hash the action set and prompt template a routing decision depends on"""
+    payload = json.dumps({"actions": list(action_descriptions), "template": template})
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class RoutingCache:
+    """Two-tier cache of routing decisions
+
+    The first tier is an in-memory LRU. The optional second tier is a SQLite
+    file that survives restarts. Entries expire after `ttl` seconds and both
+    tiers are bounded in size. Keys include a fingerprint of the available
+    actions and the routing prompt, so changing either one stops old entries
+    from matching.
+    """
+
+    def __init__(self, max_size: int = ROUTING_CACHE_SIZE, ttl: int = ROUTING_CACHE_TTL,
+                 path: Optional[str] = ROUTING_CACHE_PATH, max_disk_size: int = ROUTING_CACHE_DISK_SIZE):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_disk_size = max_disk_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0}
+        get_telemetry().register_stats("routing_cache", self.stats)
+        self._conn = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS routing_cache "
+                "(key TEXT PRIMARY KEY, actions TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS routing_cache_created ON routing_cache (created)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(question: str, fingerprint: str) -> str:
+        """Build the cache key for a question under a given action fingerprint"""
+        payload = f"{fingerprint}\n{normalize_question(question)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _is_expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def _remember(self, key: str, actions: List[str], created: float):
+        """Store an entry in the memory tier, evicting the least recently used"""
+        self._memory[key] = (actions, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Return the cached action names for a key, or None on a miss"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                actions, created = entry
+                if not self._is_expired(created):
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return list(actions)
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT actions, created FROM routing_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    actions, created = json.loads(row[0]), row[1]
+                    if not self._is_expired(created):
+                        self._remember(key, actions, created)
+                        self._stats["hits"] += 1
+                        self._stats["disk_hits"] += 1
+                        return list(actions)
+                    self._conn.execute("DELETE FROM routing_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, actions: List[str]):
+        """Cache the action names chosen for a key"""
+        created = time.time()
+        with self._lock:
+            self._remember(key, list(actions), created)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO routing_cache (key, actions, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(actions), created)
+                )
+                self._evict_disk()
+                self._conn.commit()
+
+    def _evict_disk(self):
+        """Drop expired rows and keep the disk tier within its size bound"""
+        if self.ttl > 0:
+            self._conn.execute(
+                "DELETE FROM routing_cache WHERE created < ?", (time.time() - self.ttl,)
+            )
+        if self.max_disk_size > 0:
+            self._conn.execute(
+                "DELETE FROM routing_cache WHERE key IN ("
+                "SELECT key FROM routing_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_size,)
+            )
+
+    def clear(self):
+        """Remove every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM routing_cache")
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current memory tier size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._memory)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        """Close the disk tier"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
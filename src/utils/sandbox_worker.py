@@ -0,0 +1,111 @@
+"""Code that runs inside the CSV sandbox worker processes
+
+This module is imported by freshly spawned workers, so it only depends on the
+standard library and pandas (plus pyarrow when available).
+"""
+import ast
+import os
+from collections import OrderedDict
+from contextlib import redirect_stdout
+from io import StringIO
+import pandas as pd
+
+try:
+    import resource
+    import signal
+except ImportError:
+    # CPU and memory limits are not enforced where resource is unavailable
+    resource = None
+    signal = None
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+class CPUTimeExceeded(Exception):
+    """Raised inside a worker when a call uses up its CPU time budget"""
+
+# Frames loaded in this worker, most recently used last
+_frames = OrderedDict()
+_max_frames = 4
+
+def _on_cpu_limit(signum, frame):
+    raise CPUTimeExceeded("CPU time limit exceeded")
+
+def init_worker(memory_limit_bytes, max_frames):
+    """Process pool initializer: apply the memory limit and CPU-limit handler"""
+    global _max_frames
+    _max_frames = max_frames
+    if resource is None:
+        return
+    if memory_limit_bytes:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, hard))
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+def _load_frame(source):
+    """Return the source's DataFrame, loading it at most once per worker"""
+    key = (source["fingerprint"], source["kwargs_key"])
+    df = _frames.get(key)
+    if df is not None:
+        _frames.move_to_end(key)
+        return df
+    spill_path = source.get("spill_path")
+    if spill_path and feather is not None and os.path.exists(spill_path):
+        # Memory-map the columnar sidecar instead of parsing CSV text
+        df = feather.read_table(spill_path, memory_map=True).to_pandas()
+    else:
+        df = pd.read_csv(source["file_path"], **(source.get("pandas_kwargs") or {}))
+    _frames[key] = df
+    while len(_frames) > _max_frames:
+        _frames.popitem(last=False)
+    return df
+
+def _cpu_time_used():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def _execute(code, namespace):
+    """Run code like a REPL: return the value of the last expression or the output"""
+    tree = ast.parse(code)
+    module = ast.Module(tree.body[:-1], type_ignores=[])
+    exec(ast.unparse(module), namespace)
+    module_end = ast.unparse(ast.Module(tree.body[-1:], type_ignores=[]))
+    io_buffer = StringIO()
+    try:
+        with redirect_stdout(io_buffer):
+            ret = eval(module_end, namespace)
+        return io_buffer.getvalue() if ret is None else str(ret)
+    except SyntaxError:
+        # The last statement is not an expression
+        with redirect_stdout(io_buffer):
+            exec(module_end, namespace)
+        return io_buffer.getvalue()
+
+def run_code(code, source, cpu_seconds):
+    """Execute generated pandas code against the source DataFrame
+
+    Args:
+        code (str): Python code produced by the agent
+        source (dict): File path, fingerprint, pandas kwargs and optional spill path
+        cpu_seconds (float): CPU time this call may use, 0 for no limit
+
+    Returns:
+        str: The result or the error message, like the in-process REPL tool
+    """
+    limited = resource is not None and cpu_seconds
+    if limited:
+        soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        budget = int(_cpu_time_used() + cpu_seconds) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (budget if hard == resource.RLIM_INFINITY else min(budget, hard), hard))
+    try:
+        namespace = {"df": _load_frame(source).copy(deep=False), "pd": pd}
+        return _execute(code, namespace)
+    except MemoryError:
+        return "MemoryError: the code exceeded the sandbox memory limit"
+    except Exception as e:
+        return "{}: {}".format(type(e).__name__, str(e))
+    finally:
+        if limited:
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
@@ -0,0 +1,76 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase terms, breaking up snake_case and CamelCase identifiers
+
+    The whole identifier is kept alongside its parts, so "SalesAmount" yields
+    "salesamount", "sales" and "amount". A trailing plural "s" is dropped.
+    """
+    terms = []
+    for word in re.findall(r"[A-Za-z0-9]+(?:_[A-Za-z0-9]+)*", text):
+        parts = re.findall(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+", word)
+        words = {word.lower()} | {part.lower() for part in parts}
+        words |= {part.lower() for part in word.split("_") if part}
+        for term in words:
+            if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+                term = term[:-1]
+            terms.append(term)
+    return terms
+
+class SourceIndex:
+    """Local BM25 index over data sources such as CSV files and SQL tables
+
+    Documents are short text descriptions (file or table name, column names,
+    column comments) keyed by source id. `search` returns the best matching
+    ids so only a bounded shortlist has to be put in front of the LLM.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._doc_freq: Counter = Counter()
+        self._avg_length = 0.0
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def build(self, documents: Dict[str, str]):
+        """Index the given documents, replacing any previous contents"""
+        self._doc_terms = {}
+        self._doc_lengths = {}
+        self._doc_freq = Counter()
+        for doc_id, text in documents.items():
+            terms = Counter(tokenize(text))
+            self._doc_terms[doc_id] = terms
+            self._doc_lengths[doc_id] = sum(terms.values())
+            self._doc_freq.update(terms.keys())
+        total = sum(self._doc_lengths.values())
+        self._avg_length = total / len(self._doc_lengths) if self._doc_lengths else 0.0
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """Return up to `top_k` (id, score) pairs, best first
+
+        Documents that share no terms with the query score zero; they are still
+        returned, in id order, when there are not enough matches to fill `top_k`.
+        """
+        query_terms = set(tokenize(query))
+        n_docs = len(self._doc_terms)
+        scores = []
+        for doc_id, terms in self._doc_terms.items():
+            score = 0.0
+            length_norm = 1 - self.b + self.b * self._doc_lengths[doc_id] / (self._avg_length or 1.0)
+            for term in query_terms:
+                tf = terms.get(term)
+                if not tf:
+                    continue
+                df = self._doc_freq[term]
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                score += idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+            scores.append((doc_id, score))
+        scores.sort(key=lambda item: (-item[1], item[0]))
+        return scores[:top_k]
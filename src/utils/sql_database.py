@@ -0,0 +1,400 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import closing
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+from sqlalchemy import MetaData, inspect, text
+from langchain_community.utilities.sql_database import SQLDatabase, truncate_word
+from .db_engine import get_engine, run_in_db_executor
+from .sql_result_cache import SQLResultCache, is_read_only
+from .telemetry import get_telemetry, traced
+from ..config.config import (
+    SQL_SCHEMA_CACHE_PATH, SQL_SCHEMA_CHECK_INTERVAL, SQL_SCHEMA_FINGERPRINT_QUERY,
+    SQL_SCHEMA_CACHE_TTL, SQL_RESULT_CACHE_ENABLED, SQL_FETCH_SIZE, SQL_PROMPT_MAX_ROWS,
+    SQL_PROMPT_MAX_BYTES
+)
+
+try:
+    import pyarrow as pa
+except ImportError:
+    # Arrow record batch output is unavailable without pyarrow
+    pa = None
+
+# Statements that select the configured schema, as in SQLDatabase._execute
+SCHEMA_STATEMENTS = {
+    "snowflake": "ALTER SESSION SET search_path = %s",
+    "bigquery": "SET @@dataset_id=?",
+    "trino": "USE ?",
+    "duckdb": "SET search_path TO {schema}",
+    "oracle": "ALTER SESSION SET CURRENT_SCHEMA = {schema}",
+    "postgresql": "SET search_path TO %s",
+}
+
+class SchemaCache:
+    """Snapshot of per-table schema descriptions keyed by a database fingerprint
+
+    The fingerprint is cheap to compute: the file's mtime and size for SQLite,
+    the result of SQL_SCHEMA_FINGERPRINT_QUERY when one is configured (for
+    example the catalog's last DDL change time), and otherwise a time bucket of
+    SQL_SCHEMA_CACHE_TTL seconds. When it changes, every cached description is
+    dropped. Snapshots are also saved to disk so new processes start warm.
+    """
+
+    def __init__(self, engine, path: Optional[str] = SQL_SCHEMA_CACHE_PATH,
+                 check_interval: float = SQL_SCHEMA_CHECK_INTERVAL,
+                 fingerprint_query: Optional[str] = SQL_SCHEMA_FINGERPRINT_QUERY):
+        self._engine = engine
+        self.path = path
+        self.check_interval = check_interval
+        self.fingerprint_query = fingerprint_query
+        self._key = engine.url.render_as_string(hide_password=True)
+        self._tables: Dict[str, str] = {}
+        self._fingerprint = None
+        self._checked = 0.0
+        self.version = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                snapshot = json.load(f).get(self._key)
+            if snapshot:
+                self._fingerprint = snapshot["fingerprint"]
+                self._tables = snapshot["tables"]
+        except Exception as e:
+            print(f"Error loading schema cache {self.path}: {str(e)}")
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            data = {}
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            data[self._key] = {"fingerprint": self._fingerprint, "tables": self._tables}
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error saving schema cache {self.path}: {str(e)}")
+
+    def _compute_fingerprint(self) -> str:
+        url = self._engine.url
+        if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+            parts = []
+            for path in (url.database, f"{url.database}-wal"):
+                if os.path.exists(path):
+                    stat = os.stat(path)
+                    parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+            return "sqlite:" + "/".join(parts)
+        if self.fingerprint_query:
+            with self._engine.connect() as connection:
+                rows = connection.execute(text(self.fingerprint_query)).fetchall()
+            return "query:" + str([tuple(row) for row in rows])
+        return f"ttl:{int(time.time() // SQL_SCHEMA_CACHE_TTL)}"
+
+    def fingerprint(self) -> str:
+        """Return the current fingerprint, invalidating the cache if it changed
+
+        The database is checked at most once every `check_interval` seconds.
+        """
+        with self._lock:
+            now = time.time()
+            if self._checked and now - self._checked < self.check_interval:
+                return self._fingerprint
+            fingerprint = self._compute_fingerprint()
+            self._checked = now
+            if fingerprint != self._fingerprint:
+                self._fingerprint = fingerprint
+                self._tables = {}
+                self.version += 1
+            return fingerprint
+
+    def get(self, table: str) -> Optional[str]:
+        with self._lock:
+            return self._tables.get(table)
+
+    def set(self, descriptions: Dict[str, str]):
+        """Store schema descriptions for tables under the current fingerprint"""
+        with self._lock:
+            self._tables.update(descriptions)
+            self._save()
+
+class CachingSQLDatabase(SQLDatabase):
+    """SQLDatabase with lazy reflection, a schema snapshot cache and a result cache
+
+    Tables are reflected only when their schema is first requested, and each
+    table's description (CREATE TABLE plus sample rows) is reused from the
+    SchemaCache until the database fingerprint changes. Both the direct
+    `get_schema` path and the agent's schema tool go through `get_table_info`,
+    so they share the cache.
+
+    Read-only queries are answered from the SQLResultCache when possible, and
+    writes made through `run` invalidate the entries they affect. The agent's
+    query tool, the query chain and direct SQL all go through `run`. Several
+    instances can share the same caches.
+
+    `run` reads results through a streaming cursor and stops at a row and size
+    limit, so a wide query can't fill memory or the prompt.
+    """
+
+    def __init__(self, engine, schema_cache: Optional[SchemaCache] = None,
+                 result_cache: Optional[SQLResultCache] = None,
+                 max_rows: int = SQL_PROMPT_MAX_ROWS, max_bytes: int = SQL_PROMPT_MAX_BYTES, **kwargs):
+        kwargs.setdefault("lazy_table_reflection", True)
+        super().__init__(engine, **kwargs)
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.schema_cache = schema_cache or SchemaCache(engine)
+        if result_cache is None and SQL_RESULT_CACHE_ENABLED:
+            result_cache = SQLResultCache()
+        self.result_cache = result_cache
+        if result_cache is not None:
+            get_telemetry().register_stats("sql_result_cache", result_cache.stats)
+        self.schema_cache.fingerprint()
+        self._schema_version = self.schema_cache.version
+
+    def _sync_schema(self):
+        """Re-read the table list and drop reflected tables if the schema changed"""
+        self.schema_cache.fingerprint()
+        if self.schema_cache.version == self._schema_version:
+            return
+        self._inspector = inspect(self._engine)
+        self._all_tables = set(
+            list(self._inspector.get_table_names(schema=self._schema))
+            + (self._inspector.get_view_names(schema=self._schema) if self._view_support else [])
+        )
+        if self._include_tables:
+            self._include_tables &= self._all_tables
+        usable_tables = super().get_usable_table_names()
+        self._usable_tables = set(usable_tables) if usable_tables else self._all_tables
+        self._metadata = MetaData()
+        self._schema_version = self.schema_cache.version
+
+    def get_usable_table_names(self):
+        # Called by SQLDatabase.__init__ before the cache exists
+        if getattr(self, "schema_cache", None) is not None:
+            self._sync_schema()
+        return super().get_usable_table_names()
+
+    @traced("sql.schema")
+    def get_table_info(self, table_names: Optional[List[str]] = None) -> str:
+        """Get information about specified tables, using cached descriptions"""
+        all_table_names = self.get_usable_table_names()
+        if table_names is not None:
+            missing_tables = set(table_names).difference(all_table_names)
+            if missing_tables:
+                raise ValueError(f"table_names {missing_tables} not found in database")
+            all_table_names = table_names
+
+        tables = []
+        fresh = {}
+        for table in all_table_names:
+            info = self.schema_cache.get(table)
+            if info is None:
+                # Reflects only this table
+                info = super().get_table_info(table_names=[table])
+                fresh[table] = info
+            if info:
+                tables.append(info)
+        if fresh:
+            self.schema_cache.set(fresh)
+        tables.sort()
+        return "\n\n".join(tables)
+
+    @classmethod
+    def from_shared_engine(cls, uri: str, **kwargs) -> "CachingSQLDatabase":
+        """Construct a database on the process-wide pooled engine for `uri`"""
+        return cls(get_engine(uri), **kwargs)
+
+    async def arun(self, command, fetch: str = "all", include_columns: bool = False, **kwargs):
+        """Async variant of `run` that uses the bounded database thread pool"""
+        return await run_in_db_executor(self.run, command, fetch, include_columns, **kwargs)
+
+    def _connect(self):
+        """Open a connection for reading, applying the configured schema"""
+        connection = self._engine.connect()
+        if self._schema is not None and self.dialect in SCHEMA_STATEMENTS:
+            statement = SCHEMA_STATEMENTS[self.dialect]
+            if "%s" in statement or "?" in statement:
+                connection.exec_driver_sql(statement, (self._schema,))
+            else:
+                connection.exec_driver_sql(statement.format(schema=self._schema))
+        return connection
+
+    def stream(self, command: str, parameters: Optional[Dict[str, Any]] = None,
+               fetch_size: int = SQL_FETCH_SIZE) -> Iterator[Dict[str, Any]]:
+        """Yield the rows of a read-only query as dicts without loading them all
+
+        Rows are fetched from a server-side cursor `fetch_size` at a time where
+        the driver supports it, so memory stays bounded by the fetch size.
+
+        Raises:
+            ValueError: If the statement may write to the database
+        """
+        if not is_read_only(command):
+            raise ValueError("Only read-only queries can be streamed")
+        with self._connect() as connection:
+            result = connection.execution_options(yield_per=fetch_size).execute(
+                text(command), parameters or {}
+            )
+            for row in result.mappings():
+                yield dict(row)
+
+    async def astream(self, command: str, parameters: Optional[Dict[str, Any]] = None,
+                      batch_size: int = SQL_FETCH_SIZE) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Async variant of `stream` that yields lists of up to `batch_size` rows
+
+        Batches are read in the bounded database thread pool. Closing the
+        generator releases the cursor without reading the rest.
+
+        Raises:
+            ValueError: If the statement may write to the database
+        """
+        rows = self.stream(command, parameters, fetch_size=batch_size)
+        fetch = None
+        try:
+            while True:
+                fetch = asyncio.ensure_future(run_in_db_executor(lambda: list(itertools.islice(rows, batch_size))))
+                # Shielded so a cancelled consumer can't close the cursor while a thread reads it
+                batch = await asyncio.shield(fetch)
+                if not batch:
+                    break
+                yield batch
+        finally:
+            if fetch is not None and not fetch.done():
+                await asyncio.wait([fetch])
+            await run_in_db_executor(rows.close)
+
+    def stream_batches(self, command: str, parameters: Optional[Dict[str, Any]] = None,
+                       batch_size: int = SQL_FETCH_SIZE):
+        """Yield the results of a read-only query as pyarrow RecordBatches
+
+        Raises:
+            ImportError: If pyarrow is not installed
+            ValueError: If the statement may write to the database
+        """
+        if pa is None:
+            raise ImportError("pyarrow is required for Arrow record batch output")
+        if not is_read_only(command):
+            raise ValueError("Only read-only queries can be streamed")
+        with self._connect() as connection:
+            result = connection.execution_options(yield_per=batch_size).execute(
+                text(command), parameters or {}
+            )
+            columns = list(result.keys())
+            for partition in result.partitions(batch_size):
+                yield pa.RecordBatch.from_pylist(
+                    [dict(zip(columns, row)) for row in partition]
+                )
+
+    def _run_limited(self, command: str, include_columns: bool,
+                     parameters: Optional[Dict[str, Any]]) -> str:
+        """Format at most `max_rows` rows and `max_bytes` characters of a result
+
+        Matches `SQLDatabase.run` output, with a note when rows were left out,
+        and stops reading as soon as the limit is reached.
+        """
+        stream = self.stream(command, parameters, fetch_size=min(SQL_FETCH_SIZE, self.max_rows + 1))
+        with closing(stream):
+            # Closing the stream releases the cursor without reading the rest
+            return self.format_rows(stream, include_columns)
+
+    def format_rows(self, rows: Iterable[Dict[str, Any]], include_columns: bool = False) -> str:
+        """Format rows as `run` does, reading no more than the row and size limits allow"""
+        formatted_rows = []
+        size = 0
+        truncated = False
+        for row in rows:
+            if self.max_rows and len(formatted_rows) >= self.max_rows:
+                truncated = True
+                break
+            row = {column: truncate_word(value, length=self._max_string_length) for column, value in row.items()}
+            formatted = row if include_columns else tuple(row.values())
+            size += len(str(formatted)) + 2
+            if formatted_rows and self.max_bytes and size > self.max_bytes:
+                truncated = True
+                break
+            formatted_rows.append(formatted)
+        if not formatted_rows:
+            return ""
+        output = str(formatted_rows)
+        if truncated:
+            output += f"\n(Showing the first {len(formatted_rows)} rows; add a LIMIT or aggregate to see the rest)"
+        return output
+
+    def _run_uncached(self, command, fetch, include_columns, parameters, execution_options):
+        if (isinstance(command, str) and fetch == "all" and not execution_options
+                and self.max_rows and is_read_only(command)):
+            return self._run_limited(command, include_columns, parameters)
+        return super().run(command, fetch, include_columns,
+                           parameters=parameters, execution_options=execution_options)
+
+    @traced("sql.run")
+    def run(self, command, fetch: str = "all", include_columns: bool = False, *,
+            parameters: Optional[Dict[str, Any]] = None,
+            execution_options: Optional[Dict[str, Any]] = None):
+        """Execute a SQL command, reusing cached results for repeated reads
+
+        Results of read-only queries are capped at `max_rows` rows and
+        `max_bytes` characters, since they are pasted into LLM prompts. Use
+        `stream` or `stream_batches` to read complete results.
+        """
+        cache = self.result_cache
+        if cache is None or fetch == "cursor":
+            return self._run_uncached(command, fetch, include_columns, parameters, execution_options)
+        if not isinstance(command, str):
+            # Compiled statements aren't parsed; only cache-invalidate on writes
+            result = super().run(command, fetch, include_columns,
+                                 parameters=parameters, execution_options=execution_options)
+            if not getattr(command, "is_select", False):
+                cache.invalidate_for(None)
+            return result
+
+        if not is_read_only(command):
+            try:
+                return super().run(command, fetch, include_columns,
+                                   parameters=parameters, execution_options=execution_options)
+            finally:
+                # Invalidate even if the statement failed part way through
+                cache.invalidate_for(command)
+
+        key = cache.make_key(
+            command, fetch=fetch, include_columns=include_columns, parameters=parameters,
+            execution_options=execution_options, max_string_length=self._max_string_length,
+            max_rows=self.max_rows, max_bytes=self.max_bytes
+        )
+        result = cache.get(key)
+        if result is None:
+            result = self._run_uncached(command, fetch, include_columns, parameters, execution_options)
+            cache.set(key, command, result)
+        return result
+
+_databases: Dict[str, CachingSQLDatabase] = {}
+_databases_lock = threading.Lock()
+
+def get_database(uri: str) -> CachingSQLDatabase:
+    """Return the process-wide database for a URI
+
+    The SQL action and the planner share it, and with it the schema and
+    result caches.
+    """
+    database = _databases.get(uri)
+    if database is None:
+        with _databases_lock:
+            database = _databases.get(uri)
+            if database is None:
+                database = CachingSQLDatabase.from_shared_engine(uri)
+                _databases[uri] = database
+    return database
@@ -0,0 +1,233 @@
+import itertools
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Set
+from ..config.config import SQL_RESULT_CACHE_SIZE, SQL_RESULT_CACHE_TTL
+
+# String literals and comments
+_LITERAL = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.DOTALL)
+_IDENTIFIER = re.compile(r'"((?:[^"]|"")+)"|`([^`]+)`|\[([^\]]+)\]|([A-Za-z_][\w$]*)')
+# Unquoted words that aren't qualified names or function calls, so keywords
+_BARE_WORD = re.compile(
+    r'"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\]|(?<![\w$.])([A-Za-z_][\w$]*)(?![\w$]|\s*\(|\s*\.)'
+)
+_READ_KEYWORDS = {"select", "with"}
+_WRITE_KEYWORDS = {
+    "insert", "update", "delete", "merge", "replace", "upsert", "into",
+    "create", "drop", "alter", "truncate", "rename", "grant", "revoke"
+}
+# Statements with the clauses SQL requires, so "Select the top customers"
+# or "Update me on sales" isn't taken for SQL; questions end with "?"
+SQL_STATEMENT_PATTERN = (
+    r"^[\s(]*(?:(?:select|with)\b[\s\S]+?\bfrom\s+[\w\"`\[(]"
+    r"|insert\s+(?:or\s+\w+\s+)?into\s+[\w\"`\[]"
+    r"|update\s+(?:or\s+\w+\s+)?[\w\"`\[][^\s]*\s+set\s"
+    r"|delete\s+from\s+[\w\"`\[])"
+    r"(?![\s\S]*\?\s*$)"
+)
+_SQL_STATEMENT = re.compile(SQL_STATEMENT_PATTERN, re.IGNORECASE)
+_NAME = r"(?:[A-Za-z_][\w$]*|\"[^\"]+\"|`[^`]+`|\[[^\]]+\])"
+# Tables a statement reads or writes; names read from followed by "(" are functions
+_TABLE_REFERENCE = re.compile(
+    rf"\b(?:(?:from|join)\s+({_NAME}(?:\s*\.\s*{_NAME})*)(?!\s*\()"
+    rf"|(?:into|update)\s+({_NAME}(?:\s*\.\s*{_NAME})*))",
+    re.IGNORECASE
+)
+_SUBQUERY = re.compile(r"\(\s*(?:select|with)\b", re.IGNORECASE)
+_CTE_NAME = re.compile(rf"(?:\bwith(?:\s+recursive)?|,)\s*({_NAME})\s*(?:\([^)]*\)\s*)?as\s*\(", re.IGNORECASE)
+_TOKEN = re.compile(r"\s*([\w$]+|\S)")
+# Words that may follow a table name, with or without an alias, in a statement
+_AFTER_TABLE = {
+    "where", "group", "order", "limit", "offset", "having", "join", "inner", "left", "right",
+    "full", "cross", "outer", "natural", "on", "using", "union", "intersect", "except", "set",
+    "values", "select", "default", "returning", "window", "fetch", "with"
+}
+_WRITE_TARGET = re.compile(
+    r"^\s*(?:insert\s+(?:or\s+\w+\s+)?into|replace\s+into|update(?:\s+or\s+\w+)?|delete\s+from|merge\s+into)"
+    r"\s+((?:[\w$]+|\"[^\"]+\"|`[^`]+`|\[[^\]]+\])(?:\s*\.\s*(?:[\w$]+|\"[^\"]+\"|`[^`]+`|\[[^\]]+\]))*)",
+    re.IGNORECASE
+)
+
+def normalize_sql(sql: str) -> str:
+    """Normalize SQL text so formatting differences share a cache entry
+
+    Comments are removed and whitespace outside string literals is collapsed.
+    Literals and identifier case are left alone since they can change results.
+    """
+    parts = []
+    code = ""
+    position = 0
+    for match in _LITERAL.finditer(sql):
+        # Comments become whitespace; string literals are kept verbatim
+        code += sql[position:match.start()]
+        if match.group(0).startswith("'"):
+            parts.extend([re.sub(r"\s+", " ", code), match.group(0)])
+            code = ""
+        else:
+            code += " "
+        position = match.end()
+    parts.append(re.sub(r"\s+", " ", code + sql[position:]))
+    return "".join(parts).strip().rstrip(";").strip()
+
+def _identifiers(sql: str) -> Set[str]:
+    """Lowercased identifiers in the statement, ignoring string literals"""
+    code = _LITERAL.sub(" ", sql)
+    names = set()
+    for match in _IDENTIFIER.finditer(code):
+        name = next(group for group in match.groups() if group is not None)
+        names.add(name.replace('""', '"').lower())
+    return names
+
+def _unquote(name: str) -> str:
+    name = re.split(r"\s*\.\s*", name)[-1]
+    return name.strip('"`[]').lower()
+
+def _keywords(code: str) -> Set[str]:
+    """Lowercased unquoted words of a statement, leaving out names and function calls"""
+    return {match.group(1).lower() for match in _BARE_WORD.finditer(code) if match.group(1)}
+
+def _followed_by_sql(code: str, position: int) -> bool:
+    """Whether a table name ending at `position` is followed by SQL rather than prose"""
+    tokens = [match.group(1) for match in itertools.islice(_TOKEN.finditer(code, position), 3)]
+    tokens += [None] * (3 - len(tokens))
+    if tokens[0] is not None and tokens[0].lower() not in _AFTER_TABLE and tokens[0] not in ";,()":
+        # An alias, optionally introduced by AS
+        tokens = tokens[2:] if tokens[0].lower() == "as" else tokens[1:]
+    following = tokens[0]
+    return following is None or following in ";,()" or following.lower() in _AFTER_TABLE
+
+def _in_statement(code: str, position: int) -> bool:
+    """Whether a position is in the statement or its subqueries, not in a function call"""
+    open_parens = []
+    for index, char in enumerate(code[:position]):
+        if char == "(":
+            open_parens.append(index)
+        elif char == ")" and open_parens:
+            open_parens.pop()
+    leading = len(code) - len(code.lstrip("( \t\r\n"))
+    return all(index < leading or _SUBQUERY.match(code, index) for index in open_parens)
+
+def is_sql_statement(text: str, table_names: Iterable[str]) -> bool:
+    """Whether text is a SELECT/INSERT/UPDATE/DELETE statement rather than a question
+
+    Besides the clauses SQL requires, every table the statement and its
+    subqueries name must be one of `table_names` or a CTE, and be followed by SQL,
+    so "Select all orders from last week" isn't run as a query. A statement
+    ending with ";" may name tables that aren't known.
+    """
+    if not _SQL_STATEMENT.match(text):
+        return False
+    code = _LITERAL.sub(" ", text)
+    known = {_unquote(name) for name in table_names}
+    known.update(_unquote(match.group(1)) for match in _CTE_NAME.finditer(code))
+    tables = []
+    for match in _TABLE_REFERENCE.finditer(code):
+        if not _followed_by_sql(code, match.end()):
+            return False
+        if _in_statement(code, match.start()):
+            # Not a function argument, as in EXTRACT(YEAR FROM date)
+            tables.append(_unquote(match.group(1) or match.group(2)))
+    if code.rstrip().endswith(";"):
+        return True
+    return bool(tables) and all(table in known for table in tables)
+
+def is_read_only(sql: str) -> bool:
+    """Whether a statement only reads data and its result can be cached
+
+    The statement must start with SELECT or WITH and use no write keyword,
+    such as a data-modifying CTE or SELECT INTO. Quoted identifiers and
+    functions that share a keyword's name, like REPLACE(), don't count.
+    """
+    code = _LITERAL.sub(" ", sql)
+    first = re.match(r"[\s(]*(\w+)", code)
+    if first is None or first.group(1).lower() not in _READ_KEYWORDS:
+        return False
+    return not (_keywords(code) & _WRITE_KEYWORDS)
+
+def write_target(sql: str) -> Optional[str]:
+    """Table written by an INSERT/UPDATE/DELETE/MERGE, or None if it can't be told"""
+    match = _WRITE_TARGET.match(_LITERAL.sub(" ", sql))
+    return _unquote(match.group(1)) if match else None
+
+class SQLResultCache:
+    """LRU cache of query results with write-aware invalidation
+
+    Entries are keyed by normalized SQL text and parameters, and remember the
+    identifiers each query mentions, which covers every table it reads. A write
+    that runs through `invalidate_for` drops only the entries that mention its
+    target table; writes whose target can't be determined, including DDL, clear
+    the whole cache. Entries also expire after `ttl` seconds to bound staleness
+    from writes made outside the application.
+    """
+
+    def __init__(self, max_size: int = SQL_RESULT_CACHE_SIZE, ttl: float = SQL_RESULT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0, "expirations": 0}
+
+    @staticmethod
+    def make_key(sql: str, **options) -> str:
+        """Build the cache key for a statement and its parameters and run options"""
+        payload = {"sql": normalize_sql(sql), **options}
+        return json.dumps(payload, sort_keys=True, default=str)
+
+    def get(self, key: str) -> Any:
+        """Return the cached result, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.time() - entry["created"] > self.ttl:
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry["result"]
+
+    def set(self, key: str, sql: str, result: Any):
+        """Store a result along with the tables the query may read"""
+        entry = {"result": result, "tables": _identifiers(sql), "created": time.time()}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate_for(self, sql: Optional[str]):
+        """Drop entries that a write statement may have made stale
+
+        Args:
+            sql (str): The write statement, or None to clear everything
+        """
+        table = write_target(sql) if sql is not None else None
+        with self._lock:
+            if table is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [key for key, entry in self._entries.items() if table in entry["tables"]]
+                for key in stale:
+                    del self._entries[key]
+                removed = len(stale)
+            self._stats["invalidations"] += removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss/invalidation counters and the current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,54 @@
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict
+from .telemetry import get_callbacks
+from ..config.config import STREAM_MAX_OBSERVATION_CHARS
+
+# Events are plain dicts with a "type" and the fields listed here. Events from
+# an action also carry the "action" they came from once the executor forwards
+# them.
+#   route        actions, source, csv_files, tables, sql_mode: the routing decision
+#   action_start the action started running
+#   source       file, message: the CSV file the action chose
+#   token        text: a piece of LLM output as it is generated
+#   step         tool, input: an agent is calling a tool
+#   observation  tool, output: what the tool returned, truncated
+#   sql          sql: the SQL statement generated for the question
+#   rows         rows: a batch of result rows, as dicts
+#   page         url, status, text, truncated, cache or error: a fetched web page
+#   result       result: the action's final answer; the last event of `astream`
+#   action_end   status, result or error, elapsed: the action's outcome
+#   done         actions, results: the same dict `answer_question` returns
+
+def result_event(result: Any) -> Dict[str, Any]:
+    """The last event of an action's stream"""
+    return {"type": "result", "result": result}
+
+async def astream_run(runnable, inputs: Any) -> AsyncIterator[Dict[str, Any]]:
+    """Run a LangChain runnable and yield its progress as stream events
+
+    Uses `astream_events`, so chat model tokens arrive as they are generated.
+    For agent executors, each tool call is reported when the agent decides on
+    it and again with its output. The last event has the type "output" and
+    holds the runnable's return value, for the caller to turn into its own
+    result. Closing the generator cancels the run.
+    """
+    config = {"callbacks": get_callbacks()}
+    async with aclosing(runnable.astream_events(inputs, config=config, version="v2")) as events:
+        async for event in events:
+            kind = event["event"]
+            data = event.get("data", {})
+            top_level = not event.get("parent_ids")
+            if kind == "on_chat_model_stream":
+                content = data["chunk"].content
+                if isinstance(content, str) and content:
+                    yield {"type": "token", "text": content}
+            elif kind == "on_chain_stream" and top_level and isinstance(data.get("chunk"), dict):
+                # Tool events don't carry string inputs, the executor's chunks do
+                chunk = data["chunk"]
+                for action in chunk.get("actions", []):
+                    yield {"type": "step", "tool": action.tool, "input": action.tool_input}
+                for step in chunk.get("steps", []):
+                    yield {"type": "observation", "tool": step.action.tool,
+                           "output": str(step.observation)[:STREAM_MAX_OBSERVATION_CHARS]}
+            elif kind == "on_chain_end" and top_level:
+                yield {"type": "output", "output": data.get("output")}
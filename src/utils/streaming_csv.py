@@ -0,0 +1,157 @@
+import os
+from typing import Optional, Tuple
+import pandas as pd
+from .query_plan import filter_frame, sort_and_limit
+from ..config.config import CSV_STREAMING_CHUNK_SIZE
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is then not reported
+    resource = None
+
+# How partial columns are combined across chunks, by suffix
+PARTIAL_REDUCERS = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+
+def _peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+def _needed_columns(plan: dict) -> Optional[list]:
+    """Columns the plan reads, so chunks only parse what is used"""
+    if not plan["aggregations"] and not plan["select"]:
+        return None
+    # Sort columns are validated to be among these or aggregation aliases
+    columns = [condition["column"] for condition in plan["filters"]]
+    columns += plan["group_by"] + plan["select"]
+    columns += [a["column"] for a in plan["aggregations"] if a["column"] != "*"]
+    return list(dict.fromkeys(columns)) or None
+
+def _group_key(key):
+    """Make group keys hashable consistently, since NaN never equals itself"""
+    if isinstance(key, tuple):
+        return tuple(None if pd.isna(part) else part for part in key)
+    return None if pd.isna(key) else key
+
+def _grouped(chunk: pd.DataFrame, plan: dict):
+    if plan["group_by"]:
+        return chunk.groupby(plan["group_by"], dropna=False)
+    return chunk.assign(_all=0).groupby("_all")
+
+def _partial_aggregate(chunk: pd.DataFrame, plan: dict, distinct: dict) -> pd.DataFrame:
+    """Aggregate one chunk into combinable partial columns
+
+    Distinct values for `nunique` aggregations are merged into `distinct`,
+    keyed by aggregation index and group key.
+    """
+    grouped = _grouped(chunk, plan)
+    parts = {}
+    for i, aggregation in enumerate(plan["aggregations"]):
+        column, func = aggregation["column"], aggregation["func"]
+        if func == "count" and column == "*":
+            parts[f"{i}_count"] = grouped.size()
+        elif func == "mean":
+            parts[f"{i}_sum"] = grouped[column].sum()
+            parts[f"{i}_count"] = grouped[column].count()
+        elif func == "nunique":
+            parts[f"{i}_count"] = grouped.size()
+            for key, values in grouped[column].unique().items():
+                distinct.setdefault(i, {}).setdefault(_group_key(key), set()).update(v for v in values if pd.notna(v))
+        elif func in PARTIAL_REDUCERS:
+            parts[f"{i}_{func}"] = grouped[column].agg(func)
+        else:
+            raise ValueError(f"Aggregation {func} isn't supported in streaming mode")
+    return pd.DataFrame(parts)
+
+def _combine(acc: Optional[pd.DataFrame], partial: pd.DataFrame) -> pd.DataFrame:
+    if acc is None:
+        return partial
+    combined = pd.concat([acc, partial])
+    reducers = {column: PARTIAL_REDUCERS[column.split("_", 1)[1]] for column in combined.columns}
+    levels = list(range(combined.index.nlevels))
+    return combined.groupby(level=levels, dropna=False).agg(reducers)
+
+def _finalize(acc: Optional[pd.DataFrame], plan: dict, distinct: dict) -> pd.DataFrame:
+    """Turn combined partial columns into the plan's aggregation results"""
+    aliases = [aggregation["alias"] for aggregation in plan["aggregations"]]
+    if acc is None:
+        return pd.DataFrame(columns=plan["group_by"] + aliases)
+    result = pd.DataFrame(index=acc.index)
+    for i, aggregation in enumerate(plan["aggregations"]):
+        func, alias = aggregation["func"], aggregation["alias"]
+        if func == "mean":
+            result[alias] = acc[f"{i}_sum"] / acc[f"{i}_count"]
+        elif func == "nunique":
+            result[alias] = [len(distinct.get(i, {}).get(_group_key(key), ())) for key in acc.index]
+        elif func == "count":
+            result[alias] = acc[f"{i}_count"]
+        else:
+            result[alias] = acc[f"{i}_{func}"]
+    if plan["group_by"]:
+        return result.reset_index()
+    return result.reset_index(drop=True)
+
+def execute_plan_streaming(file_path: str, plan: dict, pandas_kwargs: Optional[dict] = None,
+                           chunk_size: int = CSV_STREAMING_CHUNK_SIZE,
+                           max_rows: int = 100) -> Tuple[pd.DataFrame, dict]:
+    """Run a validated plan over a CSV in chunks with bounded memory
+
+    Aggregations are computed as partial aggregates per chunk and combined as
+    the file is read. Plans without aggregations keep only the rows that can
+    still appear in the result: the running top-k when the plan sorts, or the
+    first rows otherwise.
+
+    Args:
+        file_path (str): Path to the CSV file
+        plan (dict): Plan returned by `validate_plan`
+        pandas_kwargs (dict, optional): Additional arguments for pandas.read_csv
+        chunk_size (int): Rows parsed per chunk
+        max_rows (int): Rows kept for plans without a limit or aggregation
+
+    Returns:
+        tuple: (result DataFrame, stats with rows/chunks read and peak memory)
+    """
+    kwargs = dict(pandas_kwargs or {})
+    kwargs.pop("chunksize", None)
+    usecols = _needed_columns(plan)
+    if usecols is not None and "usecols" not in kwargs:
+        kwargs["usecols"] = usecols
+
+    stats = {"rows": 0, "chunks": 0, "matched_rows": 0, "peak_chunk_bytes": 0}
+    acc = None
+    distinct = {}
+    keep = plan["limit"] if plan["limit"] is not None else max_rows
+
+    for chunk in pd.read_csv(file_path, chunksize=chunk_size, **kwargs):
+        stats["rows"] += len(chunk)
+        stats["chunks"] += 1
+        chunk_bytes = int(chunk.memory_usage(deep=True).sum())
+
+        chunk = filter_frame(chunk, plan)
+        stats["matched_rows"] += len(chunk)
+
+        if plan["aggregations"]:
+            if not chunk.empty:
+                acc = _combine(acc, _partial_aggregate(chunk, plan, distinct))
+        else:
+            rows = chunk[plan["select"]] if plan["select"] else chunk
+            acc = rows if acc is None else pd.concat([acc, rows])
+            # Only the current top rows can still be part of the result
+            acc = sort_and_limit(acc, {**plan, "limit": keep})
+
+        acc_bytes = int(acc.memory_usage(deep=True).sum()) if acc is not None else 0
+        stats["peak_chunk_bytes"] = max(stats["peak_chunk_bytes"], chunk_bytes + acc_bytes)
+
+        if not plan["aggregations"] and not plan["sort"] and plan["limit"] is not None and len(acc) >= keep:
+            # The first rows are the result; the rest of the file can be skipped
+            break
+
+    if plan["aggregations"]:
+        result = sort_and_limit(_finalize(acc, plan, distinct), plan)
+    else:
+        result = acc if acc is not None else pd.DataFrame(columns=usecols or [])
+    stats["peak_rss_bytes"] = _peak_rss_bytes()
+    return result, stats
@@ -0,0 +1,445 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import aclosing, contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from ..config.config import (
+    TELEMETRY_ENABLED, TELEMETRY_JSONL_PATH, TELEMETRY_OTEL_PATH, TELEMETRY_METRICS_PORT,
+    LLM_PROMPT_COST_PER_1K, LLM_COMPLETION_COST_PER_1K
+)
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """A timed stage of request processing"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[dict] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+            "parent_id": self.parent_id, "start_ns": self.start_ns, "end_ns": self.end_ns,
+            "duration": self.duration, "status": self.status, "attributes": self.attributes
+        }
+
+class JSONLExporter:
+    """Write finished spans to a JSONL file, one span per line"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", buffering=1)
+        self._lock = threading.Lock()
+
+    def format(self, span: Span) -> dict:
+        return span.to_dict()
+
+    def export(self, span: Span):
+        line = json.dumps(self.format(span), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+class OTelJSONExporter(JSONLExporter):
+    """Write finished spans as OTLP/JSON resource spans, one per line
+
+    The output can be replayed into an OpenTelemetry collector or read by
+    tools that understand the OTLP JSON encoding.
+    """
+
+    @staticmethod
+    def _value(value) -> dict:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def format(self, span: Span) -> dict:
+        otel_span = {
+            "traceId": span.trace_id, "spanId": span.span_id, "name": span.name, "kind": 1,
+            "startTimeUnixNano": str(span.start_ns), "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": self._value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 1 if span.status == "ok" else 2}
+        }
+        if span.parent_id:
+            otel_span["parentSpanId"] = span.parent_id
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "intelligent-agent"}}]},
+            "scopeSpans": [{"scope": {"name": "src.utils.telemetry"}, "spans": [otel_span]}]
+        }]}
+
+class Telemetry:
+    """In-process spans, counters and latency histograms
+
+    Spans nest through a context variable, so they follow both threads started
+    with `asyncio.to_thread` and asyncio tasks. Finished spans update
+    per-stage latency histograms and are passed to the registered exporters.
+    Cache and other components can register a `stats()` callable whose
+    numeric values are reported as gauges. Everything is kept in memory with
+    a lock held only for a dictionary update, so it can stay on in production.
+    """
+
+    def __init__(self, enabled: bool = TELEMETRY_ENABLED):
+        self.enabled = enabled
+        self.exporters: List[Any] = []
+        self._counters: Dict[tuple, float] = {}
+        self._histograms: Dict[str, dict] = {}
+        self._stats_sources: Dict[str, Callable[[], Optional[dict]]] = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._callback_handler = None
+
+    @property
+    def callback_handler(self):
+        """The LangChain callback handler recording this telemetry's LLM calls
+
+        One handler serves all LangChain runs, since LangChain skips duplicate
+        handlers. It is created on first use, so importing this module doesn't
+        load LangChain.
+        """
+        if self._callback_handler is None:
+            handler_class = _callback_handler_class()
+            with self._lock:
+                if self._callback_handler is None:
+                    self._callback_handler = handler_class(self)
+        return self._callback_handler
+
+    def add_exporter(self, exporter):
+        """Send finished spans to an object with `export(span)` and `close()`"""
+        self.exporters.append(exporter)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time a block of code as a span nested under the current one"""
+        if not self.enabled:
+            yield None
+            return
+        span = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.attributes["error"] = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish(span)
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes) -> Optional[Span]:
+        """Start a span that is ended explicitly with `finish`, e.g. from callbacks"""
+        if not self.enabled:
+            return None
+        return Span(name, parent if parent is not None else _current_span.get(), attributes)
+
+    def finish(self, span: Optional[Span]):
+        if span is None:
+            return
+        span.end_ns = time.time_ns()
+        self.observe(span.name, span.duration)
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"Error exporting span {span.name}: {str(e)}")
+
+    def observe(self, stage: str, seconds: float):
+        """Record a latency sample for a stage"""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = {"count": 0, "sum": 0.0, "buckets": [0] * len(LATENCY_BUCKETS)}
+                self._histograms[stage] = histogram
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+
+    def increment(self, name: str, value: float = 1, **labels):
+        """Add to a counter, e.g. tokens used or agent steps taken"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def register_stats(self, name: str, stats: Callable[[], dict]):
+        """Report the numeric values of `stats()` as gauges named after `name`
+
+        Bound methods are held weakly, so registering doesn't keep caches alive.
+        """
+        if hasattr(stats, "__self__"):
+            method = weakref.WeakMethod(stats)
+            self._stats_sources[name] = lambda: (method() or (lambda: None))()
+        else:
+            self._stats_sources[name] = stats
+
+    def snapshot(self) -> dict:
+        """Return counters, stage latencies and registered stats as plain data"""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in self._counters.items()
+            ]
+            stages = {
+                stage: {"count": h["count"], "sum": h["sum"], "mean": h["sum"] / h["count"]}
+                for stage, h in self._histograms.items()
+            }
+        stats = {}
+        for name, source in list(self._stats_sources.items()):
+            try:
+                values = source()
+            except Exception:
+                values = None
+            if values:
+                stats[name] = values
+        return {"counters": counters, "stages": stages, "stats": stats}
+
+    def prometheus_text(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = ["# TYPE agent_stage_seconds histogram"]
+        with self._lock:
+            histograms = {stage: dict(h, buckets=list(h["buckets"])) for stage, h in self._histograms.items()}
+            counters = dict(self._counters)
+        for stage, histogram in sorted(histograms.items()):
+            for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+                lines.append(f'agent_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'agent_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'agent_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+            lines.append(f'agent_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE agent_{name}_total counter")
+            for (counter, labels), value in sorted(counters.items()):
+                if counter == name:
+                    label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+                    label_text = f"{{{label_text}}}" if label_text else ""
+                    lines.append(f"agent_{name}_total{label_text} {value}")
+        for source, values in sorted(self.snapshot()["stats"].items()):
+            for key, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"agent_{source}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+    def start_metrics_server(self, port: int = TELEMETRY_METRICS_PORT, host: str = "127.0.0.1"):
+        """Serve `prometheus_text` at /metrics from a background thread"""
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        return self._server.server_address
+
+    def close(self):
+        """Stop the metrics server and flush the exporters"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+        for exporter in self.exporters:
+            exporter.close()
+        self.exporters = []
+
+def _usage(response) -> Dict[str, int]:
+    """Token usage from an LLMResult, from the provider output or message metadata"""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    prompt, completion = usage.get("prompt_tokens"), usage.get("completion_tokens")
+    if prompt is None:
+        prompt = completion = 0
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt += metadata.get("input_tokens", 0)
+                completion += metadata.get("output_tokens", 0)
+    return {"prompt": prompt or 0, "completion": completion or 0}
+
+@functools.lru_cache(maxsize=None)
+def _callback_handler_class():
+    """Define the LangChain callback handler class, importing LangChain on first use"""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TelemetryCallbackHandler(BaseCallbackHandler):
+        """LangChain callback that records LLM calls, token usage, tools and agent steps"""
+
+        def __init__(self, telemetry: "Telemetry"):
+            self.telemetry = telemetry
+            self._spans: Dict[Any, Span] = {}
+
+        def _start(self, run_id, name, parent_run_id=None, **attributes):
+            parent = self._spans.get(parent_run_id)
+            span = self.telemetry.start_span(name, parent, **attributes)
+            if span is not None:
+                self._spans[run_id] = span
+
+        def _end(self, run_id, error=None):
+            span = self._spans.pop(run_id, None)
+            if span is not None:
+                if error is not None:
+                    span.status = "error"
+                    span.attributes["error"] = type(error).__name__
+                self.telemetry.finish(span)
+            return span
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+            self._start(run_id, "llm", parent_run_id, model=(serialized or {}).get("name", "chat_model"))
+
+        def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+            self._start(run_id, "llm", parent_run_id, model=(serialized or {}).get("name", "llm"))
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            usage = _usage(response)
+            span = self._spans.get(run_id)
+            if span is not None:
+                span.attributes.update(prompt_tokens=usage["prompt"], completion_tokens=usage["completion"])
+            self.telemetry.increment("llm_calls")
+            self.telemetry.increment("llm_tokens", usage["prompt"], kind="prompt")
+            self.telemetry.increment("llm_tokens", usage["completion"], kind="completion")
+            cost = usage["prompt"] / 1000 * LLM_PROMPT_COST_PER_1K + usage["completion"] / 1000 * LLM_COMPLETION_COST_PER_1K
+            if cost:
+                self.telemetry.increment("llm_cost_usd", cost)
+            self._end(run_id)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self.telemetry.increment("llm_errors")
+            self._end(run_id, error)
+
+        def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+            self._start(run_id, f"tool.{(serialized or {}).get('name', 'tool')}", parent_run_id)
+
+        def on_tool_end(self, output, *, run_id, **kwargs):
+            self._end(run_id)
+
+        def on_tool_error(self, error, *, run_id, **kwargs):
+            self._end(run_id, error)
+
+        def on_agent_action(self, action, *, run_id, **kwargs):
+            self.telemetry.increment("agent_steps", tool=action.tool)
+
+    return TelemetryCallbackHandler
+
+_telemetry: Optional[Telemetry] = None
+_telemetry_lock = threading.Lock()
+
+def get_telemetry() -> Telemetry:
+    """Return the process-wide telemetry, with exporters from the configuration"""
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                telemetry = Telemetry()
+                if telemetry.enabled and TELEMETRY_JSONL_PATH:
+                    telemetry.add_exporter(JSONLExporter(TELEMETRY_JSONL_PATH))
+                if telemetry.enabled and TELEMETRY_OTEL_PATH:
+                    telemetry.add_exporter(OTelJSONExporter(TELEMETRY_OTEL_PATH))
+                if telemetry.enabled and TELEMETRY_METRICS_PORT:
+                    telemetry.start_metrics_server(TELEMETRY_METRICS_PORT)
+                _telemetry = telemetry
+    return _telemetry
+
+def get_callbacks() -> list:
+    """Callback handlers to pass to LangChain runs so they are instrumented"""
+    telemetry = get_telemetry()
+    if not telemetry.enabled:
+        return []
+    return [telemetry.callback_handler]
+
+def traced(name: str):
+    """Decorator that runs a function, sync or async, inside a span
+
+    For async generators, the span lasts until the generator is exhausted or
+    closed, and is the current span only while the generator itself runs.
+    """
+    def decorator(func):
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def async_gen_wrapper(*args, **kwargs):
+                telemetry = get_telemetry()
+                span = telemetry.start_span(name)
+                try:
+                    async with aclosing(func(*args, **kwargs)) as items:
+                        while True:
+                            # The span is current while the generator runs, but not
+                            # while the caller handles an item between iterations
+                            token = _current_span.set(span) if span is not None else None
+                            try:
+                                item = await items.__anext__()
+                            except StopAsyncIteration:
+                                break
+                            finally:
+                                if token is not None:
+                                    _current_span.reset(token)
+                            yield item
+                except GeneratorExit:
+                    raise
+                except BaseException as e:
+                    if span is not None:
+                        span.status = "error"
+                        span.attributes["error"] = type(e).__name__
+                    raise
+                finally:
+                    telemetry.finish(span)
+            return async_gen_wrapper
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with get_telemetry().span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_telemetry().span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def set_span_attribute(key: str, value):
+    """Attach an attribute to the current span, if there is one"""
+    span = _current_span.get()
+    if span is not None:
+        span.attributes[key] = value
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Settings are read when src.config is imported; tests never call the API
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("ROUTING_LOG_PATH", "")
+# Keep the caches that default to .cache/ out of the working tree
+for name in ("SQL_SCHEMA_CACHE_PATH", "CSV_CATALOG_PATH", "DATAFRAME_SPILL_DIR", "WEB_CACHE_DIR"):
+    os.environ.setdefault(name, "")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,124 @@
+import asyncio
+import time
+import pytest
+from src.actions.base_action import BaseAction
+from src.utils.action_executor import ActionExecutor, ActionTask, build_tasks, validate_tasks
+
+class EchoAction(BaseAction):
+    """Returns its query after `delay` seconds, or raises when asked to"""
+
+    def execute(self, query="", delay=0.0, fail=False):
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError("action failed")
+        return query
+
+    async def aexecute(self, query="", delay=0.0, fail=False):
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError("action failed")
+        return query
+
+    async def astream(self, query="", delay=0.0, fail=False):
+        yield {"type": "token", "text": query}
+        yield {"type": "result", "result": await self.aexecute(query, delay, fail)}
+
+class FetchAction(EchoAction):
+    @classmethod
+    def get_description(cls):
+        return "Fetch"
+
+class SummarizeAction(EchoAction):
+    depends_on = (FetchAction,)
+
+    @classmethod
+    def get_description(cls):
+        return "Summarize"
+
+class FakeRegistry:
+    def __init__(self):
+        self.instances = {}
+
+    async def aget(self, action_class):
+        return self.instances.setdefault(action_class, action_class())
+
+def task(name, depends_on=(), timeout=None, **params):
+    return ActionTask(name, EchoAction, {"query": name, **params}, depends_on=depends_on, timeout=timeout)
+
+def run(tasks, deadline=None, timeout=5.0):
+    executor = ActionExecutor(FakeRegistry(), timeout=timeout, deadline=10.0)
+    return asyncio.run(executor.run(tasks, deadline=deadline))
+
+def test_independent_tasks_run_concurrently():
+    started = time.perf_counter()
+    outcomes = run([task("a", delay=0.2), task("b", delay=0.2), task("c", delay=0.2)])
+    assert time.perf_counter() - started < 0.5
+    assert [outcome["status"] for outcome in outcomes.values()] == ["ok"] * 3
+
+def test_dependencies_run_first_and_pass_their_results():
+    outcomes = run([task("summary", depends_on=["fetch"]), task("fetch", delay=0.05)])
+    assert list(outcomes) == ["summary", "fetch"]
+    result = outcomes["summary"]["result"]
+    assert result.startswith("summary\n\nUse these results from other sources:")
+    assert "- fetch: fetch" in result
+
+def test_failed_dependency_skips_dependents():
+    outcomes = run([task("fetch", fail=True), task("summary", depends_on=["fetch"]), task("other")])
+    assert outcomes["fetch"] == {"status": "error", "error": "action failed",
+                                 "elapsed": outcomes["fetch"]["elapsed"]}
+    assert outcomes["summary"]["status"] == "skipped"
+    assert outcomes["other"]["status"] == "ok"
+
+def test_task_timeout():
+    outcomes = run([task("slow", delay=1.0, timeout=0.05), task("fast")])
+    assert outcomes["slow"]["status"] == "timeout"
+    assert outcomes["fast"]["status"] == "ok"
+
+def test_executor_default_timeout():
+    outcomes = run([task("slow", delay=1.0)], timeout=0.05)
+    assert outcomes["slow"]["status"] == "timeout"
+
+def test_deadline_cancels_unfinished_tasks():
+    started = time.perf_counter()
+    outcomes = run([task("fast"), task("slow", delay=2.0), task("after", depends_on=["slow"])],
+                   deadline=0.1)
+    assert time.perf_counter() - started < 1.0
+    assert [outcomes[name]["status"] for name in ("fast", "slow", "after")] == ["ok", "cancelled", "cancelled"]
+
+@pytest.mark.parametrize("tasks, message", [
+    ([task("a"), task("a")], "unique"),
+    ([task("a", depends_on=["missing"])], "unknown"),
+    ([task("a", depends_on=["b"]), task("b", depends_on=["a"])], "cycle"),
+])
+def test_invalid_task_graphs(tasks, message):
+    with pytest.raises(ValueError, match=message):
+        validate_tasks(tasks)
+
+def test_build_tasks_keeps_dependencies_on_selected_actions():
+    tasks = build_tasks([SummarizeAction, FetchAction], lambda action_class: {"query": "q"})
+    assert {t.name: t.depends_on for t in tasks} == {"Summarize": ["Fetch"], "Fetch": []}
+    alone = build_tasks([SummarizeAction], lambda action_class: {"query": "q"})
+    assert alone[0].depends_on == []
+
+def test_stream_yields_events_of_every_task():
+    executor = ActionExecutor(FakeRegistry(), timeout=5.0, deadline=10.0)
+
+    async def main():
+        return [event async for event in executor.stream([task("a"), task("b", depends_on=["a"])])]
+    events = asyncio.run(main())
+    assert [(event["type"], event["action"]) for event in events if event["action"] == "a"] == [
+        ("action_start", "a"), ("token", "a"), ("action_end", "a")
+    ]
+    assert events[-1]["type"] == "action_end" and events[-1]["status"] == "ok"
+
+def test_closing_the_stream_cancels_running_tasks():
+    executor = ActionExecutor(FakeRegistry(), timeout=5.0, deadline=10.0)
+
+    async def main():
+        stream = executor.stream([task("slow", delay=5.0)])
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first, [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    first, leftover = asyncio.run(main())
+    assert first["type"] == "action_start"
+    assert leftover == []
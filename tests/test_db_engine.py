@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from src.actions import sql_action
+from src.config.config import SQL_MAX_OVERFLOW, SQL_POOL_RECYCLE, SQL_POOL_SIZE
+from src.utils import db_engine
+from src.utils.db_engine import get_engine, run_in_db_executor, shutdown_db_executor
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+@pytest.fixture
+def executor_size(monkeypatch):
+    """Start every test with a fresh two-thread database executor"""
+    shutdown_db_executor()
+    monkeypatch.setattr(db_engine, "SQL_ASYNC_WORKERS", 2)
+    yield 2
+    shutdown_db_executor()
+
+def test_engines_are_shared_per_uri(tmp_path):
+    first = get_engine(f"sqlite:///{tmp_path / 'a.db'}")
+    assert get_engine(f"sqlite:///{tmp_path / 'a.db'}") is first
+    assert get_engine(f"sqlite:///{tmp_path / 'b.db'}") is not first
+
+def test_pool_options_apply(tmp_path):
+    pool = get_engine(f"sqlite:///{tmp_path / 'pooled.db'}").pool
+    assert (pool.size(), pool._max_overflow) == (SQL_POOL_SIZE, SQL_MAX_OVERFLOW)
+    assert (pool._recycle, pool._pre_ping) == (SQL_POOL_RECYCLE, True)
+
+def test_in_memory_databases_use_a_single_connection():
+    assert isinstance(get_engine("sqlite://").pool, StaticPool)
+
+def test_executor_is_bounded_and_leaves_the_loop_free(executor_size):
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def blocking_call():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return threading.current_thread().name
+
+    async def main():
+        ticks = 0
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+        ticker = asyncio.create_task(tick())
+        names = await asyncio.gather(*(run_in_db_executor(blocking_call) for _ in range(6)))
+        ticker.cancel()
+        return names, ticks
+
+    names, ticks = run(main())
+    assert peak == executor_size
+    assert all(name.startswith("sql") for name in names)
+    # Six 50ms calls on two threads take about 150ms, during which the loop kept running
+    assert ticks > 10
+
+def test_sql_action_aexecute_runs_queries_in_the_executor(executor_size, tmp_path, monkeypatch):
+    uri = f"sqlite:///{tmp_path / 'shop.db'}"
+    threads = []
+
+    def slow(value):
+        threads.append(threading.current_thread().name)
+        time.sleep(0.05)
+        return value
+
+    @event.listens_for(get_engine(uri), "connect")
+    def register_slow(dbapi_connection, connection_record):
+        dbapi_connection.create_function("slow", 1, slow)
+
+    with get_engine(uri).begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE Customer (Id INTEGER)")
+        conn.exec_driver_sql("INSERT INTO Customer VALUES (1), (2), (3), (4)")
+    monkeypatch.setattr(sql_action, "DB_CONNECTION_STRING", uri)
+    action = sql_action.SQLDatabaseAction(llm=FakeListChatModel(responses=["unused"]))
+    assert action.error is None
+
+    async def main():
+        ticks = 0
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+        ticker = asyncio.create_task(tick())
+        results = await asyncio.gather(*(
+            action.aexecute(query=f"SELECT slow(Id) FROM Customer WHERE Id = {i}", agent_mode=False)
+            for i in range(1, 5)
+        ))
+        ticker.cancel()
+        return results, ticks
+
+    results, ticks = run(main())
+    assert results == ["[(1,)]", "[(2,)]", "[(3,)]", "[(4,)]"]
+    assert len(threads) == 4 and all(name.startswith("sql") for name in threads)
+    assert ticks > 5
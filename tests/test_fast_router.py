@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from sqlalchemy import create_engine
+from src.actions import sql_action as sql_action_module
+from src.main import planned_sql_params
+from src.utils.fast_router import CSV_ACTION, SQL_ACTION, WEB_ACTION, FastRouter
+from src.utils.planner import ActionPlan
+from src.utils.sql_result_cache import is_sql_statement
+
+ACTIONS = [SQL_ACTION, CSV_ACTION, WEB_ACTION]
+
+@pytest.fixture
+def router():
+    return FastRouter(threshold=0.9, model_path=None)
+
+@pytest.mark.parametrize("question, actions", [
+    ("SELECT * FROM Invoice", [SQL_ACTION]),
+    ("delete from Invoice where InvoiceId = 1", [SQL_ACTION]),
+    ("What is the average salary in data/employees.csv?", [CSV_ACTION]),
+    ("Summarize https://example.com/news", [WEB_ACTION]),
+    ("List all tables", [SQL_ACTION]),
+])
+def test_obvious_questions_are_routed_locally(router, question, actions):
+    assert router.route(question, ACTIONS) == actions
+
+@pytest.mark.parametrize("question", [
+    "Select the top customers",
+    "Update me on this quarter's sales",
+    "Delete the duplicates and tell me how many are left",
+    "What is on the kitchen table",
+])
+def test_questions_starting_with_sql_verbs_need_the_llm(router, question):
+    assert router.route(question, ACTIONS) is None
+
+TABLES = ["Invoice", "Customer"]
+
+@pytest.mark.parametrize("text", [
+    "SELECT * FROM Invoice",
+    "(SELECT Total FROM Invoice)",
+    "SELECT i.Total FROM Invoice AS i JOIN Customer c ON c.Id = i.CustomerId WHERE i.Total > 5",
+    "SELECT * FROM (SELECT * FROM Invoice) AS recent",
+    "WITH big AS (SELECT * FROM Invoice WHERE Total > 10) SELECT COUNT(*) FROM big",
+    "SELECT EXTRACT(YEAR FROM InvoiceDate) FROM Invoice",
+    "insert into Invoice (Id, Total) values (1, 2.5)",
+    "UPDATE Customer SET Name = 'a'",
+    "delete from Invoice where Id = 2",
+    "SELECT * FROM Unknown;",
+])
+def test_sql_statements(text):
+    assert is_sql_statement(text, TABLES)
+
+@pytest.mark.parametrize("text", [
+    "Select the top customers",
+    "Select the customers from Canada",
+    "Select the customers from Canada?",
+    "Select all orders from last week",
+    "Delete from my list the old invoices",
+    "Select everything from Invoice and explain it",
+    "update the prices set by marketing",
+    "SELECT * FROM Unknown",
+])
+def test_questions_are_not_sql_statements(text):
+    assert not is_sql_statement(text, TABLES)
+
+def test_planned_direct_mode_leaves_statements_to_the_action():
+    plan = ActionPlan([], tables=["Customer"], sql_mode="direct")
+    assert planned_sql_params("Select the customers from Canada", plan) == {
+        "query": "Select the customers from Canada", "agent_mode": False, "table_names": ["Customer"]
+    }
+    assert planned_sql_params("List all tables", plan) == {"list_tables": True, "agent_mode": False}
+
+class CountingChatModel(FakeListChatModel):
+    calls: int = 0
+
+    def _call(self, *args, **kwargs):
+        self.calls += 1
+        return super()._call(*args, **kwargs)
+
+@pytest.fixture
+def sql_action(tmp_path, monkeypatch):
+    uri = f"sqlite:///{tmp_path / 'shop.db'}"
+    engine = create_engine(uri)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE Customer (Id INTEGER, Country TEXT)")
+        conn.exec_driver_sql("INSERT INTO Customer VALUES (1, 'Canada'), (2, 'Chile'), (3, 'Canada')")
+    engine.dispose()
+    monkeypatch.setattr(sql_action_module, "DB_CONNECTION_STRING", uri)
+    llm = CountingChatModel(responses=["SELECT COUNT(*) FROM Customer WHERE Country = 'Canada'"])
+    action = sql_action_module.SQLDatabaseAction(llm=llm)
+    assert action.error is None
+    return action, llm
+
+def test_sql_action_generates_sql_for_questions_that_look_like_sql(sql_action):
+    action, llm = sql_action
+    assert action.execute(query="Select the customers from Canada", agent_mode=False) == "[(2,)]"
+    assert llm.calls == 1
+
+def test_sql_action_runs_statements_directly(sql_action):
+    action, llm = sql_action
+    result = asyncio.run(action.aexecute(query="SELECT COUNT(*) FROM Customer", agent_mode=False))
+    assert result == "[(3,)]"
+    assert llm.calls == 0
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import pytest
+from aiohttp import web
+from src.utils.http_fetcher import HTTPCache, HTTPFetcher, extract_urls
+
+LAST_MODIFIED = "Mon, 05 Oct 2026 12:00:00 GMT"
+
+class LocalServer:
+    """aiohttp server on a background thread that counts requests per path"""
+
+    def __init__(self):
+        self.requests = []
+        self.etag = '"v1"'
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def count(self, path):
+        return sum(1 for request_path, _ in self.requests if request_path == path)
+
+    async def etag_page(self, request):
+        self.requests.append((request.path, dict(request.headers)))
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if request.headers.get("If-None-Match") == self.etag:
+            return web.Response(status=304, headers=headers)
+        return web.Response(text=f"<html><body><p>Version {self.etag}</p>"
+                                 f"<script>ignored()</script></body></html>",
+                            content_type="text/html", headers=headers)
+
+    async def last_modified_page(self, request):
+        self.requests.append((request.path, dict(request.headers)))
+        headers = {"Last-Modified": LAST_MODIFIED, "Cache-Control": "max-age=0"}
+        if request.headers.get("If-Modified-Since") == LAST_MODIFIED:
+            return web.Response(status=304, headers=headers)
+        return web.Response(text="unchanged", headers=headers)
+
+    async def fresh_page(self, request):
+        self.requests.append((request.path, dict(request.headers)))
+        return web.Response(text="fresh", headers={"Cache-Control": "max-age=60"})
+
+    async def no_store_page(self, request):
+        self.requests.append((request.path, dict(request.headers)))
+        return web.Response(text="secret", headers={"Cache-Control": "no-store, max-age=60"})
+
+    async def large_page(self, request):
+        self.requests.append((request.path, dict(request.headers)))
+        return web.Response(text="x" * 100000)
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_get("/etag", self.etag_page)
+        app.router.add_get("/last-modified", self.last_modified_page)
+        app.router.add_get("/fresh", self.fresh_page)
+        app.router.add_get("/no-store", self.no_store_page)
+        app.router.add_get("/large", self.large_page)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    def start(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+@pytest.fixture(scope="module")
+def server():
+    server = LocalServer()
+    server.start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def fetcher(tmp_path):
+    fetcher = HTTPFetcher(cache=HTTPCache(str(tmp_path / "http")), rate_limit=0, max_text_chars=1000)
+    yield fetcher
+    fetcher.close()
+
+def test_etag_revalidation(server, fetcher):
+    url = f"{server.url}/etag"
+    first, = fetcher.fetch_many([url])
+    assert (first["status"], first["cache"]) == (200, "miss")
+    assert first["text"] == 'Version "v1"'
+
+    second, = fetcher.fetch_many([url])
+    assert (second["cache"], second["text"]) == ("revalidated", first["text"])
+    assert server.requests[-1][1]["If-None-Match"] == '"v1"'
+
+    server.etag = '"v2"'
+    third, = fetcher.fetch_many([url])
+    assert (third["cache"], third["text"]) == ("miss", 'Version "v2"')
+    server.etag = '"v1"'
+
+def test_last_modified_revalidation(server, fetcher):
+    url = f"{server.url}/last-modified"
+    fetcher.fetch_many([url])
+    result, = fetcher.fetch_many([url])
+    assert (result["cache"], result["text"]) == ("revalidated", "unchanged")
+    assert server.requests[-1][1]["If-Modified-Since"] == LAST_MODIFIED
+
+def test_fresh_entries_skip_the_network(server, fetcher):
+    url = f"{server.url}/fresh"
+    before = server.count("/fresh")
+    results = [fetcher.fetch_many([url])[0] for _ in range(3)]
+    assert [result["cache"] for result in results] == ["miss", "hit", "hit"]
+    assert server.count("/fresh") - before == 1
+
+def test_no_store_responses_are_not_cached(server, fetcher):
+    url = f"{server.url}/no-store"
+    results = [fetcher.fetch_many([url])[0] for _ in range(2)]
+    assert [result["cache"] for result in results] == ["miss", "miss"]
+
+def test_large_pages_are_truncated(server, fetcher):
+    result, = fetcher.fetch_many([f"{server.url}/large"])
+    assert result["truncated"]
+    assert len(result["text"]) == 1000
+
+def test_async_fetch_and_errors(server, fetcher):
+    async def main():
+        return await fetcher.afetch_many([f"{server.url}/fresh", "http://127.0.0.1:1/unreachable"])
+    page, failure = asyncio.run(main())
+    assert page["text"] == "fresh"
+    assert "error" in failure
+
+def test_afetch_each_yields_every_url(server, fetcher):
+    urls = [f"{server.url}/fresh", f"{server.url}/etag"]
+
+    async def main():
+        return {url: page async for url, page in fetcher.afetch_each(urls)}
+    pages = asyncio.run(main())
+    assert set(pages) == set(urls)
+    assert all(page["status"] == 200 for page in pages.values())
+
+def test_cache_policy():
+    assert HTTPCache.policy({"Cache-Control": "no-store"})["no_store"]
+    policy = HTTPCache.policy({"Cache-Control": "public, max-age=60", "ETag": '"a"'})
+    assert HTTPCache.is_fresh({**policy, "revalidate": False})
+    assert not HTTPCache.is_fresh(HTTPCache.policy({"Cache-Control": "no-cache, max-age=60"}))
+
+def test_extract_urls():
+    assert extract_urls("Compare https://example.com/a, and www.example.org.") == [
+        "https://example.com/a", "https://www.example.org"
+    ]
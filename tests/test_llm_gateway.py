@@ -0,0 +1,158 @@
+import asyncio
+import time
+import pytest
+from src.utils.llm_gateway import LLMGateway
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = FakeResponse({"retry-after": retry_after} if retry_after else {})
+
+def make_gateway(**kwargs):
+    options = {"requests_per_minute": 0, "tokens_per_minute": 0, "max_retries": 3,
+               "base_delay": 0.001, "max_delay": 0.01}
+    options.update(kwargs)
+    return LLMGateway(**options)
+
+def failing(errors, result="ok"):
+    """A call that raises the given errors in turn, then returns `result`"""
+    calls = []
+
+    def func():
+        calls.append(time.monotonic())
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    return func, calls
+
+def test_retries_429_and_honors_retry_after():
+    gateway = make_gateway()
+    func, calls = failing([FakeAPIError(429, retry_after="0.2")])
+    assert gateway.call(func) == "ok"
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.2
+    assert (gateway.retries, gateway.rate_limited) == (1, 1)
+
+def test_gives_up_after_max_retries():
+    gateway = make_gateway(max_retries=2)
+    func, calls = failing([FakeAPIError(503)] * 3)
+    with pytest.raises(FakeAPIError):
+        gateway.call(func)
+    assert len(calls) == 3
+
+def test_client_errors_are_not_retried():
+    gateway = make_gateway()
+    func, calls = failing([FakeAPIError(400)])
+    with pytest.raises(FakeAPIError):
+        gateway.call(func)
+    assert len(calls) == 1
+
+def test_async_retry():
+    gateway = make_gateway()
+    errors = [FakeAPIError(429), FakeAPIError(500)]
+
+    async def func():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+    assert asyncio.run(gateway.acall(func)) == "ok"
+    assert gateway.retries == 2
+
+def test_request_limit_spaces_out_calls():
+    # 600 a minute is one every 0.1s once the burst is used up
+    gateway = make_gateway(requests_per_minute=600)
+    gateway.requests.level = 0
+    started = time.monotonic()
+    gateway.call(lambda: None)
+    assert time.monotonic() - started >= 0.09
+    assert gateway.stats()["waits"] == 1
+
+def test_identical_concurrent_calls_are_sent_once():
+    gateway = make_gateway()
+    calls = []
+
+    async def func():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"answer": 42}
+
+    async def main():
+        return await asyncio.gather(*(gateway.acall(func, key="same") for _ in range(5)))
+    results = asyncio.run(main())
+    assert results == [{"answer": 42}] * 5
+    # Every caller gets its own copy
+    assert len({id(result) for result in results}) == 5
+    assert len(calls) == 1
+    assert gateway.stats()["deduplicated"] == 4
+
+def test_different_keys_are_not_deduplicated():
+    gateway = make_gateway()
+    calls = []
+
+    async def func():
+        calls.append(1)
+        return "ok"
+
+    async def main():
+        await asyncio.gather(gateway.acall(func, key="a"), gateway.acall(func, key="b"))
+    asyncio.run(main())
+    assert len(calls) == 2
+
+def test_errors_are_shared_with_followers():
+    gateway = make_gateway()
+
+    async def func():
+        await asyncio.sleep(0.05)
+        raise ValueError("bad request")
+
+    async def main():
+        return await asyncio.gather(*(gateway.acall(func, key="same") for _ in range(3)),
+                                    return_exceptions=True)
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_cancelled_leader_does_not_cancel_followers():
+    gateway = make_gateway()
+    calls = []
+
+    async def func():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    async def main():
+        leader = asyncio.create_task(gateway.acall(func, key="same"))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(gateway.acall(func, key="same")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers)
+    assert asyncio.run(main()) == ["ok", "ok"]
+    # One follower made the call again for both
+    assert len(calls) == 2
+    assert gateway.stats()["in_flight"] == 0
+
+def test_cancelled_follower_does_not_cancel_the_call():
+    gateway = make_gateway()
+
+    async def func():
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def main():
+        leader = asyncio.create_task(gateway.acall(func, key="same"))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(gateway.acall(func, key="same"))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        return await leader, follower
+    result, follower = asyncio.run(main())
+    assert result == "ok"
+    assert follower.cancelled()
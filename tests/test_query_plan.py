@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+import langchain_experimental.agents
+import pandas as pd
+import pytest
+from src.actions import csv_action
+from src.utils.dataframe_cache import DataFrameCache
+from src.utils.query_plan import execute_plan, parse_plan, validate_plan
+from src.utils.streaming_csv import execute_plan_streaming
+
+@pytest.fixture
+def sales():
+    return pd.DataFrame({
+        "Region": ["North", "South", "North", "East", "South"],
+        "Product": ["a", "b", "c", "a", "b"],
+        "Amount": [10, 20, 30, 35, 50],
+    })
+
+@pytest.fixture
+def sales_csv(sales, tmp_path):
+    path = tmp_path / "sales.csv"
+    sales.to_csv(path, index=False)
+    return str(path)
+
+def test_parse_plan_reads_fenced_json():
+    assert parse_plan('```json\n{"limit": 1}\n```') == {"limit": 1}
+    assert parse_plan("I can't express this as a plan") is None
+
+def test_group_and_sort_by_alias(sales):
+    plan = validate_plan({
+        "group_by": ["Region"],
+        "aggregations": [{"column": "Amount", "func": "sum", "alias": "total"}],
+        "sort": [{"column": "total", "descending": True}],
+        "limit": 2
+    }, list(sales.columns))
+    assert execute_plan(sales, plan).to_dict("list") == {"Region": ["South", "North"], "total": [70, 40]}
+
+def test_filter_select_and_sort(sales):
+    plan = validate_plan({
+        "filters": [{"column": "Amount", "op": ">", "value": 15}],
+        "select": ["Product", "Amount"],
+        "sort": [{"column": "Amount"}]
+    }, list(sales.columns))
+    assert execute_plan(sales, plan)["Amount"].tolist() == [20, 30, 35, 50]
+
+@pytest.mark.parametrize("plan", [
+    # Sorting by a column that isn't selected
+    {"select": ["Product"], "sort": [{"column": "Amount"}]},
+    # Sorting an aggregate by a column that isn't grouped or aggregated
+    {"group_by": ["Region"], "aggregations": [{"column": "Amount", "func": "sum"}],
+     "sort": [{"column": "Product"}]},
+    # Aliases only exist in aggregate results
+    {"select": ["Product"], "sort": [{"column": "sum_Amount"}]},
+])
+def test_sort_columns_must_be_in_the_result(sales, plan):
+    with pytest.raises(ValueError, match="Sort column"):
+        validate_plan(plan, list(sales.columns))
+
+@pytest.mark.parametrize("plan", [
+    {"filters": [{"column": "Bogus", "op": "==", "value": 1}]},
+    {"filters": [{"column": "Amount", "op": "like", "value": 1}]},
+    {"select": ["Bogus"]},
+    {"aggregations": [{"column": "Amount", "func": "mode"}]},
+    {"group_by": ["Region"]},
+    {"limit": -1},
+])
+def test_invalid_plans(sales, plan):
+    with pytest.raises(ValueError):
+        validate_plan(plan, list(sales.columns))
+
+def test_streaming_matches_in_memory(sales, sales_csv):
+    for raw in [
+        {"group_by": ["Region"], "aggregations": [{"column": "Amount", "func": "mean"}],
+         "sort": [{"column": "Region"}]},
+        {"select": ["Product", "Amount"], "sort": [{"column": "Amount", "descending": True}], "limit": 2},
+        {"sort": [{"column": "Amount"}], "limit": 3},
+    ]:
+        plan = validate_plan(raw, list(sales.columns))
+        streamed, stats = execute_plan_streaming(sales_csv, plan, chunk_size=2)
+        pd.testing.assert_frame_equal(streamed.reset_index(drop=True), execute_plan(sales, plan),
+                                      check_dtype=False)
+        assert stats["chunks"] >= 1
+
+@pytest.mark.parametrize("sandbox, rows", [(True, csv_action.AGENT_HEAD_ROWS), (False, 100)])
+def test_agent_loads_the_whole_file_only_without_the_sandbox(sandbox, rows, tmp_path, monkeypatch):
+    path = tmp_path / "numbers.csv"
+    pd.DataFrame({"n": range(100)}).to_csv(path, index=False)
+    frames = []
+    def create_agent(llm, df, **kwargs):
+        frames.append(df)
+        return SimpleNamespace(tools=[])
+    monkeypatch.setattr(langchain_experimental.agents, "create_pandas_dataframe_agent", create_agent)
+    monkeypatch.setattr(csv_action, "CSV_SANDBOX_ENABLED", sandbox)
+    cache = DataFrameCache(spill_dir=None)
+    monkeypatch.setattr(csv_action, "get_dataframe_cache", lambda: cache)
+    agent = csv_action.CSVAction(llm=object())._create_agent(str(path))
+    assert len(frames[0]) == rows
+    assert cache.stats()["misses"] == (0 if sandbox else 1)
+    assert len(agent.tools) == (1 if sandbox else 0)
@@ -0,0 +1,175 @@
+import asyncio
+import pytest
+from src.server import AgentService
+from src.utils.request_queue import AdmissionQueue, DeadlineExceededError, QueueFullError
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_serves_by_priority_then_arrival():
+    async def main():
+        queue = AdmissionQueue(maxsize=10, workers=1)
+        for payload, priority in [("low", "low"), ("first", "normal"), ("high", "high"), ("second", "normal")]:
+            await queue.submit(payload, priority)
+        return [(await queue.get()).payload for _ in range(4)]
+    assert run(main()) == ["high", "first", "second", "low"]
+
+def test_full_queue_rejects_requests_that_dont_outrank_the_waiting_ones():
+    async def main():
+        queue = AdmissionQueue(maxsize=2, workers=1)
+        await queue.submit("a", "normal")
+        await queue.submit("b", "high")
+        with pytest.raises(QueueFullError) as raised:
+            await queue.submit("c", "normal")
+        return queue, raised.value
+    queue, error = run(main())
+    assert error.retry_after >= 1.0
+    assert (len(queue), queue.rejected) == (2, 1)
+
+def test_higher_priority_evicts_the_lowest_waiting_request():
+    async def main():
+        queue = AdmissionQueue(maxsize=2, workers=1)
+        first = await queue.submit("first", "low")
+        second = await queue.submit("second", "low")
+        await queue.submit("urgent", "high")
+        with pytest.raises(QueueFullError, match="Evicted"):
+            await second.future
+        return queue, first, [(await queue.get()).payload for _ in range(2)]
+    queue, first, served = run(main())
+    # The newest of the lowest-priority requests was evicted
+    assert served == ["urgent", "first"]
+    assert queue.evicted == 1
+
+def test_requests_that_expire_while_waiting_are_failed():
+    async def main():
+        queue = AdmissionQueue(maxsize=10, workers=1)
+        expiring = await queue.submit("expiring", timeout=0.01)
+        await queue.submit("patient")
+        await asyncio.sleep(0.05)
+        served = await queue.get()
+        with pytest.raises(DeadlineExceededError):
+            await expiring.future
+        return queue, served.payload
+    queue, served = run(main())
+    assert (served, queue.expired) == ("patient", 1)
+
+def test_rejects_requests_that_cannot_start_before_their_deadline():
+    async def main():
+        queue = AdmissionQueue(maxsize=10, workers=1)
+        queue.service_time = 1.0
+        await queue.submit("a")
+        await queue.submit("b")
+        with pytest.raises(QueueFullError, match="deadline"):
+            await queue.submit("c", timeout=0.5)
+        # Without a deadline it still fits
+        await queue.submit("d")
+    run(main())
+
+def test_abandoned_requests_are_dropped():
+    async def main():
+        queue = AdmissionQueue(maxsize=10, workers=1)
+        abandoned = await queue.submit("abandoned")
+        await queue.submit("wanted")
+        abandoned.future.cancel()
+        return (await queue.get()).payload
+    assert run(main()) == "wanted"
+
+def test_service_time_is_a_running_average():
+    async def main():
+        queue = AdmissionQueue(maxsize=10, workers=2)
+        for seconds in (1.0, 2.0):
+            await queue.submit("q")
+            await queue.get()
+            queue.task_done(seconds)
+        return queue
+    queue = run(main())
+    assert queue.service_time == pytest.approx(1.2)
+    assert queue.stats()["completed"] == 2
+
+def test_close_fails_waiting_requests_and_rejects_new_ones():
+    async def main():
+        queue = AdmissionQueue(maxsize=10, workers=1)
+        waiting = await queue.submit("q")
+        await queue.close()
+        with pytest.raises(QueueFullError):
+            await waiting.future
+        with pytest.raises(QueueFullError, match="shutting down"):
+            await queue.submit("late")
+    run(main())
+
+def test_unknown_priority():
+    async def main():
+        await AdmissionQueue(maxsize=1, workers=1).submit("q", "urgent")
+    with pytest.raises(ValueError):
+        run(main())
+
+class FakeService(AgentService):
+    """Service whose answers take `delay` seconds, without an analyzer or actions"""
+
+    def __init__(self, delay: float, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = delay
+        self.answering = []
+
+    async def _answer(self, question, events=None):
+        self.answering.append(asyncio.current_task())
+        await asyncio.sleep(self.delay)
+        return {"actions": [], "results": {"answer": question}}
+
+    async def __aenter__(self):
+        self.queue = AdmissionQueue(self.queue_size, self.workers)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.queue.close()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+def test_service_answers_questions():
+    async def main():
+        async with FakeService(delay=0.01, workers=2, queue_size=4, request_timeout=5) as service:
+            return await asyncio.gather(*(service.ask(f"q{i}") for i in range(4)))
+    answers = run(main())
+    assert [answer["results"]["answer"] for answer in answers] == ["q0", "q1", "q2", "q3"]
+
+def test_service_reports_time_spent_queued():
+    async def main():
+        async with FakeService(delay=0.1, workers=1, queue_size=4, request_timeout=5) as service:
+            return await asyncio.gather(service.ask("first"), service.ask("second"))
+    first, second = run(main())
+    # Answering takes 0.1s; only the second question waited for the first
+    assert first["queued"] < 0.05
+    assert 0.05 < second["queued"] < 0.2
+
+def test_service_fails_questions_past_their_deadline():
+    async def main():
+        async with FakeService(delay=1.0, workers=1, queue_size=4, request_timeout=5) as service:
+            with pytest.raises(DeadlineExceededError):
+                await service.ask("slow", timeout=0.05)
+            return service.answering[0]
+    work = run(main())
+    assert work.cancelled()
+
+def test_service_stops_work_when_the_client_goes_away():
+    async def main():
+        async with FakeService(delay=1.0, workers=1, queue_size=4, request_timeout=5) as service:
+            ask = asyncio.create_task(service.ask("q"))
+            await asyncio.sleep(0.05)
+            ask.cancel()
+            await asyncio.sleep(0.05)
+            return service.answering[0]
+    assert run(main()).cancelled()
+
+def test_service_fails_questions_whose_work_is_cancelled_by_someone_else():
+    async def main():
+        async with FakeService(delay=1.0, workers=1, queue_size=4, request_timeout=5) as service:
+            ask = asyncio.create_task(service.ask("q"))
+            await asyncio.sleep(0.05)
+            service.answering[0].cancel()
+            with pytest.raises(RuntimeError, match="cancelled"):
+                await ask
+            # The worker keeps serving
+            return await service.ask("next")
+    assert run(main())["results"]["answer"] == "next"
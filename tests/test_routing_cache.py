@@ -0,0 +1,83 @@
+import time
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from src.utils.action_analyzer import ActionAnalyzer
+from src.utils.action_registry import ActionSpec
+from src.utils.routing_cache import RoutingCache, normalize_question, routing_fingerprint
+
+SQL = ActionSpec("Execute SQL queries on a database", "src.actions.sql_action:SQLDatabaseAction")
+CSV = ActionSpec("Read a CSV file and extract data", "src.actions.csv_action:CSVAction")
+
+class CountingChatModel(FakeListChatModel):
+    calls: int = 0
+
+    def _call(self, *args, **kwargs):
+        self.calls += 1
+        return super()._call(*args, **kwargs)
+
+def make_analyzer(cache, actions=(SQL, CSV), answer='["Execute SQL queries on a database"]'):
+    llm = CountingChatModel(responses=[answer])
+    analyzer = ActionAnalyzer(llm=llm, cache=cache, actions=list(actions))
+    # Route every question through the cache and the LLM
+    analyzer.fast_router = None
+    return analyzer, llm
+
+def test_normalize_question_ignores_case_spacing_and_trailing_punctuation():
+    assert normalize_question("  How many   Invoices? ") == normalize_question("how many invoices")
+
+def test_get_miss_then_hit():
+    cache = RoutingCache(path=None)
+    key = cache.make_key("Who are the top customers?", "fingerprint")
+    assert cache.get(key) is None
+    cache.set(key, ["Execute SQL queries on a database"])
+    assert cache.get(key) == ["Execute SQL queries on a database"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+def test_entries_expire_after_ttl():
+    cache = RoutingCache(path=None, ttl=1)
+    key = cache.make_key("question", "fingerprint")
+    cache.set(key, ["action"])
+    cache._memory[key] = (["action"], time.time() - 2)
+    assert cache.get(key) is None
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = RoutingCache(path=None, max_size=2)
+    for question in ("a", "b"):
+        cache.set(cache.make_key(question, "f"), [question])
+    cache.get(cache.make_key("a", "f"))
+    cache.set(cache.make_key("c", "f"), ["c"])
+    assert cache.get(cache.make_key("b", "f")) is None
+    assert cache.get(cache.make_key("a", "f")) == ["a"]
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "routing.db")
+    cache = RoutingCache(path=path)
+    key = cache.make_key("question", "fingerprint")
+    cache.set(key, ["action"])
+    cache.close()
+
+    reopened = RoutingCache(path=path)
+    assert reopened.get(key) == ["action"]
+    assert reopened.stats()["disk_hits"] == 1
+    reopened.close()
+
+def test_fingerprint_depends_on_actions_and_template():
+    fingerprint = routing_fingerprint(["a", "b"], "template")
+    assert fingerprint == routing_fingerprint(["a", "b"], "template")
+    assert fingerprint != routing_fingerprint(["a"], "template")
+    assert fingerprint != routing_fingerprint(["a", "b"], "other template")
+
+def test_analyzer_calls_the_llm_once_per_question():
+    analyzer, llm = make_analyzer(RoutingCache(path=None))
+    first = analyzer.get_required_actions("Who are the top customers?")
+    second = analyzer.get_required_actions("who are the top customers")
+    assert first == second == [SQL]
+    assert llm.calls == 1
+
+def test_changing_the_action_set_misses_the_cache():
+    cache = RoutingCache(path=None)
+    analyzer, llm = make_analyzer(cache)
+    analyzer.get_required_actions("Who are the top customers?")
+    other, other_llm = make_analyzer(cache, actions=(SQL,))
+    assert other.get_required_actions("Who are the top customers?") == [SQL]
+    assert (llm.calls, other_llm.calls) == (1, 1)
@@ -0,0 +1,118 @@
+import os
+import pytest
+from sqlalchemy import create_engine
+from src.utils.sql_database import CachingSQLDatabase, SchemaCache
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "shop.db"
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE Customer (Id INTEGER, Name TEXT)")
+        conn.exec_driver_sql("INSERT INTO Customer VALUES (1, 'Ada'), (2, 'Grace')")
+    engine.dispose()
+    return str(path)
+
+def change_schema(db_path, statement):
+    """Alter the database through another engine, as another process would"""
+    engine = create_engine(f"sqlite:///{db_path}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(statement)
+    engine.dispose()
+    # Make the change visible even on filesystems with coarse timestamps
+    stat = os.stat(db_path)
+    os.utime(db_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+def test_schema_descriptions_are_reused_until_the_file_changes(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    cache = SchemaCache(engine, path=None, check_interval=0)
+    db = CachingSQLDatabase(engine, schema_cache=cache, result_cache=None)
+    assert "Email" not in db.get_table_info()
+    assert cache.get("Customer") is not None
+    version = cache.version
+
+    cache.fingerprint()
+    assert (cache.version, cache.get("Customer") is not None) == (version, True)
+
+    change_schema(db_path, "ALTER TABLE Customer ADD COLUMN Email TEXT")
+    cache.fingerprint()
+    assert (cache.version, cache.get("Customer")) == (version + 1, None)
+    assert "Email" in db.get_table_info()
+    engine.dispose()
+
+def test_new_tables_are_listed_after_the_file_changes(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    db = CachingSQLDatabase(engine, schema_cache=SchemaCache(engine, path=None, check_interval=0),
+                            result_cache=None)
+    assert db.get_usable_table_names() == ["Customer"]
+    change_schema(db_path, "CREATE TABLE Invoice (Id INTEGER)")
+    assert db.get_usable_table_names() == ["Customer", "Invoice"]
+    engine.dispose()
+
+def test_the_file_is_checked_at_most_once_per_interval(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    cache = SchemaCache(engine, path=None, check_interval=60)
+    cache.fingerprint()
+    cache.set({"Customer": "CREATE TABLE Customer (...)"})
+    change_schema(db_path, "ALTER TABLE Customer ADD COLUMN Email TEXT")
+    cache.fingerprint()
+    assert cache.get("Customer") == "CREATE TABLE Customer (...)"
+    engine.dispose()
+
+def test_snapshots_are_saved_for_new_processes(db_path, tmp_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    path = str(tmp_path / "schema.json")
+    cold = SchemaCache(engine, path=path)
+    cold.fingerprint()
+    cold.set({"Customer": "CREATE TABLE Customer (...)"})
+    warm = SchemaCache(engine, path=path)
+    warm.fingerprint()
+    assert warm.get("Customer") == "CREATE TABLE Customer (...)"
+
+    change_schema(db_path, "ALTER TABLE Customer ADD COLUMN Email TEXT")
+    stale = SchemaCache(engine, path=path)
+    stale.fingerprint()
+    assert stale.get("Customer") is None
+    engine.dispose()
+
+@pytest.fixture
+def numbers(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'numbers.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE Numbers (n INTEGER, word TEXT)")
+        conn.exec_driver_sql("INSERT INTO Numbers VALUES " + ", ".join(f"({i}, 'n{i}')" for i in range(50)))
+    yield engine
+    engine.dispose()
+
+def make_db(engine, **kwargs):
+    return CachingSQLDatabase(engine, schema_cache=SchemaCache(engine, path=None), result_cache=None, **kwargs)
+
+def test_run_stops_at_the_row_limit(numbers):
+    output = make_db(numbers, max_rows=10).run("SELECT n FROM Numbers ORDER BY n")
+    rows, note = output.split("\n")
+    assert rows == str([(i,) for i in range(10)])
+    assert note.startswith("(Showing the first 10 rows")
+
+def test_run_stops_at_the_size_limit(numbers):
+    output = make_db(numbers, max_rows=100, max_bytes=40).run("SELECT n FROM Numbers ORDER BY n")
+    rows, note = output.split("\n")
+    assert len(rows) <= 40
+    assert note.startswith("(Showing the first")
+
+def test_results_within_the_limits_are_unchanged(numbers):
+    db = make_db(numbers, max_rows=100)
+    assert db.run("SELECT n, word FROM Numbers WHERE n < 2 ORDER BY n", include_columns=True) == \
+        "[{'n': 0, 'word': 'n0'}, {'n': 1, 'word': 'n1'}]"
+
+def test_stream_batches_reads_every_row(numbers):
+    pytest.importorskip("pyarrow")
+    batches = list(make_db(numbers, max_rows=10).stream_batches("SELECT n FROM Numbers ORDER BY n", batch_size=20))
+    assert [batch.num_rows for batch in batches] == [20, 20, 10]
+    assert [n for batch in batches for n in batch.column("n").to_pylist()] == list(range(50))
+
+def test_streaming_refuses_writes(numbers):
+    db = make_db(numbers)
+    with pytest.raises(ValueError):
+        list(db.stream("DELETE FROM Numbers"))
+    with pytest.raises(ValueError):
+        list(db.stream_batches("DELETE FROM Numbers"))
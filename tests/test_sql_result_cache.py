@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import create_engine
+from src.utils.sql_database import CachingSQLDatabase, SchemaCache
+from src.utils.sql_result_cache import SQLResultCache, is_read_only, normalize_sql, write_target
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM Invoice",
+    "  (SELECT 1)",
+    "WITH totals AS (SELECT CustomerId, SUM(Total) AS t FROM Invoice GROUP BY 1) SELECT * FROM totals",
+    "SELECT REPLACE(Name, 'a', 'b') FROM Artist",
+    'SELECT "update" FROM t',
+    "SELECT t.update FROM t",
+    "SELECT 'drop table x' AS text",
+])
+def test_read_only(sql):
+    assert is_read_only(sql)
+
+@pytest.mark.parametrize("sql", [
+    "INSERT INTO t VALUES (1)",
+    "UPDATE t SET a = 1",
+    "DELETE FROM t",
+    "DROP TABLE t",
+    "SELECT * INTO backup FROM t",
+    "WITH gone AS (DELETE FROM t RETURNING *) SELECT * FROM gone",
+    "SELECT 1; DROP TABLE t",
+    "",
+])
+def test_not_read_only(sql):
+    assert not is_read_only(sql)
+
+def test_normalize_sql_keeps_literals():
+    assert normalize_sql("SELECT  *\n FROM t -- all\n WHERE a = 'x  y';") == "SELECT * FROM t WHERE a = 'x  y'"
+
+def test_write_target():
+    assert write_target('INSERT INTO main."Invoice" VALUES (1)') == "invoice"
+    assert write_target("DROP TABLE t") is None
+
+def test_invalidate_for_drops_only_entries_reading_the_target():
+    cache = SQLResultCache()
+    cache.set("a", "SELECT * FROM Invoice", "invoices")
+    cache.set("b", "SELECT * FROM Customer", "customers")
+    cache.invalidate_for("UPDATE Invoice SET Total = 0")
+    assert cache.get("a") is None
+    assert cache.get("b") == "customers"
+    cache.invalidate_for("DROP TABLE Customer")
+    assert cache.get("b") is None
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE Invoice (id INTEGER, total REAL)")
+        conn.exec_driver_sql("CREATE TABLE Customer (id INTEGER)")
+        conn.exec_driver_sql("INSERT INTO Invoice VALUES (1, 10.0)")
+    database = CachingSQLDatabase(engine, schema_cache=SchemaCache(engine, path=None),
+                                  result_cache=SQLResultCache())
+    yield database
+    engine.dispose()
+
+def test_repeated_reads_are_served_from_the_cache(db):
+    assert db.run("SELECT COUNT(*) FROM Invoice") == db.run("SELECT COUNT(*)\n  FROM Invoice;")
+    stats = db.result_cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+def test_writes_invalidate_cached_reads(db):
+    db.run("SELECT * FROM Customer")
+    assert db.run("SELECT COUNT(*) FROM Invoice") == "[(1,)]"
+    db.run("INSERT INTO Invoice VALUES (2, 5.0)")
+    assert db.run("SELECT COUNT(*) FROM Invoice") == "[(2,)]"
+    assert db.result_cache.stats()["size"] == 2
@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+from src.utils.telemetry import get_telemetry, traced
+
+class CollectingExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def spans():
+    telemetry = get_telemetry()
+    exporter = CollectingExporter()
+    telemetry.add_exporter(exporter)
+    yield exporter.spans
+    telemetry.exporters.remove(exporter)
+
+@traced("test.step")
+async def step():
+    await asyncio.sleep(0)
+
+@traced("test.generator")
+async def generate(count, fail=False):
+    for i in range(count):
+        await step()
+        yield i
+    if fail:
+        raise ValueError("failed")
+
+@traced("test.consumer")
+async def consume(count):
+    async for _ in generate(count):
+        await step()
+
+def by_name(spans):
+    named = {}
+    for span in spans:
+        named.setdefault(span.name, []).append(span)
+    return named
+
+def test_generator_span_is_not_current_while_the_caller_handles_items(spans):
+    asyncio.run(consume(2))
+    named = by_name(spans)
+    consumer, = named["test.consumer"]
+    generator, = named["test.generator"]
+    assert generator.parent_id == consumer.span_id
+    parents = [span.parent_id for span in named["test.step"]]
+    # Steps alternate between the generator and the consumer
+    assert parents == [generator.span_id, consumer.span_id] * 2
+
+def test_generator_span_records_errors(spans):
+    async def main():
+        with pytest.raises(ValueError):
+            async for _ in generate(1, fail=True):
+                pass
+    asyncio.run(main())
+    generator, = by_name(spans)["test.generator"]
+    assert (generator.status, generator.attributes["error"]) == ("error", "ValueError")
+
+def test_generator_can_be_closed_from_another_task(spans):
+    async def main():
+        items = generate(5)
+        assert await items.__anext__() == 0
+        await asyncio.create_task(items.aclose())
+    asyncio.run(main())
+    generator, = by_name(spans)["test.generator"]
+    assert generator.status == "ok"
+    assert generator.end_ns is not None